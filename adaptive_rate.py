@@ -0,0 +1,124 @@
+"""
+Content-adaptive rate control for video.
+Instead of one fixed bitrate for everything, a few short excerpts of each video are
+encoded at low resolution with the encoder's fastest settings at several CRFs, and
+the highest CRF (smallest file) whose SSIM against the source still reaches the
+target is used for the real encode. Static slides end up far below the fixed bitrate,
+high-motion footage above it. Encoders without CRF (hardware, older codecs) get the
+bitrate that probe needed, scaled to the output size. Decisions are cached per file.
+"""
+
+from app_paths import FileKeyedStore
+from ffmpeg_commands import software_fallback, parse_bitrate
+
+RATE_BITRATE = 'Fixed Bitrate'
+RATE_ADAPTIVE = 'Adaptive'
+
+# Target SSIM (measured at the probe resolution) per 'video_adaptive_quality' level
+QUALITY_TARGETS = {'High': 0.985, 'Balanced': 0.975, 'Small': 0.96}
+DEFAULT_QUALITY = 'Balanced'
+
+# CRF search range of each probed encoder (higher = smaller file)
+CRF_RANGES = {
+    'libx264': (18, 34),
+    'libx265': (20, 36),
+    'libvpx-vp9': (20, 50),
+    'libaom-av1': (20, 50)
+}
+
+PROBE_HEIGHT = 360
+EXCERPT_SECONDS = 2.0
+EXCERPT_POSITIONS = (0.2, 0.5, 0.8) # of the (trimmed) duration
+
+# Extra bitrate over the probed encoder: hardware encoders are less efficient than
+# their software counterparts, older codecs (MPEG-2/4, WMV, ...) much less
+HW_BITRATE_FACTOR = 1.25
+LEGACY_BITRATE_FACTOR = 2.0
+# Ceiling for demanding content, relative to the fixed 'video_bitrate'
+MAX_BITRATE_FACTOR = 2.0
+
+
+def is_adaptive(settings):
+    return settings.get('video_rate_control', RATE_BITRATE) == RATE_ADAPTIVE
+
+
+def quality_target(settings):
+    return QUALITY_TARGETS.get(settings.get('video_adaptive_quality', DEFAULT_QUALITY),
+                               QUALITY_TARGETS[DEFAULT_QUALITY])
+
+
+def probed_codec(codec):
+    """CRF encoder that represents 'codec' in the probe (its software version, else x264)."""
+    software = software_fallback(codec)
+    return software if software in CRF_RANGES else 'libx264'
+
+
+def probe_height(output_height):
+    """Height of the probe encodes: the output height, at most PROBE_HEIGHT (even)."""
+    height = min(PROBE_HEIGHT, output_height) if output_height > 0 else PROBE_HEIGHT
+    return max(2, height - height % 2)
+
+
+def plan_excerpts(start, duration):
+    """(start, length) of the excerpts to probe; short videos are probed whole."""
+    total = EXCERPT_SECONDS * len(EXCERPT_POSITIONS)
+    if duration <= 0:
+        return [(start, total)] # unknown length: the beginning
+    if duration <= total * 2:
+        return [(start, duration)]
+    return [(start + duration * p - EXCERPT_SECONDS / 2, EXCERPT_SECONDS) for p in EXCERPT_POSITIONS]
+
+
+async def search_crf(measure, crf_range, target):
+    """
+    Binary search for the highest CRF whose SSIM reaches 'target' (quality falls as the
+    CRF rises). 'measure' is a coroutine function crf -> (ssim, bytes), or None when
+    the probe failed. Returns (crf, ssim, bytes), with the range's lowest CRF when
+    nothing reaches the target, or None when no probe worked.
+    """
+    low, high = crf_range
+    best = None
+    fallback = None # last miss: the lowest CRF tried when nothing reaches the target
+    while low <= high:
+        crf = (low + high) // 2
+        result = await measure(crf)
+        if result is None:
+            break
+        ssim, size = result
+        if ssim >= target:
+            best = (crf, ssim, size)
+            low = crf + 1
+        else:
+            fallback = (crf, ssim, size)
+            high = crf - 1
+    return best or fallback
+
+
+def rate_settings(settings, codec, decision, output_height):
+    """
+    Settings for one encode attempt with 'codec': the CRF when it is the probed encoder,
+    otherwise the probe's bitrate scaled to the output height and the codec's efficiency.
+    Both are capped at MAX_BITRATE_FACTOR times the fixed bitrate.
+    """
+    ceiling = parse_bitrate(settings.get('video_bitrate', '2500k'), 2500000) * MAX_BITRATE_FACTOR
+    if codec == decision['codec']:
+        return dict(settings, video_crf=str(decision['crf']), video_max_bitrate=f"{int(ceiling // 1000)}k")
+    bitrate = decision['bitrate']
+    if output_height > 0:
+        # Bits grow slower than the pixel count
+        bitrate *= (output_height / decision['probe_height']) ** 1.5
+    software = software_fallback(codec)
+    if software != codec and software in CRF_RANGES:
+        bitrate *= HW_BITRATE_FACTOR
+    else:
+        bitrate *= LEGACY_BITRATE_FACTOR
+    return dict(settings, video_bitrate=f"{max(1, int(min(bitrate, ceiling) / 1000))}k")
+
+
+class AdaptiveRateCache(FileKeyedStore):
+    """Persistent CRF decisions keyed by path, size, mtime, encoder, target, probe height and trim."""
+    description = "adaptive rate cache"
+    key_fields = 7
+
+    def key_for(self, path, codec, target, height, trim):
+        return self.file_key(path, codec, target, height, trim[0], trim[1])
@@ -0,0 +1,90 @@
+import os
+import json
+import threading
+from PySide6.QtCore import QStandardPaths
+
+from logger import app_logger
+
+def get_data_dir():
+    """Return (and create) the application's data directory, shared with logs and settings."""
+    base_dir = QStandardPaths.writableLocation(QStandardPaths.AppDataLocation)
+    os.makedirs(base_dir, exist_ok=True)
+    return base_dir
+
+def get_cache_dir(name):
+    """Return (and create) a named cache subdirectory inside the data directory."""
+    cache_dir = os.path.join(get_data_dir(), "cache", name)
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+def get_data_file(file_name):
+    """Return the path of a persistent state file (JSON indexes, history, queues)."""
+    return os.path.join(get_data_dir(), file_name)
+
+def load_json(path, default):
+    """Load a JSON state file, returning 'default' if it is missing or corrupt."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+def save_json(path, data):
+    """Write a JSON state file atomically (temp file + rename)."""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=1)
+    os.replace(tmp_path, path)
+
+class JsonStore:
+    """
+    A JSON state file of key -> entry, kept in memory and shared between threads.
+    save() writes it back (atomically) only when something changed, after prune().
+    """
+    description = "state file" # for the log
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = load_json(path, {})
+        self.lock = threading.Lock()
+        self.dirty = False
+
+    def get(self, key):
+        with self.lock:
+            return self.entries.get(key)
+
+    def put(self, key, entry):
+        with self.lock:
+            self.entries[key] = entry
+            self.dirty = True
+
+    def prune(self):
+        """Drop entries that are no longer useful; called with the lock held."""
+
+    def save(self):
+        if not self.dirty:
+            return
+        try:
+            with self.lock:
+                self.prune()
+                save_json(self.path, self.entries)
+                self.dirty = False
+        except OSError as e:
+            app_logger.warning(f"Failed to save {self.description}: {e}")
+
+
+class FileKeyedStore(JsonStore):
+    """
+    JsonStore of results computed from an input file, keyed by its path, size and
+    mtime (plus 'key_fields' - 2 further parts), so a changed file misses the cache.
+    Entries of files that no longer exist are pruned on save.
+    """
+    key_fields = 2 # parts after the path
+
+    def file_key(self, path, *parts):
+        st = os.stat(path)
+        return '|'.join([os.path.abspath(path), str(st.st_size), str(st.st_mtime_ns), *map(str, parts)])
+
+    def prune(self):
+        for key in [k for k in self.entries if not os.path.exists(k.rsplit('|', self.key_fields)[0])]:
+            del self.entries[key]
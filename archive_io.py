@@ -0,0 +1,224 @@
+"""
+Zip and tar archives as conversion inputs and outputs.
+Archive members are addressed as 'archive.zip::dir/name.ext' paths. They are streamed
+into FFmpeg through a pipe where the demuxer allows it, and spilled to a temporary
+file only for formats that need seeking (or features that need a real file).
+ArchiveWriter adds converted outputs to a zip or tar as they finish, so no separate
+re-archiving pass is needed.
+"""
+
+import os
+import shutil
+import tarfile
+import tempfile
+import threading
+import zipfile
+
+from logger import app_logger
+
+MEMBER_SEPARATOR = '::'
+ARCHIVE_EXTENSIONS = ('.zip', '.tar', '.tgz', '.tar.gz', '.tbz2', '.tar.bz2', '.txz', '.tar.xz')
+
+# Formats FFmpeg can't read from a pipe: containers that need seeking (index at the end)
+# and image formats without a signature its pipe demuxers could detect
+SPILL_EXTENSIONS = {'.mp4', '.m4v', '.m4a', '.mov', '.3gp', '.avi', '.wmv', '.mkv', '.webm', '.flv', '.ogv',
+                    '.mpg', '.mpeg', '.ts', '.m2ts', '.gif', '.avif', '.tga', '.ico', '.exr', '.hdr'}
+
+ARCHIVE_OUTPUT_OFF = 'Off'
+ARCHIVE_OUTPUT_ZIP = 'zip'
+ARCHIVE_OUTPUT_TAR = 'tar'
+
+COPY_CHUNK = 1024 * 1024
+
+
+def is_archive(path):
+    return path.lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+def archive_stem(path):
+    """File name of an archive without its (possibly double) extension."""
+    name = os.path.basename(path)
+    for ext in sorted(ARCHIVE_EXTENSIONS, key=len, reverse=True):
+        if name.lower().endswith(ext):
+            return name[:-len(ext)]
+    return os.path.splitext(name)[0]
+
+
+def member_path(archive_path, name):
+    return f"{archive_path}{MEMBER_SEPARATOR}{name}"
+
+
+def split_member_path(path):
+    """(archive_path, member_name) for an archive member path, else None."""
+    archive_path, sep, name = path.partition(MEMBER_SEPARATOR)
+    if not sep or not is_archive(archive_path):
+        return None
+    return archive_path, name
+
+
+def list_members(archive_path, extensions):
+    """Member paths of the regular files in an archive whose extension is in 'extensions'."""
+    try:
+        if archive_path.lower().endswith('.zip'):
+            with zipfile.ZipFile(archive_path) as zf:
+                names = [i.filename for i in zf.infolist() if not i.is_dir()]
+        else:
+            with tarfile.open(archive_path) as tf:
+                names = [m.name for m in tf.getmembers() if m.isfile()]
+    except (OSError, zipfile.BadZipFile, tarfile.TarError) as e:
+        app_logger.error(f"Can't read archive {archive_path}: {e}")
+        return []
+    return [member_path(archive_path, n) for n in names if os.path.splitext(n)[1].lower() in extensions]
+
+
+class MemberReader:
+    """Context manager returning a binary file object for one archive member."""
+    def __init__(self, archive_path, name):
+        self.archive_path = archive_path
+        self.name = name
+        self.archive = None
+
+    def __enter__(self):
+        if self.archive_path.lower().endswith('.zip'):
+            self.archive = zipfile.ZipFile(self.archive_path)
+            return self.archive.open(self.name)
+        self.archive = tarfile.open(self.archive_path)
+        return self.archive.extractfile(self.name)
+
+    def __exit__(self, *exc):
+        self.archive.close()
+
+
+def member_size(archive_path, name):
+    """Uncompressed size of a member in bytes."""
+    if archive_path.lower().endswith('.zip'):
+        with zipfile.ZipFile(archive_path) as zf:
+            return zf.getinfo(name).file_size
+    with tarfile.open(archive_path) as tf:
+        return tf.getmember(name).size
+
+
+def input_size(path):
+    """Size in bytes of an input path: a file, or an archive member (uncompressed)."""
+    member = split_member_path(path)
+    if member is None:
+        return os.path.getsize(path)
+    try:
+        return member_size(*member)
+    except KeyError as e:
+        raise FileNotFoundError(f"No member {member[1]} in {member[0]}") from e
+
+
+def can_stream(name):
+    """Whether FFmpeg can read this member from a pipe instead of a spilled file."""
+    return os.path.splitext(name)[1].lower() not in SPILL_EXTENSIONS
+
+
+def spill_member(archive_path, name):
+    """Copy a member to a temporary file (keeping its extension) and return the path."""
+    fd, tmp_path = tempfile.mkstemp(prefix="yaofc_", suffix=os.path.splitext(name)[1])
+    try:
+        with os.fdopen(fd, 'wb') as out, MemberReader(archive_path, name) as src:
+            shutil.copyfileobj(src, out, COPY_CHUNK)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+    return tmp_path
+
+
+def archive_output_path(files, source_folder_name, kind):
+    """Archive that receives a batch's outputs, next to its inputs."""
+    first = files[0]
+    member = split_member_path(first)
+    if member:
+        base_dir, stem = os.path.dirname(member[0]), archive_stem(member[0])
+    else:
+        base_dir = os.path.dirname(first)
+        stem = source_folder_name or os.path.splitext(os.path.basename(first))[0]
+    ext = '.zip' if kind == ARCHIVE_OUTPUT_ZIP else '.tar'
+    return os.path.join(base_dir, f"{stem}_converted{ext}")
+
+
+def archive_arcname(output_path, input_path, output_base_dir=""):
+    """Name of an output inside the output archive, relative to its output folder's parent."""
+    member = split_member_path(input_path)
+    if member:
+        return os.path.relpath(output_path, os.path.dirname(member[0]))
+    if output_base_dir:
+        return os.path.relpath(output_path, os.path.dirname(output_base_dir))
+    return os.path.basename(output_path)
+
+
+def remove_archived_outputs(paths):
+    """Delete outputs that were written into the output archive, and folders left empty."""
+    folders = set()
+    for path in paths:
+        try:
+            os.remove(path)
+            folders.add(os.path.dirname(path))
+        except OSError:
+            pass
+    for folder in sorted(folders, key=len, reverse=True):
+        # Only empty folders up to the '<name>_converted' output folder are removed
+        try:
+            while not os.listdir(folder):
+                os.rmdir(folder)
+                if folder.endswith('_converted'):
+                    break
+                folder = os.path.dirname(folder)
+        except OSError:
+            pass
+
+
+class ArchiveWriter:
+    """
+    Appends finished outputs to a zip (stored, media is already compressed) or an
+    uncompressed tar. Thread-safe; members are written one at a time.
+    The archive is written under a hidden partial name next to 'archive_path' and
+    renamed into place by close(), so an interrupted batch never leaves a truncated
+    archive under the final name; abort() removes it instead.
+    """
+    def __init__(self, archive_path, kind):
+        self.archive_path = archive_path
+        self.kind = kind
+        self.lock = threading.Lock()
+        self.names = set()
+        self.partial_path = os.path.join(os.path.dirname(archive_path),
+                                         f".{os.path.basename(archive_path)}.{os.getpid()}.part")
+        if kind == ARCHIVE_OUTPUT_ZIP:
+            self.archive = zipfile.ZipFile(self.partial_path, 'w', zipfile.ZIP_STORED, allowZip64=True)
+        else:
+            self.archive = tarfile.open(self.partial_path, 'w')
+
+    def add(self, file_path, arcname):
+        with self.lock:
+            # Never write two members with the same name
+            base, ext = os.path.splitext(arcname)
+            counter = 1
+            while arcname in self.names:
+                arcname = f"{base}_{counter}{ext}"
+                counter += 1
+            self.names.add(arcname)
+            if self.kind == ARCHIVE_OUTPUT_ZIP:
+                self.archive.write(file_path, arcname)
+            else:
+                self.archive.add(file_path, arcname, recursive=False)
+        return arcname
+
+    def close(self):
+        """Finish the archive and move it to its final name."""
+        with self.lock:
+            self.archive.close()
+            os.replace(self.partial_path, self.archive_path)
+
+    def abort(self):
+        """Drop the partial archive (the outputs added so far stay where they are)."""
+        with self.lock:
+            try:
+                self.archive.close()
+            except (OSError, tarfile.TarError, ValueError):
+                pass
+            try:
+                os.remove(self.partial_path)
+            except OSError:
+                pass
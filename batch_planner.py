@@ -0,0 +1,339 @@
+"""
+Pre-flight batch planner (dry run).
+Probes every input, estimates output sizes from the configured bitrate/quality and
+duration, estimates wall time from the historical per-codec throughput and compares
+the required space against the free space of each output device.
+The same per-job time estimates drive the job ordering policies used by convert_many().
+"""
+
+import asyncio
+import heapq
+import math
+import os
+import shutil
+
+from app_paths import get_data_file
+from archive_io import input_size
+from ffmpeg_run import probe_media
+from profiles import apply_profiles, job_settings
+from ffmpeg_commands import (resolve_video_codec, output_height, capped_fps, output_sample_rate,
+                             video_output_pixels, parse_probe_output, AUDIO_QUALITY_MAP, trim_range,
+                             trimmed_duration, parse_bitrate)
+from throughput import ThroughputHistory, codec_key, work_units
+import pillow_engine
+import image_sets
+
+VERDICT_OK = 'ok'
+VERDICT_WARN = 'warn'
+VERDICT_REFUSE = 'refuse'
+
+# Job ordering policies (values of the 'scheduling_policy' setting)
+POLICY_FIFO = 'FIFO' # drop order
+POLICY_SJF = 'Shortest First' # lowest mean time until each output is ready
+POLICY_LPT = 'Longest First' # shortest total batch time with several parallel jobs
+
+# Warn when the batch would leave less than this share of the current free space
+SPACE_MARGIN = 0.10
+PROBE_CONCURRENCY = 8
+
+# Approximate bits per output pixel, for quality-driven formats at quality 0 and 100
+IMAGE_BPP_BY_QUALITY = {
+    'webp': (0.3, 2.0),
+    'jpg': (0.4, 3.0),
+    'jpeg': (0.4, 3.0),
+    'avif': (0.15, 1.2)
+}
+# Approximate bits per output pixel for the remaining formats
+IMAGE_BPP = {
+    'png': 12, 'bmp': 24, 'tiff': 24, 'tif': 24, 'ico': 32, 'tga': 24,
+    'ppm': 24, 'pgm': 8, 'pbm': 1, 'pnm': 24, 'gif': 6, 'exr': 48, 'hdr': 32
+}
+# Approximate audio bitrates (bps) per quality level 0-5
+AUDIO_BITRATES = {
+    'mp3': [64000, 96000, 128000, 192000, 256000, 320000],
+    'ogg': [64000, 96000, 128000, 160000, 224000, 320000],
+    'm4a': [64000, 96000, 96000, 128000, 192000, 256000],
+    'opus': [32000, 64000, 96000, 128000, 192000, 256000]
+}
+VIDEO_AUDIO_BITRATE = 128000 # assumed for re-encoded audio tracks inside videos
+
+
+def human_size(size_bytes):
+    if size_bytes <= 0: return "0B"
+    units = ("B", "KB", "MB", "GB", "TB")
+    i = min(len(units) - 1, int(math.floor(math.log(size_bytes, 1024))))
+    return f"{round(size_bytes / math.pow(1024, i), 2)} {units[i]}"
+
+
+def human_duration(seconds):
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    if hours:
+        return f"{hours}h {minutes:02d}m"
+    if minutes:
+        return f"{minutes}m {secs:02d}s"
+    return f"{secs}s"
+
+
+def image_bpp(fmt, settings):
+    """Approximate bits per output pixel of an image format at the configured quality."""
+    fmt = fmt.lower()
+    if fmt in IMAGE_BPP_BY_QUALITY:
+        low, high = IMAGE_BPP_BY_QUALITY[fmt]
+        try:
+            quality = max(0, min(100, int(settings.get('image_quality', '80'))))
+        except ValueError:
+            quality = 80
+        bpp = low + (high - low) * quality / 100
+    else:
+        bpp = IMAGE_BPP.get(fmt, 24)
+    if settings.get('image_grayscale', 'false') == 'true':
+        bpp /= 3
+    return bpp
+
+
+def estimate_image_bytes(job, info, settings):
+    width, height = info['width'], info['height']
+    if not width or not height:
+        return info['size'] or input_size(job.input_path)
+
+    if image_sets.is_enabled(settings):
+        # Every width in every format
+        formats = image_sets.set_formats(settings, job.target_format)
+        outputs = image_sets.plan_outputs(job.output_path, image_sets.set_widths(settings), formats, width)
+        return int(sum(w * (height * w / width) * image_bpp(fmt, settings) / 8 for w, fmt, _ in outputs))
+
+    resize = settings.get('image_resize', '0')
+    if resize != '0' and resize.isdigit() and max(width, height) > int(resize):
+        scale = int(resize) / max(width, height)
+        width, height = width * scale, height * scale
+    if job.target_format == 'ico':
+        width, height = min(width, 256), min(height, 256)
+    return int(width * height * image_bpp(job.target_format, settings) / 8)
+
+
+def estimate_audio_bytes(job, info, settings):
+    duration = info['duration']
+    if duration <= 0:
+        return info['size'] or input_size(job.input_path)
+
+    fmt = job.target_format.lower()
+    channels = 1 if settings.get('audio_force_mono', 'false') == 'true' else (info['channels'] or 2)
+    sample_rate = output_sample_rate(settings, info['sample_rate']) or info['sample_rate'] or 44100
+
+    if fmt in ('wav', 'flac'):
+        bits = {'8 bits': 8, '16 bits': 16, '32 bits': 32}.get(settings.get('audio_sample_width', '16 bits'), 16)
+        pcm_bytes = duration * sample_rate * channels * (bits if fmt == 'wav' else 16) / 8
+        return int(pcm_bytes if fmt == 'wav' else pcm_bytes * 0.6)
+
+    q_level = AUDIO_QUALITY_MAP.get(settings.get('audio_quality', 'Normal'), 2)
+    bitrate = AUDIO_BITRATES.get(fmt, AUDIO_BITRATES['mp3'])[min(q_level, 5)]
+    if channels == 1:
+        bitrate *= 0.6
+    return int(duration * bitrate / 8)
+
+
+def estimate_video_bytes(job, info, settings, codec):
+    duration = info['duration']
+    if codec == 'copy' or duration <= 0:
+        return info['size'] or input_size(job.input_path)
+
+    if job.target_format == 'gif':
+        height = output_height(settings, info['height']) or info['height'] or 480
+        width = (info['width'] * height / info['height']) if info['height'] else height * 16 / 9
+        max_width = settings.get('gif_max_width', '480')
+        if max_width.isdigit() and max_width != '0' and width > int(max_width):
+            height, width = height * int(max_width) / width, int(max_width)
+        fps = capped_fps(settings.get('gif_fps', '15'), info['fps'], settings)
+        fps = int(fps) if fps else (info['fps'] or 30)
+        return int(width * height * fps * duration * IMAGE_BPP['gif'] / 8 / 4)
+
+    video_bps = parse_bitrate(settings.get('video_bitrate', '2500k'), 2500000)
+    a_codec = settings.get('audio_codec', 'aac')
+    if a_codec == 'No Audio' or not info['audio_codec']:
+        audio_bps = 0
+    elif a_codec == 'copy':
+        audio_bps = max(0, info['bit_rate'] - video_bps) or VIDEO_AUDIO_BITRATE
+    else:
+        audio_bps = VIDEO_AUDIO_BITRATE
+    # ~1% container overhead
+    return int((video_bps + audio_bps) * duration / 8 * 1.01)
+
+
+class JobEstimate:
+    """Probe result plus size and time estimates for one job."""
+    def __init__(self, job, info, output_bytes, seconds):
+        self.job = job
+        self.info = info
+        self.output_bytes = output_bytes
+        self.seconds = seconds
+
+
+class DeviceSpace:
+    """Space required on one output device versus what is free there."""
+    def __init__(self, device, path, free):
+        self.device = device
+        self.path = path
+        self.free = free
+        self.required = 0
+
+    @property
+    def fits(self):
+        return self.required <= self.free
+
+    @property
+    def tight(self):
+        return self.required > self.free * (1 - SPACE_MARGIN)
+
+
+def schedule_order(estimates, policy):
+    """
+    Indices into 'estimates' in the order jobs should start under 'policy'.
+    Jobs without an estimate (unsupported, finish instantly) go first; ties keep drop order.
+    """
+    indices = range(len(estimates))
+    if policy not in (POLICY_SJF, POLICY_LPT):
+        return list(indices)
+    unknown = [i for i in indices if estimates[i] is None]
+    known = [i for i in indices if estimates[i] is not None]
+    known.sort(key=lambda i: estimates[i].seconds, reverse=(policy == POLICY_LPT))
+    return unknown + known
+
+
+def simulate_makespan(durations, workers):
+    """Total time when jobs start in the given order, each on the first free of 'workers' slots."""
+    free_at = [0.0] * max(1, workers)
+    for seconds in durations:
+        heapq.heappush(free_at, heapq.heappop(free_at) + seconds)
+    return max(free_at)
+
+
+class BatchPlan:
+    """Result of plan_batch(): per-job estimates, per-device space and a verdict."""
+    def __init__(self, estimates, devices, concurrency, policy=POLICY_FIFO):
+        self.estimates = estimates
+        self.devices = devices
+        self.concurrency = max(1, concurrency)
+        self.policy = policy
+
+    @property
+    def input_bytes(self):
+        return sum(e.info['size'] or 0 for e in self.estimates)
+
+    @property
+    def output_bytes(self):
+        return sum(e.output_bytes for e in self.estimates)
+
+    @property
+    def wall_seconds(self):
+        ordered = [self.estimates[i].seconds for i in schedule_order(self.estimates, self.policy)]
+        return simulate_makespan(ordered, self.concurrency) if ordered else 0
+
+    @property
+    def verdict(self):
+        if any(not d.fits for d in self.devices):
+            return VERDICT_REFUSE
+        if any(d.tight for d in self.devices):
+            return VERDICT_WARN
+        return VERDICT_OK
+
+
+def existing_ancestor(path):
+    """Closest existing directory for a path whose folders may not be created yet."""
+    path = os.path.abspath(path)
+    while not os.path.isdir(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    return path
+
+
+def estimate_job(job, info, settings, history):
+    if not info['size']:
+        try:
+            info['size'] = input_size(job.input_path)
+        except OSError:
+            pass
+
+    start, end = trim_range(settings)
+    if (start or end) and job.media in ('video', 'audio') and info['duration'] > 0:
+        # Only the trimmed part is converted: scale duration and input size down to it
+        full = info['duration']
+        info = dict(info, duration=trimmed_duration(full, start, end))
+        info['size'] = int(info['size'] * info['duration'] / full)
+
+    pixels = 0
+    if job.media == 'video':
+        codec, _ = resolve_video_codec(settings)
+        output_bytes = estimate_video_bytes(job, info, settings, codec)
+        pixels = video_output_pixels(info['width'], info['height'], settings)
+    elif job.media == 'audio':
+        codec = job.target_format
+        output_bytes = estimate_audio_bytes(job, info, settings)
+    else:
+        codec = job.target_format
+        if image_sets.is_enabled(settings):
+            codec = image_sets.codec_name(image_sets.set_formats(settings, job.target_format))
+        elif pillow_engine.can_handle(job.input_path, job.target_format, settings):
+            codec = f"{codec}-pillow"
+        output_bytes = estimate_image_bytes(job, info, settings)
+
+    rate = history.rate(codec_key(job.media, codec))
+    seconds = rate * work_units(job.media, info['size'], info['duration'], pixels)
+    return JobEstimate(job, info, output_bytes, seconds)
+
+
+async def estimate_jobs(jobs, settings, history=None, probe_all=True, probe=None):
+    """
+    JobEstimates aligned with 'jobs' (None for unsupported ones).
+    With probe_all=False only videos (and trimmed audio) are probed: other image and audio
+    time estimates depend on the input size alone, so ordering a batch doesn't need an
+    ffprobe per file. 'probe' (default probe_media) lets a batch share its probes.
+    """
+    if history is None:
+        history = ThroughputHistory(get_data_file('throughput_history.json'))
+    probe = probe or probe_media
+    semaphore = asyncio.Semaphore(PROBE_CONCURRENCY)
+
+    async def estimate(job):
+        if not job.media or not job.output_path:
+            return None
+        own_settings = job_settings(job, settings)
+        if probe_all or job.media == 'video' or (job.media == 'audio' and any(trim_range(own_settings))):
+            async with semaphore:
+                info = await probe(job.input_path)
+        else:
+            info = parse_probe_output("")
+        return estimate_job(job, info, own_settings, history)
+
+    return await asyncio.gather(*(estimate(job) for job in jobs))
+
+
+async def plan_batch(jobs, settings, concurrency=1, history=None):
+    """Probe all supported jobs and build a BatchPlan without converting anything."""
+    await apply_profiles(jobs, settings)
+    estimates = [e for e in await estimate_jobs(jobs, settings, history) if e is not None]
+
+    devices = {}
+    for estimate in estimates:
+        out_dir = existing_ancestor(os.path.dirname(estimate.job.output_path))
+        device = os.stat(out_dir).st_dev
+        if device not in devices:
+            devices[device] = DeviceSpace(device, out_dir, shutil.disk_usage(out_dir).free)
+        devices[device].required += estimate.output_bytes
+
+    return BatchPlan(estimates, list(devices.values()), concurrency, settings.get('scheduling_policy', POLICY_FIFO))
+
+
+def format_plan(plan):
+    """Build a human-readable report of a BatchPlan."""
+    msg = f"Files: {len(plan.estimates)}\n"
+    msg += f"Total Input: {human_size(plan.input_bytes)}\n"
+    msg += f"Estimated Output: {human_size(plan.output_bytes)}\n"
+    msg += f"Estimated Time: {human_duration(plan.wall_seconds)} ({plan.concurrency} parallel, {plan.policy})\n"
+    for d in plan.devices:
+        state = "OK" if not d.tight else ("Tight" if d.fits else "NOT ENOUGH SPACE")
+        msg += f"\n{d.path}: needs {human_size(d.required)}, free {human_size(d.free)} [{state}]"
+    return msg
@@ -58,6 +58,27 @@ $PYINSTALLER_CMD --noconsole --onefile --clean \
     --add-data "$ROOT_DIR/logger.py:." \
     --add-data "$ROOT_DIR/config.py:." \
     --add-data "$ROOT_DIR/codec_manager.py:." \
+    --add-data "$ROOT_DIR/ffmpeg_commands.py:." \
+    --add-data "$ROOT_DIR/conversion_api.py:." \
+    --add-data "$ROOT_DIR/app_paths.py:." \
+    --add-data "$ROOT_DIR/dedupe.py:." \
+    --add-data "$ROOT_DIR/throughput.py:." \
+    --add-data "$ROOT_DIR/batch_planner.py:." \
+    --add-data "$ROOT_DIR/thumbnails.py:." \
+    --add-data "$ROOT_DIR/pillow_engine.py:." \
+    --add-data "$ROOT_DIR/loudness.py:." \
+    --add-data "$ROOT_DIR/job_queue.py:." \
+    --add-data "$ROOT_DIR/io_scheduler.py:." \
+    --add-data "$ROOT_DIR/hw_probe.py:." \
+    --add-data "$ROOT_DIR/archive_io.py:." \
+    --add-data "$ROOT_DIR/pipe_mode.py:." \
+    --add-data "$ROOT_DIR/proc_stats.py:." \
+    --add-data "$ROOT_DIR/prefetch.py:." \
+    --add-data "$ROOT_DIR/image_sets.py:." \
+    --add-data "$ROOT_DIR/adaptive_rate.py:." \
+    --add-data "$ROOT_DIR/profiles.py:." \
+    --add-data "$ROOT_DIR/verify.py:." \
+    --add-data "$ROOT_DIR/staging.py:." \
     main.py
 
 # 4. Download linuxdeploy into build_files
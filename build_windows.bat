@@ -83,6 +83,27 @@ set ADD_DATA=%ADD_DATA% --add-data "%BASE_DIR%converter_worker.py;."
 set ADD_DATA=%ADD_DATA% --add-data "%BASE_DIR%logger.py;."
 set ADD_DATA=%ADD_DATA% --add-data "%BASE_DIR%config.py;."
 set ADD_DATA=%ADD_DATA% --add-data "%BASE_DIR%codec_manager.py;."
+set ADD_DATA=%ADD_DATA% --add-data "%BASE_DIR%ffmpeg_commands.py;."
+set ADD_DATA=%ADD_DATA% --add-data "%BASE_DIR%conversion_api.py;."
+set ADD_DATA=%ADD_DATA% --add-data "%BASE_DIR%app_paths.py;."
+set ADD_DATA=%ADD_DATA% --add-data "%BASE_DIR%dedupe.py;."
+set ADD_DATA=%ADD_DATA% --add-data "%BASE_DIR%throughput.py;."
+set ADD_DATA=%ADD_DATA% --add-data "%BASE_DIR%batch_planner.py;."
+set ADD_DATA=%ADD_DATA% --add-data "%BASE_DIR%thumbnails.py;."
+set ADD_DATA=%ADD_DATA% --add-data "%BASE_DIR%pillow_engine.py;."
+set ADD_DATA=%ADD_DATA% --add-data "%BASE_DIR%loudness.py;."
+set ADD_DATA=%ADD_DATA% --add-data "%BASE_DIR%job_queue.py;."
+set ADD_DATA=%ADD_DATA% --add-data "%BASE_DIR%io_scheduler.py;."
+set ADD_DATA=%ADD_DATA% --add-data "%BASE_DIR%hw_probe.py;."
+set ADD_DATA=%ADD_DATA% --add-data "%BASE_DIR%archive_io.py;."
+set ADD_DATA=%ADD_DATA% --add-data "%BASE_DIR%pipe_mode.py;."
+set ADD_DATA=%ADD_DATA% --add-data "%BASE_DIR%proc_stats.py;."
+set ADD_DATA=%ADD_DATA% --add-data "%BASE_DIR%prefetch.py;."
+set ADD_DATA=%ADD_DATA% --add-data "%BASE_DIR%image_sets.py;."
+set ADD_DATA=%ADD_DATA% --add-data "%BASE_DIR%adaptive_rate.py;."
+set ADD_DATA=%ADD_DATA% --add-data "%BASE_DIR%profiles.py;."
+set ADD_DATA=%ADD_DATA% --add-data "%BASE_DIR%verify.py;."
+set ADD_DATA=%ADD_DATA% --add-data "%BASE_DIR%staging.py;."
 set ADD_DATA=%ADD_DATA% --add-data "%FFMPEG_EXE%;."
 set ADD_DATA=%ADD_DATA% --add-data "%FFPROBE_EXE%;."
 
@@ -2,6 +2,7 @@ import subprocess
 import os
 import re
 import sys
+import threading
 from logger import app_logger
 
 from config import HARDWARE_ENCODER_MAPPINGS
@@ -9,11 +10,24 @@ from config import HARDWARE_ENCODER_MAPPINGS
 class CodecManager:
     """
     Manages detection of available FFmpeg encoders (Software & Hardware).
+    Detection runs ffmpeg and the hardware self-tests, so it is started in the
+    background with ensure_detected() once the window is up; until it finishes,
+    get_compatible_codecs() offers the software encoders without waiting.
     """
+    DETECT_TIMEOUT = 15
+
     def __init__(self):
         self.available_codecs = set()
         self.hw_accelerated_codecs = {} # Map base_codec -> best_hw_codec
-        self._detect_codecs()
+        self.detected = False
+        self.lock = threading.Lock()
+
+    def ensure_detected(self):
+        """Detect encoders once; concurrent callers wait for the first run to finish."""
+        with self.lock:
+            if not self.detected:
+                self._detect_codecs()
+                self.detected = True
 
     def get_bin_path(self, bin_name):
         """Resolve path to bundled binaries if running in a PyInstaller bundle."""
@@ -33,7 +47,8 @@ class CodecManager:
         ffmpeg_bin = self.get_bin_path('ffmpeg')
         try:
             # Using -hide_banner to reduce output noise
-            result = subprocess.run([ffmpeg_bin, '-hide_banner', '-encoders'], capture_output=True, text=True)
+            result = subprocess.run([ffmpeg_bin, '-hide_banner', '-encoders'], capture_output=True, text=True,
+                                    timeout=self.DETECT_TIMEOUT)
             output = result.stdout
             
             # Regex to find codecs: " V..... codec_name "
@@ -52,10 +67,18 @@ class CodecManager:
             app_logger.error(f"Failed to detect codecs: {e}")
 
     def _map_hardware_codecs(self):
-        """Identify available hardware variants for standard codecs using configuration."""
+        """
+        Identify available hardware variants for standard codecs using configuration.
+        Only variants that pass the encoder self-test (see hw_probe) are used.
+        """
+        # Imported here, on the detection thread, to keep it out of startup
+        from hw_probe import get_encoder_health
+        compiled_in = [var for variants in HARDWARE_ENCODER_MAPPINGS.values()
+                       for var in variants if var in self.available_codecs]
+        working = get_encoder_health().check(compiled_in)
         for base, variants in HARDWARE_ENCODER_MAPPINGS.items():
             for var in variants:
-                if var in self.available_codecs:
+                if working.get(var):
                     # Found a hardware variant
                     self.hw_accelerated_codecs[base] = var
                     # Priority is handled by order in config list (first available match wins)
@@ -65,7 +88,10 @@ class CodecManager:
         """
         Filter and map codecs based on availability and HW setting.
         Returns a list of display names (which are just codec names).
+        Before detection has finished, the software codecs are returned as they are.
         """
+        if not self.detected:
+            return list(format_config_codecs)
         final_list = []
         
         for codec in format_config_codecs:
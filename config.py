@@ -11,6 +11,20 @@ IMAGE_FORMATS = [
     "pbm", "pnm", "gif", "exr", "hdr"
 ]
 
+# Downscaling: 'Quality' decodes every pixel, 'Balanced' and 'Fast' decode JPEGs at reduced
+# resolution (2x and 1x the target size) and finish with a lanczos scale
+IMAGE_RESIZE_MODES = ["Quality", "Balanced", "Fast"]
+
+# Image conversion backends: 'auto' uses in-process Pillow for common formats when installed
+IMAGE_ENGINES = ["auto", "ffmpeg"]
+
+# --- GIF Output Configurations ---
+# palettegen 'stats_mode': whole clip, moving parts only, or a palette per frame
+GIF_STATS_MODES = ["diff", "full", "single"]
+
+# paletteuse dithering; 'bayer:N' sets bayer_scale (higher = less visible pattern, more banding)
+GIF_DITHER_MODES = ["sierra2_4a", "floyd_steinberg", "sierra2", "bayer:2", "bayer:3", "bayer:5", "none"]
+
 # --- Audio Format Configurations ---
 AUDIO_FORMATS = ["mp3", "ogg", "flac", "wav", "m4a", "opus"]
 
@@ -78,6 +92,26 @@ AUDIO_SAMPLE_WIDTHS = ["8 bits", "16 bits", "32 bits"]
 # Resample rate options in kHz
 AUDIO_RESAMPLE_RATES = ["Original", "8", "11", "16", "22", "32", "44", "48", "96", "128"]
 
+# Write a batch's outputs into one archive instead of loose files
+ARCHIVE_OUTPUT_MODES = ["Off", "zip", "tar"]
+
+# Trimming: 'Exact' re-encodes from the nearest keyframe and cuts on the exact frame,
+# 'Copy' cuts on keyframes without re-encoding
+TRIM_MODES = ["Exact", "Copy"]
+
+# Video rate control: a fixed bitrate, or a CRF picked per file from short probe encodes
+VIDEO_RATE_MODES = ["Fixed Bitrate", "Adaptive"]
+VIDEO_ADAPTIVE_QUALITIES = ["High", "Balanced", "Small"]
+
+# Output checks after each conversion, from cheapest (see verify)
+VERIFY_LEVELS = ["Off", "Probe", "Sampled", "Full"]
+
+# Job start order within a batch (see batch_planner.schedule_order)
+SCHEDULING_POLICIES = ["FIFO", "Shortest First", "Longest First"]
+
+# EBU R128 loudness normalization modes (Album shares one gain per source folder)
+AUDIO_NORMALIZE_MODES = ["Off", "Track", "Album"]
+
 # Supported audio input extensions
 SUPPORTED_AUDIO_INPUT_EXTENSIONS = {
     ".mp3", ".ogg", ".flac", ".wav", ".m4a", ".opus", 
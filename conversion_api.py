@@ -0,0 +1,924 @@
+"""
+Asyncio conversion API.
+Runs the pure command builders from ffmpeg_commands with asyncio subprocesses and
+reports everything as ConversionEvent objects, so it can be driven from asyncio
+services directly or adapted to Qt signals by ConverterWorker.
+"""
+
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+from collections import deque
+
+from logger import app_logger
+from app_paths import get_data_file
+from dedupe import plan_duplicates, materialize, index_key, DedupeIndex
+from throughput import ThroughputHistory, codec_key, work_units
+from loudness import (LoudnessCache, loudness_targets, is_measurable, track_filter, album_gain, album_filter,
+                      NORMALIZE_TRACK, NORMALIZE_ALBUM)
+from io_scheduler import IOScheduler
+from archive_io import split_member_path, MemberReader, member_size, can_stream, spill_member
+from hw_probe import get_encoder_health
+from proc_stats import ResourceUsage, PeakMemoryHistory, format_sample, format_usage
+from prefetch import Prefetcher, prefetch_depth
+from ffmpeg_run import FFmpegRun, probe_media
+from profiles import apply_profiles, job_settings
+from batch_planner import estimate_jobs, schedule_order
+import pillow_engine
+import image_sets
+import adaptive_rate
+import verify
+import staging
+from ffmpeg_commands import (get_bin_path, media_kind, output_path_for, resolve_video_codec,
+                             software_fallback, parse_progress_seconds,
+                             media_probe_command, parse_probe_output, loudnorm_analysis_command,
+                             parse_loudnorm_output, segment_copy_command, concat_list_text, concat_command,
+                             image_command, image_set_command, audio_command, video_command, video_output_pixels,
+                             resize_decode_margin, LOWRES_EXTENSIONS, trim_range, trim_input_args,
+                             trimmed_duration, output_height, excerpt_reference_command, crf_probe_command,
+                             ssim_command, parse_ssim_output, decode_check_command, remux_command,
+                             parse_stream_params, join_mismatch)
+
+EVENT_STARTED = 'started'
+EVENT_PROGRESS = 'progress'
+EVENT_HW_FALLBACK = 'hw_fallback'
+EVENT_FINISHED = 'finished'
+EVENT_RESOURCES = 'resources'
+
+# A failed hardware encode is resumed in software only if at least this much was kept
+MIN_RESUME_SECONDS = 10
+SEAM_CHECK_SECONDS = 2.0 # decoded on each side of a resume seam
+
+
+class ConversionJob:
+    """A single input file with its resolved output path and target format."""
+    def __init__(self, input_path, output_path, media, target_format):
+        self.input_path = input_path
+        self.output_path = output_path
+        self.media = media # 'image', 'video', 'audio' or None if unsupported
+        self.target_format = target_format
+        self.options = {} # per-job extras (e.g. album gain filter, name of a spilled archive member)
+        self.outputs = [] # every file written, when a job writes more than output_path (image sets)
+        self.profile = None # name of the conversion profile a rule dispatched the job to
+        self.settings = None # the batch's settings with that profile's overrides
+
+    def output_paths(self):
+        return self.outputs or ([self.output_path] if self.output_path else [])
+
+
+class ConversionEvent:
+    """
+    Progress report yielded by convert() and convert_many().
+    'fraction' is the per-file progress (0.0-1.0); 'success', the byte counts and
+    'stats' (elapsed time, codec key, work units and resource usage of an actual encode)
+    are only set on EVENT_FINISHED. EVENT_RESOURCES carries a live proc_stats sample
+    of the job's FFmpeg process in 'stats'. 'dedupe_key' is the dedupe.index_key() a
+    finished encode is recorded under in the dedupe index once committed.
+    """
+    def __init__(self, kind, index, job, fraction=0.0, message="", success=None,
+                 orig_bytes=0, conv_bytes=0, stats=None):
+        self.kind = kind
+        self.index = index
+        self.job = job
+        self.fraction = fraction
+        self.message = message
+        self.success = success
+        self.orig_bytes = orig_bytes
+        self.conv_bytes = conv_bytes
+        self.stats = stats or {}
+        self.dedupe_key = None
+
+    def __repr__(self):
+        return f"ConversionEvent({self.kind}, #{self.index}, {self.fraction:.2f}, {self.message!r})"
+
+
+class BatchContext:
+    """Persistent indexes, caches and history shared by all jobs of one batch."""
+    def __init__(self, settings):
+        self.dedupe_index = None
+        if settings.get('dedupe_index', 'false') == 'true':
+            self.dedupe_index = DedupeIndex(get_data_file('dedupe_index.json'))
+        self.history = ThroughputHistory(get_data_file('throughput_history.json'))
+        self.loudness_cache = LoudnessCache(get_data_file('loudness_cache.json'))
+        self.rate_cache = adaptive_rate.AdaptiveRateCache(get_data_file('adaptive_rate_cache.json'))
+        self.peak_memory = PeakMemoryHistory(get_data_file('peak_memory.json'))
+        self.resource_sink = None # callable receiving EVENT_RESOURCES events, set by convert_many()
+        self.probes = {} # input path -> probe_media() task, shared by the prefetcher and the jobs
+        self.stager = staging.OutputStager(settings)
+
+    async def probe(self, path):
+        """probe_media() of a path, run at most once per batch."""
+        task = self.probes.get(path)
+        if task is None:
+            task = self.probes[path] = asyncio.ensure_future(probe_media(path))
+        # A cancelled job must not cancel a probe another job is waiting for
+        return await asyncio.shield(task)
+
+    def report_resources(self, index, job, sample):
+        if self.resource_sink is not None:
+            self.resource_sink(ConversionEvent(EVENT_RESOURCES, index, job, message=format_sample(sample),
+                                               stats=sample))
+
+    def save(self):
+        if self.dedupe_index is not None:
+            self.dedupe_index.save()
+        self.history.save()
+        self.loudness_cache.save()
+        self.rate_cache.save()
+        self.peak_memory.save()
+
+
+def configured_concurrency(settings):
+    """Number of parallel jobs from the 'conversion_concurrency' setting (at least 1)."""
+    try:
+        return max(1, int(settings.get('conversion_concurrency', '1')))
+    except (TypeError, ValueError):
+        return 1
+
+
+def build_jobs(files, target_formats, output_base_dir=""):
+    """
+    Resolve each file to a ConversionJob.
+    target_formats maps 'image'/'video'/'audio' to the target extension.
+    """
+    jobs = []
+    for path in files:
+        media = media_kind(path)
+        fmt = target_formats.get(media) if media else None
+        out_path = output_path_for(path, fmt, output_base_dir) if fmt else None
+        jobs.append(ConversionJob(path, out_path, media, fmt))
+    return jobs
+
+
+async def probe_output(path):
+    """
+    ffprobe an output for verification: (info, error), with error = ffprobe's message
+    when it can't read the file. (None, None) when ffprobe itself isn't available.
+    """
+    run = FFmpegRun(media_probe_command(path, get_bin_path('ffprobe')))
+    try:
+        output = [line async for line in run.lines()]
+    except OSError as e:
+        app_logger.warning(f"Verification probe skipped, ffprobe not available: {e}")
+        return None, None
+    if run.returncode != 0:
+        errors = run.error_output().strip().splitlines()
+        return None, errors[-1] if errors else f"exit code {run.returncode}"
+    return parse_probe_output('\n'.join(output)), None
+
+
+async def verify_output(job, settings, context):
+    """
+    Check a finished job's outputs at the 'verify_outputs' level (see verify).
+    Returns {'level', 'ok', 'problem', 'seconds'}.
+    """
+    level = verify.verify_level(settings)
+    started_at = time.monotonic()
+    expected = 0.0
+    if job.media in ('video', 'audio') and split_member_path(job.input_path) is None:
+        expected = verify.expected_duration(await context.probe(job.input_path), settings)
+    problem = None
+    for path in job.output_paths():
+        info, error = await probe_output(path)
+        if error:
+            problem = f"unreadable: {error}"
+        elif info is not None:
+            problem = verify.check_probe(info, job.media, expected)
+        if problem is None and level != verify.VERIFY_PROBE:
+            samples = []
+            if level == verify.VERIFY_SAMPLED and job.media != 'image':
+                samples = verify.plan_samples(info['duration'] if info else expected)
+            run = FFmpegRun(decode_check_command(path, samples, get_bin_path('ffmpeg')))
+            problem = verify.decode_problem(await run.run(), run.output_tail)
+        if problem:
+            problem = f"{os.path.basename(path)}: {problem}"
+            break
+    return {'level': level, 'ok': problem is None, 'problem': problem, 'seconds': time.monotonic() - started_at}
+
+
+async def verify_finished(event, settings, context):
+    """
+    Verify a successful EVENT_FINISHED while its outputs are still staged; a failed
+    check turns it into a failure, so commit_outputs() discards them instead.
+    """
+    result = await verify_output(event.job, settings, context)
+    event.stats['verify'] = result
+    name = os.path.basename(event.job.input_path)
+    if result['ok']:
+        app_logger.info(f"Verified {name}: {verify.format_result(result)}")
+        return
+    app_logger.error(f"Verification failed for {name}: {verify.format_result(result)}")
+    event.success = False
+    event.message = result['problem']
+    event.conv_bytes = 0
+
+
+async def measure_loudness(path, targets, cache, trim=(0, 0)):
+    """
+    First loudnorm pass for a file, served from the cache when the file is unchanged.
+    A trimmed segment is measured on its own and not cached (the cache is per whole file).
+    """
+    key = None if any(trim) else cache.key_for(path, targets)
+    measured = cache.get(key) if key else None
+    if measured is not None:
+        app_logger.info(f"Loudness analysis cached: {os.path.basename(path)}")
+        return measured
+
+    cmd = loudnorm_analysis_command(path, *targets, get_bin_path('ffmpeg'), trim_input_args(*trim))
+    app_logger.info(f"Loudness analysis command: {' '.join(cmd)}")
+    run = FFmpegRun(cmd)
+    # The JSON block is longer than the default error tail
+    run.output_tail = deque(maxlen=200)
+    if await run.run() != 0:
+        app_logger.error(f"Loudness analysis failed: {run.error_output()}")
+        return None
+    measured = parse_loudnorm_output(run.error_output())
+    if measured is not None and key:
+        cache.put(key, measured)
+    return measured
+
+
+async def choose_adaptive_rate(job, settings, info, codec, context):
+    """
+    Adaptive rate control for one video: the cached decision, or a CRF search over probe
+    encodes of a few low-resolution excerpts. None when probing fails (the fixed
+    bitrate is used then).
+    """
+    probed = adaptive_rate.probed_codec(codec)
+    target = adaptive_rate.quality_target(settings)
+    height = adaptive_rate.probe_height(output_height(settings, info['height']) or info['height'])
+    trim = trim_range(settings)
+    key = context.rate_cache.key_for(job.input_path, probed, target, height, trim)
+    decision = context.rate_cache.get(key)
+    if decision is not None:
+        app_logger.info(f"Adaptive rate cached: {os.path.basename(job.input_path)} CRF {decision['crf']}")
+        return decision
+
+    excerpts = adaptive_rate.plan_excerpts(trim[0], trimmed_duration(info['duration'], *trim))
+    ffmpeg_bin = get_bin_path('ffmpeg')
+    work_dir = await asyncio.to_thread(tempfile.mkdtemp, prefix="yaofc_crf_")
+    try:
+        reference = os.path.join(work_dir, 'reference.mkv')
+        run = FFmpegRun(excerpt_reference_command(job.input_path, reference, excerpts, height, ffmpeg_bin))
+        if await run.run() != 0:
+            app_logger.error(f"Adaptive rate probe failed: {run.error_output()}")
+            return None
+
+        async def measure(crf):
+            encoded = os.path.join(work_dir, f"crf{crf}.mkv")
+            run = FFmpegRun(crf_probe_command(reference, encoded, probed, crf, ffmpeg_bin))
+            if await run.run() != 0:
+                app_logger.error(f"Adaptive rate probe failed: {run.error_output()}")
+                return None
+            run = FFmpegRun(ssim_command(encoded, reference, ffmpeg_bin))
+            ssim = parse_ssim_output(run.error_output()) if await run.run() == 0 else None
+            return None if ssim is None else (ssim, os.path.getsize(encoded))
+
+        result = await adaptive_rate.search_crf(measure, adaptive_rate.CRF_RANGES[probed], target)
+    finally:
+        await asyncio.to_thread(shutil.rmtree, work_dir, True)
+    if result is None:
+        return None
+
+    crf, ssim, size = result
+    seconds = sum(length for _, length in excerpts)
+    decision = {'codec': probed, 'crf': crf, 'ssim': round(ssim, 4), 'bitrate': int(size * 8 / seconds),
+                'probe_height': height}
+    app_logger.info(f"Adaptive rate for {os.path.basename(job.input_path)}: {probed} CRF {crf} "
+                    f"(SSIM {ssim:.4f}, {decision['bitrate'] // 1000} kb/s at {height}p)")
+    context.rate_cache.put(key, decision)
+    return decision
+
+
+async def plan_album_gains(jobs, settings, context):
+    """
+    Album mode: one shared gain per source folder, stored in each audio job's options.
+    Uses cached per-track measurements, so only new or changed tracks are analyzed.
+    """
+    albums = {}
+    for job in jobs:
+        if (job.media == 'audio' and job.output_path and split_member_path(job.input_path) is None
+                and job_settings(job, settings).get('audio_normalize', 'Off') == NORMALIZE_ALBUM):
+            # Tracks of one folder sent to different profiles are separate albums
+            key = (os.path.dirname(os.path.abspath(job.input_path)), job.profile)
+            albums.setdefault(key, []).append(job)
+
+    for (folder, _), album_jobs in albums.items():
+        album_settings = job_settings(album_jobs[0], settings)
+        targets = loudness_targets(album_settings)
+        trim = trim_range(album_settings)
+        tracks = []
+        for job in album_jobs:
+            measured = await measure_loudness(job.input_path, targets, context.loudness_cache, trim)
+            duration = 0
+            if is_measurable(measured):
+                duration = trimmed_duration((await context.probe(job.input_path))['duration'], *trim)
+            tracks.append((measured, duration))
+        gain = album_gain(tracks, targets)
+        if gain is None:
+            continue
+        app_logger.info(f"Album gain for {folder}: {gain:.2f} dB over {len(album_jobs)} tracks")
+        for job in album_jobs:
+            job.options['audio_filter'] = album_filter(gain)
+
+
+async def salvage_partial(partial_path, head_path, length_seconds):
+    """
+    Stream-copy the readable start of a failed encode into 'head_path'.
+    Returns the seconds actually kept, or 0 when the partial output is unusable.
+    """
+    if not os.path.exists(partial_path) or os.path.getsize(partial_path) == 0:
+        return 0
+    run = FFmpegRun(segment_copy_command(partial_path, head_path, length_seconds, get_bin_path('ffmpeg')))
+    kept = 0
+    async for line in run.lines():
+        secs = parse_progress_seconds(line)
+        if secs is not None:
+            kept = secs
+    if run.returncode != 0:
+        app_logger.warning(f"Partial output not recoverable: {run.error_output()}")
+        return 0
+    return kept if kept >= MIN_RESUME_SECONDS else 0
+
+
+async def probe_streams(path):
+    """Stream parameters of a segment (see parse_stream_params), or None when it can't be probed."""
+    run = FFmpegRun(media_probe_command(path, get_bin_path('ffprobe')))
+    try:
+        output = [line async for line in run.lines()]
+    except OSError as e:
+        app_logger.warning(f"Can't probe {os.path.basename(path)}: {e}")
+        return None
+    return parse_stream_params('\n'.join(output)) if run.returncode == 0 else None
+
+
+async def remux(input_path, output_path):
+    """Copy all streams of 'input_path' into the container of 'output_path'."""
+    run = FFmpegRun(remux_command(input_path, output_path, get_bin_path('ffmpeg')))
+    if await run.run() != 0:
+        app_logger.error(f"Remuxing {os.path.basename(input_path)} failed: {run.error_output()}")
+        return False
+    return True
+
+
+async def join_resumed(head_path, tail_path, output_path, seam_seconds):
+    """
+    Join the salvaged head of a failed encode and the remainder encoded by another
+    encoder. Only segments with matching stream parameters are stream-copied, and
+    the result is decode-checked around the seam, where the parameter sets change.
+    False means the caller must re-encode the whole file.
+    """
+    head, tail = await probe_streams(head_path), await probe_streams(tail_path)
+    if head is None or tail is None:
+        app_logger.warning("Resume not joined: segment parameters unknown")
+        return False
+    mismatch = join_mismatch(head, tail)
+    if mismatch:
+        app_logger.warning(f"Resume not joined: {mismatch}")
+        return False
+    if not await join_segments([head_path, tail_path], output_path):
+        return False
+    seam = [(max(0.0, seam_seconds - SEAM_CHECK_SECONDS), 2 * SEAM_CHECK_SECONDS)]
+    run = FFmpegRun(decode_check_command(output_path, seam, get_bin_path('ffmpeg')))
+    problem = verify.decode_problem(await run.run(), run.output_tail)
+    if problem:
+        app_logger.warning(f"Resume not joined, seam at {seam_seconds:.1f}s is not decodable: {problem}")
+        return False
+    return True
+
+
+async def join_segments(segment_paths, output_path):
+    """Concatenate encoded segments into the final output without re-encoding."""
+    list_path = output_path + '.concat.txt'
+    with open(list_path, 'w', encoding='utf-8') as f:
+        f.write(concat_list_text(segment_paths))
+    try:
+        run = FFmpegRun(concat_command(list_path, output_path, get_bin_path('ffmpeg')))
+        if await run.run() != 0:
+            app_logger.error(f"Joining segments failed: {run.error_output()}")
+            return False
+        return True
+    finally:
+        os.remove(list_path)
+
+
+def materialize_duplicate(index, job, primary_event, stager):
+    """Produce the output of a duplicate input from its already converted twin (staged, then committed)."""
+    orig_size = os.path.getsize(job.input_path)
+    if not primary_event or not primary_event.success:
+        app_logger.error(f"Failed: {os.path.basename(job.input_path)} (duplicate of a failed input)")
+        return ConversionEvent(EVENT_FINISHED, index, job, fraction=1.0, success=False, orig_bytes=orig_size)
+
+    stager.stage(job)
+    try:
+        method = materialize(primary_event.job.output_path, job.output_path)
+        stager.commit(job)
+    except OSError:
+        stager.discard(job)
+        raise
+    app_logger.info(f"Finished: {os.path.basename(job.input_path)} ({method} of {primary_event.job.output_path})")
+    return ConversionEvent(EVENT_FINISHED, index, job, fraction=1.0, success=True, message=f"Duplicate ({method})",
+                           orig_bytes=orig_size, conv_bytes=os.path.getsize(job.output_path))
+
+
+async def convert(job, settings, index=0, context=None, commit=True):
+    """
+    Convert a single job, yielding ConversionEvents.
+    Always ends with exactly one EVENT_FINISHED event.
+    'context' is the BatchContext shared by a batch; a private one is used (and saved)
+    when converting a single file. With its DedupeIndex, outputs of identical inputs
+    from earlier runs are reused.
+    Outputs are written to a staging folder, verified ('verify_outputs') and renamed
+    into place only on success (see staging); the EVENT_FINISHED event comes after that
+    rename. With commit=False the outputs are still staged at EVENT_FINISHED and the
+    caller must pass the event to settle_outputs().
+    """
+    settings = job_settings(job, settings)
+    own_context = context is None
+    if own_context:
+        context = BatchContext(settings)
+    staged = False
+    try:
+        if job.media and job.output_path:
+            await asyncio.to_thread(context.stager.stage, job)
+            staged = True
+        member = split_member_path(job.input_path) if job.media else None
+        if member is None:
+            events = _convert(job, settings, index, context)
+        else:
+            events = _convert_member(job, settings, index, context, member)
+        async for event in events:
+            if event.kind == EVENT_FINISHED and staged:
+                staged = False
+                if commit:
+                    await settle_outputs(event, settings, context)
+            yield event
+    finally:
+        if staged:
+            context.stager.discard(job) # cancelled or crashed mid-way
+        if own_context:
+            context.stager.finish()
+            context.save()
+
+
+async def settle_outputs(event, settings, context, verify_semaphore=None):
+    """Verify a finished job's staged outputs when 'verify_outputs' asks for it, then commit them."""
+    if event.success and verify.is_enabled(settings):
+        if verify_semaphore is None:
+            await verify_finished(event, settings, context)
+        else:
+            async with verify_semaphore:
+                await verify_finished(event, settings, context)
+    await commit_outputs(event, context)
+
+
+async def commit_outputs(event, context):
+    """
+    Rename a finished job's staged outputs into place; a job that failed (or can't be
+    moved) leaves nothing. A committed encode is then recorded in the dedupe index.
+    """
+    stager = context.stager
+    if not event.success:
+        stager.discard(event.job)
+        return
+    try:
+        await asyncio.to_thread(stager.commit, event.job)
+    except OSError as e:
+        app_logger.error(f"Failed to move {os.path.basename(event.job.output_path)} into place: {e}")
+        stager.discard(event.job)
+        event.success = False
+        event.conv_bytes = 0
+        event.message = str(e)
+        return
+    if event.dedupe_key and context.dedupe_index is not None:
+        context.dedupe_index.record(event.dedupe_key, event.job.input_path, event.job.output_path)
+
+
+def member_streamable(job, settings, context, member):
+    """
+    Whether an archive member can be piped straight into the converter.
+    Videos (probing, retries, resume), track loudness analysis, image sets (probed
+    for their widths) and the dedupe index read the input more than once or need a
+    real path, so those spill.
+    """
+    if not can_stream(member[1]) or context.dedupe_index is not None:
+        return False
+    if job.media == 'audio':
+        return settings.get('audio_normalize', 'Off') != NORMALIZE_TRACK
+    return job.media == 'image' and not image_sets.is_enabled(settings)
+
+
+def needs_probe(job, settings):
+    """Whether _convert() probes this job's input, so the prefetcher can do it ahead."""
+    if job.media == 'video':
+        return True
+    if job.media == 'image':
+        if image_sets.is_enabled(settings):
+            return True
+        return (resize_decode_margin(settings) and os.path.splitext(job.input_path)[1].lower() in LOWRES_EXTENSIONS
+                and not pillow_engine.can_handle(job.input_path, job.target_format, settings))
+    if job.media == 'audio':
+        return (any(trim_range(settings)) or settings.get('audio_resample', 'Original') != 'Original'
+                or settings.get('audio_force_mono', 'false') == 'true'
+                or settings.get('audio_normalize', 'Off') == NORMALIZE_TRACK)
+    return False
+
+
+async def _convert_member(job, settings, index, context, member):
+    """Archive member input: streamed through a pipe, or spilled to a temporary file when needed."""
+    os.makedirs(os.path.dirname(job.output_path), exist_ok=True)
+    if member_streamable(job, settings, context, member):
+        async for event in _convert(job, settings, index, context, member):
+            yield event
+        return
+
+    spill_path = await asyncio.to_thread(spill_member, *member)
+    try:
+        local_job = ConversionJob(spill_path, job.output_path, job.media, job.target_format)
+        local_job.options = dict(job.options, source_name=os.path.basename(member[1]))
+        async for event in _convert(local_job, settings, index, context):
+            event.job = job # report the member, not the temporary file
+            job.outputs = local_job.outputs
+            yield event
+    finally:
+        os.remove(spill_path)
+
+
+async def _convert(job, settings, index, context, member=None):
+    """Conversion of one job; 'member' = (archive, name) pipes that archive member into FFmpeg's stdin."""
+    dedupe_index = context.dedupe_index
+    yield ConversionEvent(EVENT_STARTED, index, job, message=f"Processing: {os.path.basename(job.input_path)}")
+    app_logger.info(f"Starting: {job.input_path}")
+
+    if member:
+        orig_size = await asyncio.to_thread(member_size, *member)
+        ffmpeg_input, stdin_opener = 'pipe:0', lambda: MemberReader(*member)
+    else:
+        orig_size = os.path.getsize(job.input_path)
+        ffmpeg_input, stdin_opener = job.input_path, None
+    ffmpeg_bin = get_bin_path('ffmpeg')
+    work_bytes = orig_size # input processed, for the throughput history
+    resolution = 'original' # output size label for the peak memory history
+    runs = [] # FFmpeg runs of this job, for its resource usage
+
+    def ffmpeg_run(cmd, stdin_opener=None):
+        run = FFmpegRun(cmd, stdin_opener, lambda sample: context.report_resources(index, job, sample))
+        runs.append(run)
+        return run
+
+    success = False
+    content_key = None
+    used_codec = job.target_format
+    duration = 0
+    pixels = 0
+
+    # An image set is several files, the index maps an input to one output
+    image_set = job.media == 'image' and image_sets.is_enabled(settings)
+    if dedupe_index is not None and job.media and not image_set:
+        content_key = await asyncio.to_thread(index_key, job.input_path, job.media, job.target_format, settings)
+        previous_output = await asyncio.to_thread(dedupe_index.lookup, content_key, job.input_path)
+        if previous_output:
+            method = await asyncio.to_thread(materialize, previous_output, job.output_path)
+            app_logger.info(f"Finished: {os.path.basename(job.input_path)} (reused {previous_output} via {method})")
+            yield ConversionEvent(EVENT_FINISHED, index, job, fraction=1.0, success=True, message=f"Reused ({method})",
+                                  orig_bytes=orig_size, conv_bytes=os.path.getsize(job.output_path))
+            return
+
+    started_at = time.monotonic()
+    if job.media is None:
+        app_logger.warning(f"Skipping unsupported format: {os.path.splitext(job.input_path)[1].lower()}")
+
+    elif job.media == 'video':
+        v_codec, used_hw = resolve_video_codec(settings)
+        info = await context.probe(job.input_path)
+        # Progress and throughput are measured against the trimmed part only
+        duration = trimmed_duration(info['duration'], *trim_range(settings))
+        pixels = video_output_pixels(info['width'], info['height'], settings)
+        height = output_height(settings, info['height']) or info['height']
+        resolution = f"{height}p" if height else 'unknown'
+
+        # Skip hardware encoders that failed their self-test instead of failing a full encode
+        sw_codec = software_fallback(v_codec)
+        if sw_codec != v_codec and not await asyncio.to_thread(get_encoder_health().works, v_codec):
+            fail_msg = f"Hardware Encoder ({v_codec}) Unavailable! Using Software ({sw_codec})."
+            app_logger.warning(fail_msg)
+            yield ConversionEvent(EVENT_HW_FALLBACK, index, job, message=fail_msg)
+            v_codec, used_hw = sw_codec, False
+
+        # Adaptive rate control: a CRF (or bitrate) picked per file instead of the fixed bitrate
+        rate_decision = None
+        if adaptive_rate.is_adaptive(settings) and v_codec not in ('copy', 'gif'):
+            rate_decision = await choose_adaptive_rate(job, settings, info, v_codec, context)
+
+        # Attempt 1: Originally selected codec as specified by UI
+        attempts = [(v_codec, used_hw, False)] # (codec, is_hw, may resume from the failure point)
+        sw_fallback = software_fallback(v_codec)
+        if used_hw and sw_fallback != v_codec:
+            # Attempt 2: Fallback to software if HW failed, keeping what HW already encoded
+            attempts.append((sw_fallback, False, True))
+
+        # A HW attempt that may be resumed writes Matroska first: it stays readable when the
+        # encoder dies (an mp4/mov without its index is not), and is remuxed on success.
+        # Segments of a resumed encode: the salvaged HW part and the software remainder.
+        hw_path = job.output_path + '.hw.mkv' if len(attempts) > 1 else None
+        head_path = job.output_path + '.head.mkv'
+        tail_path = job.output_path + '.tail.mkv'
+        last_secs = 0 # output time reached by the previous attempt
+        try:
+            attempt = 0
+            while attempt < len(attempts):
+                codec, is_hw, may_resume = attempts[attempt]
+                resume_at = 0
+                if attempt > 0:
+                    if may_resume and duration > 0 and last_secs >= MIN_RESUME_SECONDS:
+                        resume_at = await salvage_partial(hw_path or job.output_path, head_path, last_secs)
+                    where = f" at {resume_at:.1f}s" if resume_at else ""
+                    fail_msg = f"Hardware Encoding ({v_codec}) Failed! Switched to Software ({codec}){where}."
+                    app_logger.warning(fail_msg)
+                    yield ConversionEvent(EVENT_HW_FALLBACK, index, job, message=fail_msg)
+
+                target_path = tail_path if resume_at else job.output_path
+                if is_hw and hw_path:
+                    target_path = hw_path
+                codec_settings = settings
+                if rate_decision:
+                    codec_settings = adaptive_rate.rate_settings(settings, codec, rate_decision, height)
+                cmd = video_command(job.input_path, target_path, codec, codec_settings, is_hw, ffmpeg_bin, resume_at,
+                                    info)
+                app_logger.info(f"FFmpeg command (HW={is_hw}): {' '.join(cmd)}")
+                run = ffmpeg_run(cmd)
+                last_secs = 0
+                async for line in run.lines():
+                    secs = parse_progress_seconds(line)
+                    if secs is not None:
+                        last_secs = secs
+                        if duration > 0:
+                            # Progress continues from the resume point
+                            yield ConversionEvent(EVENT_PROGRESS, index, job,
+                                                  fraction=min(1.0, (resume_at + secs) / duration))
+
+                success = run.returncode == 0
+                if success and target_path == hw_path:
+                    success = await remux(hw_path, job.output_path)
+                    if not success:
+                        last_secs = 0 # nothing to resume from, re-encode in software
+                if success and resume_at:
+                    success = await join_resumed(head_path, tail_path, job.output_path, resume_at)
+                if not success and resume_at:
+                    # Resuming didn't work out: re-encode the whole file in software as before
+                    attempts.append((codec, False, False))
+                if success:
+                    used_codec = codec
+                    break
+                if run.returncode != 0:
+                    app_logger.error(f"FFmpeg video error: {run.error_output()}")
+                attempt += 1
+        finally:
+            for segment in (hw_path, head_path, tail_path):
+                if segment and os.path.exists(segment):
+                    os.remove(segment)
+
+    elif image_set:
+        source = await context.probe(job.input_path)
+        formats = image_sets.set_formats(settings, job.target_format)
+        outputs = image_sets.plan_outputs(job.output_path, image_sets.set_widths(settings), formats, source['width'])
+        source_size = None
+        if os.path.splitext(job.input_path)[1].lower() in LOWRES_EXTENSIONS:
+            source_size = (source['width'], source['height'])
+        cmd = image_set_command(job.input_path, outputs, settings, ffmpeg_bin, source_size)
+        app_logger.info(f"Image set command: {' '.join(cmd)}")
+        run = ffmpeg_run(cmd)
+        success = await run.run() == 0
+        if success:
+            used_codec = image_sets.codec_name(formats)
+            job.outputs = [path for _, _, path in outputs]
+            if settings.get('image_set_manifest', 'false') == 'true':
+                manifest = image_sets.manifest_path(job.output_path)
+                try:
+                    source_name = job.options.get('source_name') or os.path.basename(job.input_path)
+                    image_sets.write_manifest(manifest, source_name, (source['width'], source['height']), outputs)
+                    job.outputs.append(manifest)
+                except OSError as e:
+                    app_logger.warning(f"Failed to write image set manifest {manifest}: {e}")
+        else:
+            app_logger.error(f"FFmpeg error: {run.error_output()}")
+
+    else:
+        if job.media == 'image' and pillow_engine.can_handle(job.input_path, job.target_format, settings):
+            app_logger.info(f"Image conversion (Pillow): {job.input_path} -> {job.output_path}")
+            loop = asyncio.get_running_loop()
+
+            def run_pillow():
+                if member is None:
+                    return pillow_engine.convert_image(job.input_path, job.output_path, job.target_format, settings)
+                with MemberReader(*member) as source:
+                    return pillow_engine.convert_image(source, job.output_path, job.target_format, settings)
+            try:
+                success = await loop.run_in_executor(pillow_engine.get_executor(), run_pillow)
+                used_codec = f"{job.target_format}-pillow"
+            except Exception as e:
+                app_logger.warning(f"Pillow failed ({e}), falling back to FFmpeg.")
+
+        if not success:
+            if job.media == 'image':
+                source_size = None
+                if (resize_decode_margin(settings) and not member
+                        and os.path.splitext(job.input_path)[1].lower() in LOWRES_EXTENSIONS):
+                    info = await context.probe(job.input_path)
+                    source_size = (info['width'], info['height'])
+                cmd = image_command(ffmpeg_input, job.output_path, job.target_format, settings, ffmpeg_bin,
+                                    source_size)
+                app_logger.info(f"Image conversion command: {' '.join(cmd)}")
+            else:
+                af = job.options.get('audio_filter')
+                if af is None and settings.get('audio_normalize', 'Off') == NORMALIZE_TRACK:
+                    targets = loudness_targets(settings)
+                    measured = await measure_loudness(job.input_path, targets, context.loudness_cache,
+                                                      trim_range(settings))
+                    if is_measurable(measured):
+                        af = track_filter(targets, measured, (await context.probe(job.input_path))['sample_rate'])
+                    else:
+                        app_logger.warning(f"Loudness not measurable, skipping normalization: {job.input_path}")
+                trim = trim_range(settings)
+                source = None
+                if not member and (any(trim) or settings.get('audio_resample', 'Original') != 'Original'
+                                   or settings.get('audio_force_mono', 'false') == 'true'):
+                    # Source rate/channels let no-op resampling and downmixing be skipped
+                    source = await context.probe(job.input_path)
+                    if any(trim) and source['duration'] > 0:
+                        # Only the trimmed share of the input is decoded
+                        work_bytes = orig_size * trimmed_duration(source['duration'], *trim) / source['duration']
+                cmd = audio_command(ffmpeg_input, job.output_path, job.target_format, settings, ffmpeg_bin, af,
+                                    source)
+                app_logger.info(f"Audio conversion command: {' '.join(cmd)}")
+
+            run = ffmpeg_run(cmd, stdin_opener)
+            success = await run.run() == 0
+            if not success:
+                app_logger.error(f"FFmpeg error: {run.error_output()}")
+
+    usage = ResourceUsage()
+    for run in runs:
+        if run.monitor is not None:
+            usage.add(run.monitor)
+    resources = usage.summary()
+    if resources:
+        app_logger.info(f"Resources for {os.path.basename(job.input_path)}: {format_usage(resources)}")
+
+    conv_size = 0
+    stats = {}
+    output_paths = job.output_paths()
+    if success and output_paths and all(os.path.exists(path) for path in output_paths):
+        conv_size = sum(os.path.getsize(path) for path in output_paths)
+        app_logger.info(f"Finished: {os.path.basename(job.input_path)}")
+        stats = {
+            'elapsed': time.monotonic() - started_at,
+            'codec_key': codec_key(job.media, used_codec),
+            'work_units': work_units(job.media, work_bytes, duration, pixels)
+        }
+        context.history.record(stats['codec_key'], stats['work_units'], stats['elapsed'])
+        if resources:
+            stats['resources'] = resources
+            if image_set:
+                resolution = f"{max(width for width, _, _ in outputs)}w"
+            elif job.media == 'image':
+                resize = settings.get('image_resize', '0')
+                resolution = f"{resize}px" if resize.isdigit() and resize != '0' else 'original'
+            context.peak_memory.record(stats['codec_key'], resolution, resources['peak_rss'])
+    else:
+        success = False
+        app_logger.error(f"Failed: {os.path.basename(job.input_path)}")
+
+    finished = ConversionEvent(EVENT_FINISHED, index, job, fraction=1.0, success=success,
+                               orig_bytes=orig_size, conv_bytes=conv_size, stats=stats)
+    if success:
+        finished.dedupe_key = content_key
+    yield finished
+
+
+async def convert_many(jobs, settings, concurrency=1, should_cancel=None):
+    """
+    Convert jobs with at most 'concurrency' FFmpeg processes at once, yielding the
+    merged ConversionEvents of all jobs as they happen. 'should_cancel' is polled
+    before each job starts; jobs not started yet are skipped once it returns True.
+
+    Settings 'dedupe_inputs' converts byte-identical inputs only once and
+    'dedupe_index' reuses outputs of identical inputs across runs.
+    Timings of finished encodes feed the ThroughputHistory used by batch_planner.
+    'audio_normalize' = 'Album' measures all audio first to share one gain per folder.
+    'io_scheduling' adds per-device limits (see io_scheduler); a job waits for its device
+    slots before taking one of the global slots, so jobs on other devices can still run.
+    'scheduling_policy' sets the start order (see batch_planner.schedule_order); events
+    keep the original job indices.
+    'prefetch_depth' probes and reads ahead that many upcoming jobs while others encode
+    (see prefetch).
+    'conversion_profiles' first dispatches the jobs to profiles by the rule table (see
+    apply_profiles); each job then converts with its profile's format and settings.
+    'verify_outputs' checks each staged output after its job has left the encode slots
+    (see verify), and only outputs that pass are renamed into place; the job's
+    EVENT_FINISHED is held back until then and carries the result in stats['verify'].
+    """
+    queue = asyncio.Queue()
+    semaphore = asyncio.Semaphore(max(1, int(concurrency)))
+    verify_semaphore = asyncio.Semaphore(max(1, int(concurrency)))
+    io_scheduler = IOScheduler(settings)
+    done_marker = object()
+
+    context = BatchContext(settings)
+    context.resource_sink = queue.put_nowait
+    await apply_profiles(jobs, settings, context.probe)
+
+    followers = {} # primary job index -> indices of byte-identical jobs
+    if settings.get('dedupe_inputs', 'false') == 'true':
+        followers = await asyncio.to_thread(plan_duplicates, jobs)
+        # Only copies converted the same way can share an output
+        followers = {i: [d for d in dups if jobs[d].profile == jobs[i].profile] for i, dups in followers.items()}
+        duplicate_count = sum(len(v) for v in followers.values())
+        if duplicate_count:
+            app_logger.info(f"Dedupe: {duplicate_count} duplicate inputs will reuse converted outputs.")
+    # Duplicates are materialized from a single output file
+    followers = {i: dups for i, dups in followers.items()
+                 if dups and not (jobs[i].media == 'image' and image_sets.is_enabled(job_settings(jobs[i], settings)))}
+    skipped = {i for dups in followers.values() for i in dups}
+
+    if any(job.media == 'audio' and job_settings(job, settings).get('audio_normalize', 'Off') == NORMALIZE_ALBUM
+           for job in jobs):
+        await plan_album_gains(jobs, settings, context)
+
+    prefetcher = None
+
+    async def worker(index, job):
+        try:
+            finished = None
+            async with io_scheduler.slot(job), semaphore:
+                if should_cancel and should_cancel():
+                    return
+                if prefetcher:
+                    await prefetcher.job_started(index)
+                try:
+                    async for event in convert(job, settings, index, context, commit=False):
+                        if event.kind == EVENT_FINISHED:
+                            finished = event
+                        else:
+                            await queue.put(event)
+                except Exception as e:
+                    app_logger.error(f"Error in worker: {str(e)}")
+                    finished = ConversionEvent(EVENT_FINISHED, index, job, fraction=1.0, success=False,
+                                               message=str(e))
+                finally:
+                    if prefetcher:
+                        await prefetcher.job_finished(index)
+
+            # Outside the slots: the next job encodes while this output is checked and committed
+            await settle_outputs(finished, job_settings(job, settings), context, verify_semaphore)
+            await queue.put(finished)
+
+            for dup_index in followers.get(index, []):
+                dup_job = jobs[dup_index]
+                await queue.put(ConversionEvent(EVENT_STARTED, dup_index, dup_job,
+                                                message=f"Processing: {os.path.basename(dup_job.input_path)}"))
+                try:
+                    await queue.put(await asyncio.to_thread(materialize_duplicate, dup_index, dup_job, finished,
+                                                            context.stager))
+                except Exception as e:
+                    app_logger.error(f"Error in worker: {str(e)}")
+                    await queue.put(ConversionEvent(EVENT_FINISHED, dup_index, dup_job, fraction=1.0,
+                                                    success=False, message=str(e)))
+        finally:
+            await queue.put(done_marker)
+
+    order = range(len(jobs))
+    policy = settings.get('scheduling_policy', 'FIFO')
+    if policy != 'FIFO' and len(jobs) > 1:
+        estimates = await estimate_jobs(jobs, settings, context.history, probe_all=False, probe=context.probe)
+        order = schedule_order(estimates, policy)
+        app_logger.info(f"Job order: {policy}, starting with {os.path.basename(jobs[order[0]].input_path)}")
+
+    order = [i for i in order if i not in skipped]
+    depth = prefetch_depth(settings)
+    if depth and len(order) > 1:
+        async def probe_ahead(job):
+            if needs_probe(job, job_settings(job, settings)):
+                await context.probe(job.input_path)
+        prefetcher = Prefetcher(jobs, order, depth, probe_ahead, io_scheduler)
+
+    # Waiters on asyncio semaphores are served in creation order, so this sets the start order
+    tasks = [asyncio.create_task(worker(i, jobs[i])) for i in order]
+    if prefetcher:
+        tasks.append(asyncio.create_task(prefetcher.run()))
+    try:
+        remaining = len(order)
+        while remaining:
+            event = await queue.get()
+            if event is done_marker:
+                remaining -= 1
+                continue
+            yield event
+    finally:
+        for task in tasks + list(context.probes.values()):
+            task.cancel()
+        await asyncio.gather(*tasks, *context.probes.values(), return_exceptions=True)
+        await asyncio.to_thread(context.stager.finish)
+        context.save()
@@ -0,0 +1,230 @@
+"""
+Content-hash deduplication of conversion inputs.
+Inputs are grouped by size, then by a sampled hash (head/middle/tail), and only
+sampled collisions of large files are confirmed with a full hash. Each unique input
+is converted once and the other outputs are materialized by reflink, hardlink or copy.
+"""
+
+import os
+import sys
+import json
+import shutil
+import hashlib
+
+from app_paths import JsonStore
+
+SAMPLE_SIZE = 1024 * 1024 # bytes read from head, middle and tail
+READ_CHUNK = 4 * 1024 * 1024
+FICLONE = 0x40049409 # Linux ioctl used by 'cp --reflink'
+
+
+def full_hash(path):
+    """BLAKE2b digest of the entire file."""
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(READ_CHUNK)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def sampled_hash(path, size=None):
+    """
+    Fast hash over the head, middle and tail of a file.
+    Files small enough to be covered by the samples are hashed in full,
+    in which case the result is exact.
+    """
+    if size is None:
+        size = os.path.getsize(path)
+    if size <= SAMPLE_SIZE * 3:
+        return full_hash(path), True
+
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(str(size).encode())
+    with open(path, 'rb') as f:
+        for offset in (0, size // 2 - SAMPLE_SIZE // 2, size - SAMPLE_SIZE):
+            f.seek(offset)
+            digest.update(f.read(SAMPLE_SIZE))
+    return digest.hexdigest(), False
+
+
+def group_duplicates(paths):
+    """
+    Group byte-identical files.
+    Returns a list of groups (lists of paths in input order); files without
+    duplicates come back as single-element groups.
+    """
+    by_size = {}
+    for path in paths:
+        try:
+            by_size.setdefault(os.path.getsize(path), []).append(path)
+        except OSError:
+            by_size.setdefault(None, []).append(path)
+
+    groups = []
+    for size, same_size in by_size.items():
+        if size is None or len(same_size) == 1:
+            groups.extend([p] for p in same_size)
+            continue
+
+        by_sample = {}
+        for path in same_size:
+            try:
+                key, exact = sampled_hash(path, size)
+            except OSError:
+                groups.append([path])
+                continue
+            by_sample.setdefault((key, exact), []).append(path)
+
+        for (_, exact), candidates in by_sample.items():
+            if exact or len(candidates) == 1:
+                groups.append(candidates)
+                continue
+            # Sampled collision on a large file: confirm with a full hash
+            by_full = {}
+            for path in candidates:
+                by_full.setdefault(full_hash(path), []).append(path)
+            groups.extend(by_full.values())
+
+    order = {path: i for i, path in enumerate(paths)}
+    groups.sort(key=lambda g: order[g[0]])
+    return groups
+
+
+def plan_duplicates(jobs):
+    """
+    Map the index of each job to convert to the indices of jobs with byte-identical
+    input and the same target, whose outputs can be materialized from it.
+    """
+    by_target = {}
+    for i, job in enumerate(jobs):
+        if job.media and job.output_path:
+            by_target.setdefault((job.media, job.target_format), []).append(i)
+
+    followers = {}
+    for indices in by_target.values():
+        if len(indices) < 2:
+            continue
+        path_to_indices = {}
+        for i in indices:
+            path_to_indices.setdefault(jobs[i].input_path, []).append(i)
+        for group in group_duplicates(list(path_to_indices)):
+            members = [i for path in group for i in path_to_indices[path]]
+            if len(members) > 1:
+                followers[members[0]] = members[1:]
+    return followers
+
+
+def _reflink(src, dst):
+    import fcntl
+    with open(src, 'rb') as fs, open(dst, 'wb') as fd:
+        fcntl.ioctl(fd.fileno(), FICLONE, fs.fileno())
+
+
+def materialize(src, dst):
+    """
+    Make 'dst' a copy of the already converted 'src' as cheaply as possible.
+    Tries a copy-on-write reflink, then a hardlink, then a regular copy.
+    Returns the method used.
+    """
+    if os.path.abspath(src) == os.path.abspath(dst):
+        return 'same'
+    if os.path.lexists(dst):
+        os.remove(dst)
+
+    if sys.platform.startswith('linux'):
+        try:
+            _reflink(src, dst)
+            return 'reflink'
+        except (OSError, ImportError):
+            if os.path.exists(dst):
+                os.remove(dst)
+    try:
+        os.link(src, dst)
+        return 'hardlink'
+    except OSError:
+        shutil.copy2(src, dst)
+        return 'copy'
+
+
+# Setting key prefixes that influence the output of each media class
+FINGERPRINT_PREFIXES = {
+    'image': ('image_', 'gif_'),
+    'video': ('video_', 'gif_', 'audio_codec', 'trim_'),
+    'audio': ('audio_', 'trim_')
+}
+
+
+def settings_fingerprint(media, target_format, settings):
+    """Identify the conversion parameters an output was produced with."""
+    prefixes = FINGERPRINT_PREFIXES.get(media, ('',))
+    relevant = sorted((str(k), str(v)) for k, v in settings.items() if str(k).startswith(prefixes))
+    payload = json.dumps([media, target_format, relevant])
+    return hashlib.blake2b(payload.encode(), digest_size=12).hexdigest()
+
+
+def index_key(path, media, target_format, settings):
+    """
+    Dedupe index key of converting 'path' with 'settings': (size, sampled hash, whether
+    that hash covers the whole file, settings fingerprint). Reads at most three samples.
+    """
+    size = os.path.getsize(path)
+    sample, exact = sampled_hash(path, size)
+    return size, sample, exact, settings_fingerprint(media, target_format, settings)
+
+
+class DedupeIndex(JsonStore):
+    """
+    Persistent content key -> output index, so identical inputs are reused across runs.
+    Entries are keyed by size and sampled hash; a sampled match of a large file is only
+    trusted once full hashes of the input and the recorded source agree. The output must
+    also still exist with the recorded size and mtime.
+    """
+    description = "dedupe index"
+
+    def lookup(self, key, input_path):
+        """Output recorded for 'key' (see index_key) from a source byte-identical to 'input_path', or None."""
+        size, sample, exact, fingerprint = key
+        entry_key = f"{size}:{sample}:{fingerprint}"
+        entry = self.get(entry_key)
+        if not entry:
+            return None
+        try:
+            st = os.stat(entry['output'])
+        except OSError:
+            return None
+        if st.st_size != entry['size'] or int(st.st_mtime) != entry['mtime']:
+            return None
+        if exact:
+            return entry['output']
+
+        # Sampled collision: confirm with full hashes, the source's computed once and kept
+        source_hash = entry.get('source_hash')
+        if source_hash is None:
+            try:
+                st = os.stat(entry['source'])
+                if st.st_size != size or int(st.st_mtime) != entry['source_mtime']:
+                    return None # the source changed or is gone: nothing left to compare with
+                source_hash = full_hash(entry['source'])
+            except OSError:
+                return None
+            self.put(entry_key, dict(entry, source_hash=source_hash))
+        return entry['output'] if full_hash(input_path) == source_hash else None
+
+    def record(self, key, input_path, output_path):
+        size, sample, exact, fingerprint = key
+        try:
+            st = os.stat(output_path)
+            source_mtime = int(os.stat(input_path).st_mtime)
+        except OSError:
+            return
+        self.put(f"{size}:{sample}:{fingerprint}", {
+            'output': os.path.abspath(output_path),
+            'size': st.st_size,
+            'mtime': int(st.st_mtime),
+            'source': os.path.abspath(input_path),
+            'source_mtime': source_mtime,
+            'source_hash': sample if exact else None # full hashes of large files only on a match
+        })
@@ -0,0 +1,868 @@
+"""
+Pure FFmpeg command builders.
+Every function here only turns settings into argument lists; nothing is executed,
+so the same logic can drive the Qt worker, the asyncio API or unit tests.
+"""
+
+import os
+import sys
+import json
+
+from config import (SUPPORTED_IMAGE_EXTENSIONS, SUPPORTED_VIDEO_EXTENSIONS,
+                    SUPPORTED_AUDIO_INPUT_EXTENSIONS, HARDWARE_ENCODER_MAPPINGS)
+from archive_io import split_member_path, archive_stem
+
+# Quality level mapping (0=worst, 5=best for internal use)
+AUDIO_QUALITY_MAP = {
+    'Very Low': 0, 'Low': 1, 'Normal': 2,
+    'High': 3, 'Very High': 4, 'Insanely High': 5
+}
+
+# Used when the HW accel toggle is off but an old HW codec is still stored in settings
+HW_TO_SW_CODECS = {
+    'h264_nvenc': 'libx264', 'h264_amf': 'libx264', 'h264_qsv': 'libx264',
+    'hevc_nvenc': 'libx265', 'hevc_amf': 'libx265', 'hevc_qsv': 'libx265',
+    'vp9_qsv': 'libvpx-vp9', 'av1_nvenc': 'libaom-av1', 'av1_qsv': 'libaom-av1'
+}
+
+
+# Trimming (values of the 'trim_mode' setting)
+TRIM_EXACT = 'Exact' # re-encode: frame-accurate cut
+TRIM_COPY = 'Copy' # stream copy: cut on the nearest keyframe, no re-encoding
+
+# Reduced-resolution image decoding, see resize_decode_margin()
+RESIZE_DECODE_MARGIN = {'Balanced': 2, 'Fast': 1}
+LOWRES_EXTENSIONS = {'.jpg', '.jpeg'} # decoders that can downscale while decoding
+MAX_LOWRES = 3 # 1/8, the smallest JPEG DCT scale
+
+# FFmpeg's mjpeg quantization: the MPEG-1 default intra matrix scaled by the qscale (see jpeg_qtable)
+MJPEG_BASE_MATRIX = (
+    8, 16, 19, 22, 26, 27, 29, 34,
+    16, 16, 22, 24, 27, 29, 34, 37,
+    19, 22, 26, 27, 29, 34, 34, 38,
+    22, 22, 26, 27, 29, 34, 37, 40,
+    22, 26, 27, 29, 32, 35, 40, 48,
+    26, 27, 29, 32, 35, 40, 48, 58,
+    26, 27, 29, 34, 38, 46, 56, 69,
+    27, 29, 35, 38, 46, 56, 69, 83
+)
+MJPEG_MIN_QSCALE = 2
+
+# Fastest settings of each CRF encoder, for the short probe encodes of adaptive rate control
+CRF_PROBE_SPEED = {
+    'libx264': ['-preset', 'veryfast'],
+    'libx265': ['-preset', 'veryfast'],
+    'libvpx-vp9': ['-deadline', 'realtime', '-cpu-used', '8', '-row-mt', '1'],
+    'libaom-av1': ['-usage', 'realtime', '-cpu-used', '8', '-row-mt', '1']
+}
+
+
+def get_bin_path(bin_name):
+    """Resolve path to bundled binaries if running in a PyInstaller bundle."""
+    full_bin = bin_name
+    if os.name == 'nt' and not bin_name.endswith('.exe'):
+        full_bin += '.exe'
+
+    if getattr(sys, 'frozen', False):
+        bundle_path = os.path.join(sys._MEIPASS, full_bin)
+        if os.path.exists(bundle_path):
+            return bundle_path
+
+    return full_bin # Fallback to system PATH
+
+
+def media_kind(path):
+    """Classify a path as 'image', 'video' or 'audio' by extension, or None."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in SUPPORTED_IMAGE_EXTENSIONS:
+        return 'image'
+    if ext in SUPPORTED_VIDEO_EXTENSIONS:
+        return 'video'
+    if ext in SUPPORTED_AUDIO_INPUT_EXTENSIONS:
+        return 'audio'
+    return None
+
+
+def folder_output_dir(files, source_folder_name):
+    """'folder_name_converted' directory in the parent of the first file (folder mode), or ''."""
+    if not source_folder_name or not files:
+        return ""
+    return os.path.join(os.path.dirname(files[0]), f"{source_folder_name}_converted")
+
+
+def output_path_for(file_path, target_format, output_base_dir=""):
+    """
+    Build the output path for a file.
+    Next to the source as 'name_converted.ext', or 'output_base_dir/name.ext' in folder mode.
+    Archive members keep their folder layout under 'archive_converted/' (or under
+    'output_base_dir/archive/' in folder mode).
+    """
+    member = split_member_path(file_path)
+    if member:
+        archive_path, name = member
+        stem = archive_stem(archive_path)
+        base_dir = (os.path.join(output_base_dir, stem) if output_base_dir
+                    else os.path.join(os.path.dirname(archive_path), f"{stem}_converted"))
+        # Drop absolute and '..' components so members can't escape the output folder
+        parts = [p for p in name.replace('\\', '/').split('/') if p not in ('', '.', '..')]
+        return os.path.join(base_dir, *parts[:-1], f"{os.path.splitext(parts[-1])[0]}.{target_format}")
+    if output_base_dir:
+        base_no_ext = os.path.splitext(os.path.basename(file_path))[0]
+        return os.path.join(output_base_dir, f"{base_no_ext}.{target_format}")
+    base_no_ext = os.path.splitext(file_path)[0]
+    return f"{base_no_ext}_converted.{target_format}"
+
+
+def is_hardware_codec(codec):
+    return 'nvenc' in codec or 'amf' in codec or 'qsv' in codec or 'videotoolbox' in codec
+
+
+def resolve_video_codec(settings):
+    """
+    Return (codec, used_hw) for the video codec stored in settings.
+    In dynamic mode the stored codec is already the best choice (HW or SW) selected by the UI,
+    but if the HW toggle is off and a HW codec slipped through, map it back to software.
+    """
+    v_codec = settings.get('video_codec', 'libx264')
+    use_hw_accel = settings.get('video_hw_accel', 'true') == 'true'
+    used_hw = is_hardware_codec(v_codec)
+
+    if is_trim_copy(settings):
+        return 'copy', False
+
+    if not use_hw_accel and used_hw and v_codec in HW_TO_SW_CODECS:
+        return HW_TO_SW_CODECS[v_codec], False
+    return v_codec, used_hw
+
+
+def software_fallback(codec):
+    """Find the software base codec for a hardware variant (or the codec itself)."""
+    for base, variants in HARDWARE_ENCODER_MAPPINGS.items():
+        if codec in variants:
+            return base
+    return codec
+
+
+def parse_timestamp(text):
+    """Seconds from '90', '1:30' or '01:02:03.5'; None when empty or invalid."""
+    text = str(text or '').strip()
+    parts = text.split(':')
+    if not text or len(parts) > 3:
+        return None
+    seconds = 0.0
+    try:
+        for part in parts:
+            seconds = seconds * 60 + float(part)
+    except ValueError:
+        return None
+    return seconds if seconds >= 0 else None
+
+
+def trim_range(settings):
+    """(start, end) seconds from 'trim_start'/'trim_end'; 0 means the start/end of the input."""
+    start = parse_timestamp(settings.get('trim_start', '')) or 0.0
+    end = parse_timestamp(settings.get('trim_end', '')) or 0.0
+    if end and end <= start:
+        end = 0.0 # an end before the start is ignored rather than producing an empty file
+    return start, end
+
+
+def is_trim_copy(settings):
+    """Whether trimming is set and should cut by stream copy instead of re-encoding."""
+    return settings.get('trim_mode', TRIM_EXACT) == TRIM_COPY and any(trim_range(settings))
+
+
+def trim_input_args(start, end):
+    """Input options seeking at the demuxer level, so nothing before 'start' is decoded."""
+    args = []
+    if start > 0:
+        args.extend(['-ss', f"{start:.3f}"])
+    if end > 0:
+        args.extend(['-to', f"{end:.3f}"])
+    return args
+
+
+def trimmed_duration(duration, start, end):
+    """Length of the trimmed part of an input of 'duration' seconds (0 if unknown)."""
+    if end:
+        duration = min(duration, end) if duration > 0 else end
+    return max(0.0, duration - start) if duration > 0 else 0.0
+
+
+def parse_bitrate(value, default=0):
+    """Parse FFmpeg style bitrates ('2500k', '2.5M', '128000') into bits per second."""
+    text = str(value).strip().lower()
+    multiplier = 1
+    if text.endswith('k'):
+        multiplier, text = 1000, text[:-1]
+    elif text.endswith('m'):
+        multiplier, text = 1000000, text[:-1]
+    try:
+        return int(float(text) * multiplier)
+    except ValueError:
+        return default
+
+
+def parse_progress_seconds(line):
+    """Parse an 'out_time_ms=' line from '-progress pipe:1' into seconds, or None."""
+    if 'out_time_ms=' not in line:
+        return None
+    try:
+        # Despite the name, out_time_ms is reported in microseconds
+        return int(line.split('=')[1].strip()) / 1000000.0
+    except (ValueError, IndexError):
+        return None
+
+
+def duration_probe_command(path, ffprobe_bin='ffprobe'):
+    """ffprobe command printing the container duration in seconds."""
+    return [ffprobe_bin, '-v', 'error', '-show_entries', 'format=duration',
+            '-of', 'default=noprint_wrappers=1:nokey=1', path]
+
+
+def media_probe_command(path, ffprobe_bin='ffprobe'):
+    """ffprobe command dumping format and stream information as JSON."""
+    return [ffprobe_bin, '-v', 'error', '-show_format', '-show_streams', '-of', 'json', path]
+
+
+def _parse_rate(rate):
+    """Parse an ffprobe rational like '30000/1001' into a float (0 if unknown)."""
+    try:
+        num, _, den = str(rate).partition('/')
+        value = float(num) / float(den or 1)
+        return value if value > 0 else 0
+    except (ValueError, ZeroDivisionError):
+        return 0
+
+
+def parse_probe_output(text):
+    """
+    Reduce ffprobe JSON output to the properties the converter cares about.
+    Missing values are 0 / None so callers can use them without checks.
+    """
+    info = {
+        'duration': 0.0, 'size': 0, 'bit_rate': 0,
+        'width': 0, 'height': 0, 'fps': 0.0, 'video_codec': None,
+        'audio_codec': None, 'sample_rate': 0, 'channels': 0
+    }
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return info
+
+    fmt = data.get('format', {})
+    try:
+        info['duration'] = float(fmt.get('duration', 0) or 0)
+        info['size'] = int(fmt.get('size', 0) or 0)
+        info['bit_rate'] = int(fmt.get('bit_rate', 0) or 0)
+    except ValueError:
+        pass
+
+    for stream in data.get('streams', []):
+        if stream.get('codec_type') == 'video' and info['video_codec'] is None:
+            info['video_codec'] = stream.get('codec_name')
+            info['width'] = int(stream.get('width', 0) or 0)
+            info['height'] = int(stream.get('height', 0) or 0)
+            info['fps'] = _parse_rate(stream.get('avg_frame_rate')) or _parse_rate(stream.get('r_frame_rate'))
+        elif stream.get('codec_type') == 'audio' and info['audio_codec'] is None:
+            info['audio_codec'] = stream.get('codec_name')
+            info['sample_rate'] = int(stream.get('sample_rate', 0) or 0)
+            info['channels'] = int(stream.get('channels', 0) or 0)
+        if not info['duration']:
+            try:
+                info['duration'] = float(stream.get('duration', 0) or 0)
+            except ValueError:
+                pass
+    return info
+
+
+def thumbnail_command(input_path, output_path, seek_seconds=0, width=128, ffmpeg_bin='ffmpeg'):
+    """
+    Single small frame for previews.
+    '-ss' goes before '-i' so FFmpeg seeks to the nearest keyframe instead of decoding up to it.
+    """
+    cmd = [ffmpeg_bin, '-v', 'error', '-y']
+    if seek_seconds > 0:
+        cmd.extend(['-ss', f"{seek_seconds:.2f}"])
+    cmd.extend(['-i', input_path, '-map', '0:v:0', '-frames:v', '1',
+                '-vf', f"scale='min({width},iw)':-2:flags=fast_bilinear", '-q:v', '5', output_path])
+    return cmd
+
+
+def resize_decode_margin(settings):
+    """
+    How large (times the target) a reduced-resolution decode must stay for the
+    'image_resize_mode' setting; 0 = decode at full resolution.
+    """
+    resize = settings.get('image_resize', '0')
+    if resize == '0' or not resize.isdigit():
+        return 0
+    return RESIZE_DECODE_MARGIN.get(settings.get('image_resize_mode', 'Balanced'), 0)
+
+
+def lowres_factor(width, height, resize, margin):
+    """Largest '-lowres' reduction (decode at 1/2^n) that keeps the longest side >= margin * resize."""
+    longest = max(width, height)
+    if not margin or resize <= 0 or longest <= 0:
+        return 0
+    factor = 0
+    while factor < MAX_LOWRES and -(-longest // (2 << factor)) >= resize * margin:
+        factor += 1
+    return factor
+
+
+def resolution_height(settings):
+    """Height requested by the 'video_resolution' setting, or 0 for 'Original'."""
+    res = settings.get('video_resolution', 'Original')
+    if res == 'Original':
+        return 0
+    h = res.split('(')[-1].replace('p)', '') if '(' in res else res.replace('p', '')
+    return int(h) if h.isdigit() else 0
+
+
+def output_height(settings, source_height=0):
+    """
+    Scale target height, or 0 to keep the source. Resolution is a maximum: a known
+    source that isn't taller is never upscaled unless 'video_allow_upscale' is set.
+    """
+    h = resolution_height(settings)
+    if h and source_height and h >= source_height and settings.get('video_allow_upscale', 'false') != 'true':
+        return 0
+    return h
+
+
+def capped_fps(fps, source_fps, settings):
+    """
+    '-r'/'fps=' value from a frame rate setting string, or None to keep the source rate.
+    Like resolution, it's a maximum: never above a known source fps unless upscaling is allowed.
+    """
+    if fps == '0' or not fps.isdigit():
+        return None
+    if source_fps and int(fps) >= source_fps and settings.get('video_allow_upscale', 'false') != 'true':
+        return None
+    return fps
+
+
+def output_sample_rate(settings, source_rate=0):
+    """
+    '-ar' value in Hz, or None to keep the source rate: a known source is never
+    resampled up (or to its own rate) unless 'audio_allow_upsample' is set.
+    """
+    resample = settings.get('audio_resample', 'Original')
+    if resample == 'Original' or not resample.isdigit():
+        return None
+    rate = int(resample) * 1000 # kHz to Hz
+    if source_rate and rate >= source_rate and settings.get('audio_allow_upsample', 'false') != 'true':
+        return None
+    return rate
+
+
+def video_output_pixels(width, height, settings):
+    """Frame size (pixels) video_command() will encode for a source of width x height, 0 if unknown."""
+    if not width or not height:
+        return 0
+    target_height = output_height(settings, height)
+    if target_height:
+        return int(width * target_height / height) * target_height
+    return width * height
+
+
+def gif_filter(settings, base_filters=None, animated=True):
+    """
+    Single-decode GIF filter graph: the frames are split once, one branch builds an
+    optimized palette and the other is mapped onto it, so no second pass is needed.
+    Still images (animated=False) skip the fps and width caps; image_resize covers them.
+    """
+    stats_mode = settings.get('gif_stats_mode', 'diff')
+    dither = settings.get('gif_dither', 'sierra2_4a')
+    max_colors = settings.get('gif_max_colors', '256')
+    fps = settings.get('gif_fps', '15')
+    max_width = settings.get('gif_max_width', '480')
+
+    chain = list(base_filters or [])
+    if animated and fps.isdigit() and fps != '0':
+        chain.append(f"fps={fps}")
+    if animated and max_width.isdigit() and max_width != '0':
+        chain.append(f"scale='min({max_width},iw)':-2:flags=lanczos")
+    if not max_colors.isdigit() or not 2 <= int(max_colors) <= 256:
+        max_colors = '256'
+
+    palettegen = f"palettegen=max_colors={max_colors}:stats_mode={stats_mode}"
+    if dither.startswith('bayer'):
+        # 'bayer' or 'bayer:3' style values carry an optional bayer_scale
+        _, _, scale = dither.partition(':')
+        paletteuse = f"paletteuse=dither=bayer:bayer_scale={scale or 3}"
+    else:
+        paletteuse = f"paletteuse=dither={dither}"
+    if stats_mode == 'single':
+        # A palette per frame must be picked up by paletteuse as it changes
+        paletteuse += ":new=1"
+    if stats_mode == 'diff':
+        paletteuse += ":diff_mode=rectangle"
+
+    prefix = ','.join(chain) + ',' if chain else ''
+    return f"{prefix}split[gif_a][gif_b];[gif_a]{palettegen}[gif_p];[gif_b][gif_p]{paletteuse}"
+
+
+def jpeg_qscale(quality):
+    """
+    mjpeg '-q:v' of the 1-100 quality setting: FFmpeg's 1-31 scale, where lower is
+    better, stopping at FFmpeg's default qmin (2) since lower values encode the same.
+    """
+    try:
+        return max(MJPEG_MIN_QSCALE, min(31, int(31 - (int(quality) * 30 / 100))))
+    except ValueError:
+        return 5
+
+
+def jpeg_qtable(qscale):
+    """
+    Quantization table (natural order, shared by all planes) FFmpeg's mjpeg encoder
+    writes for 'qscale', so other JPEG encoders can match its quality exactly.
+    """
+    return [MJPEG_BASE_MATRIX[0]] + [min(255, m * qscale >> 3) for m in MJPEG_BASE_MATRIX[1:]]
+
+
+def image_encoder_args(fmt, quality):
+    """Encoder and quality options of a still image format ('quality' is the 1-100 setting)."""
+    if fmt == 'webp':
+        return ['-c:v', 'libwebp', '-q:v', quality]
+
+    if fmt in ['jpg', 'jpeg']:
+        return ['-c:v', 'mjpeg', '-q:v', str(jpeg_qscale(quality))]
+
+    if fmt == 'png':
+        return ['-c:v', 'png']
+
+    if fmt == 'bmp':
+        return ['-c:v', 'bmp']
+
+    if fmt in ['tiff', 'tif']:
+        return ['-c:v', 'tiff']
+
+    if fmt == 'avif':
+        try:
+            crf = max(0, min(63, 63 - int(quality) * 63 // 100))
+            return ['-c:v', 'libaom-av1', '-crf', str(crf)]
+        except ValueError:
+            return ['-c:v', 'libaom-av1', '-crf', '30']
+
+    if fmt == 'tga':
+        return ['-c:v', 'targa']
+
+    if fmt in ['ppm', 'pgm', 'pbm', 'pnm']:
+        # Portable anymap formats - use image2 format
+        return ['-f', 'image2', '-c:v', 'ppm']
+
+    # High dynamic range formats
+    if fmt == 'exr':
+        return ['-c:v', 'exr']
+    if fmt == 'hdr':
+        # HDR uses Radiance format
+        return ['-pix_fmt', 'rgb48le']
+    return []
+
+
+def image_command(input_path, output_path, target_format, settings, ffmpeg_bin='ffmpeg', source_size=None):
+    """
+    Build the FFmpeg command converting a single image.
+    'source_size' (width, height) of a JPEG enables decoding it at reduced resolution
+    ('-lowres') when the resize mode allows it.
+    """
+    quality = settings.get('image_quality', '80')
+    resize = settings.get('image_resize', '0')
+    grayscale = settings.get('image_grayscale', 'false') == 'true'
+    preserve_md = settings.get('image_metadata', 'true') == 'true'
+    margin = resize_decode_margin(settings)
+
+    cmd = [ffmpeg_bin, '-y']
+    if margin and source_size:
+        lowres = lowres_factor(source_size[0], source_size[1], int(resize), margin)
+        if lowres:
+            # DCT-domain downscale in the decoder, the scale filter below finishes the job
+            cmd.extend(['-lowres', str(lowres)])
+    cmd.extend(['-i', input_path])
+
+    if not preserve_md:
+        cmd.extend(['-map_metadata', '-1'])
+
+    # Build filter graph
+    vf = []
+    if grayscale:
+        vf.append('format=gray')
+
+    if resize != '0' and resize.isdigit():
+        # Scale longest side to 'resize' while maintaining aspect ratio, and only if original is larger
+        # (square images count as landscape, otherwise both sides would be -1 and nothing scales)
+        scale = f"scale='if(gte(iw,ih),min({resize},iw),-1)':'if(gt(ih,iw),min({resize},ih),-1)'"
+        # Fast modes finish with lanczos to make up for the reduced decode
+        vf.append(scale + (":flags=lanczos" if margin else ""))
+
+    if vf:
+        cmd.extend(['-vf', ','.join(vf)])
+
+    # Format-specific encoder and quality settings
+    fmt = target_format.lower()
+
+    if fmt == 'ico':
+        # ICO format - scale to 256x256 max and use ICO format
+        if resize == '0' or not resize.isdigit() or int(resize) > 256:
+            if vf:
+                cmd[-1] = cmd[-1] + ",scale='min(256,iw)':'min(256,ih)'"
+            else:
+                cmd.extend(['-vf', "scale='min(256,iw)':'min(256,ih)'"])
+        cmd.extend(['-c:v', 'bmp', '-f', 'ico'])
+
+    elif fmt == 'gif':
+        # Replace the plain filter chain with the palette graph (single image, no fps)
+        if vf:
+            del cmd[-2:]
+        cmd.extend(['-vf', gif_filter(settings, vf, animated=False), '-c:v', 'gif'])
+
+    else:
+        cmd.extend(image_encoder_args(fmt, quality))
+
+    cmd.append(output_path)
+    return cmd
+
+
+def image_set_command(input_path, outputs, settings, ffmpeg_bin='ffmpeg', source_size=None):
+    """
+    Build one FFmpeg command writing a whole responsive image set: the image is decoded
+    once, split and scaled once per width, and each scaled copy is split again per format.
+    'outputs' lists (width, format, path); 'source_size' enables '-lowres' for JPEGs.
+    """
+    quality = settings.get('image_quality', '80')
+    grayscale = settings.get('image_grayscale', 'false') == 'true'
+    preserve_md = settings.get('image_metadata', 'true') == 'true'
+    margin = RESIZE_DECODE_MARGIN.get(settings.get('image_resize_mode', 'Balanced'), 0)
+    widths = list(dict.fromkeys(width for width, _, _ in outputs))
+
+    cmd = [ffmpeg_bin, '-y']
+    if margin and source_size and source_size[0] > 0:
+        # The largest width, expressed as the longest side lowres_factor() expects
+        longest = -(-max(widths) * max(source_size) // source_size[0])
+        lowres = lowres_factor(source_size[0], source_size[1], longest, margin)
+        if lowres:
+            cmd.extend(['-lowres', str(lowres)])
+    cmd.extend(['-i', input_path])
+
+    head = 'format=gray,' if grayscale else ''
+    graph = [f"[0:v]{head}split={len(widths)}" + ''.join(f"[w{i}]" for i in range(len(widths)))]
+    output_args = []
+    for i, width in enumerate(widths):
+        formats = [(fmt, path) for w, fmt, path in outputs if w == width]
+        labels = [f"[o{i}_{j}]" for j in range(len(formats))]
+        # Never upscale, even when the source width wasn't known
+        chain = f"[w{i}]scale='min({width},iw)':-1" + (":flags=lanczos" if margin else "")
+        graph.append(chain + (f",split={len(formats)}" if len(formats) > 1 else "") + ''.join(labels))
+        for label, (fmt, path) in zip(labels, formats):
+            output_args.extend(['-map', label])
+            if not preserve_md:
+                output_args.extend(['-map_metadata', '-1'])
+            output_args.extend(image_encoder_args(fmt, quality))
+            output_args.append(path)
+    return cmd + ['-filter_complex', ';'.join(graph)] + output_args
+
+
+def loudnorm_analysis_command(input_path, target_i, target_tp, target_lra, ffmpeg_bin='ffmpeg', input_args=()):
+    """First loudnorm pass: decode only, print the EBU R128 measurements as JSON."""
+    return [ffmpeg_bin, '-hide_banner', '-nostats'] + list(input_args) + ['-i', input_path, '-vn', '-sn', '-dn',
+            '-af', f"loudnorm=I={target_i}:TP={target_tp}:LRA={target_lra}:print_format=json",
+            '-f', 'null', '-']
+
+
+def parse_loudnorm_output(text):
+    """Extract the JSON block loudnorm prints at the end of the analysis pass, or None."""
+    start = text.rfind('{')
+    end = text.rfind('}')
+    if start < 0 or end < start:
+        return None
+    try:
+        data = json.loads(text[start:end + 1])
+        return {key: float(data[key]) for key in
+                ('input_i', 'input_tp', 'input_lra', 'input_thresh', 'target_offset')}
+    except (ValueError, KeyError):
+        return None
+
+
+def loudnorm_filter(target_i, target_tp, target_lra, measured):
+    """Second loudnorm pass using cached first-pass measurements (linear when possible)."""
+    return (f"loudnorm=I={target_i}:TP={target_tp}:LRA={target_lra}"
+            f":measured_I={measured['input_i']}:measured_TP={measured['input_tp']}"
+            f":measured_LRA={measured['input_lra']}:measured_thresh={measured['input_thresh']}"
+            f":offset={measured['target_offset']}:linear=true")
+
+
+def audio_command(input_path, output_path, target_format, settings, ffmpeg_bin='ffmpeg', af=None, source=None):
+    """
+    Build the FFmpeg command converting a single audio file.
+    'af' is an optional audio filter chain (e.g. loudness normalization).
+    'source' (parse_probe_output() of the input) lets no-op resampling/downmixing be skipped.
+    """
+    source = source or {}
+    fmt = target_format.lower()
+    quality = settings.get('audio_quality', 'Normal')
+    bitrate_mode = settings.get('audio_bitrate_mode', 'VBR')
+    compression = settings.get('audio_compression', 'Default')
+    sample_width = settings.get('audio_sample_width', '16 bits')
+    force_mono = settings.get('audio_force_mono', 'false') == 'true'
+
+    cmd = [ffmpeg_bin, '-y'] + trim_input_args(*trim_range(settings)) + ['-i', input_path]
+    if is_trim_copy(settings):
+        # Cut without re-encoding: resampling, filters and encoder options don't apply
+        cmd.extend(['-c:a', 'copy', output_path])
+        return cmd
+
+    q_level = AUDIO_QUALITY_MAP.get(quality, 2)
+
+    # Resample if specified
+    sample_rate = output_sample_rate(settings, source.get('sample_rate', 0))
+    if sample_rate:
+        cmd.extend(['-ar', str(sample_rate)])
+
+    # Force mono output (already mono sources need no downmix)
+    if force_mono and source.get('channels', 0) != 1:
+        cmd.extend(['-ac', '1'])
+
+    if af:
+        cmd.extend(['-af', af])
+
+    # Format-specific encoding options
+    if fmt == 'mp3':
+        cmd.extend(['-c:a', 'libmp3lame'])
+        if bitrate_mode == 'VBR':
+            # VBR quality: 0 (best) to 9 (worst), map from q_level
+            vbr_q = max(0, 9 - int(q_level * 1.8))
+            cmd.extend(['-q:a', str(vbr_q)])
+        else:
+            # CBR/ABR: Use fixed bitrates
+            bitrates = ['64k', '96k', '128k', '192k', '256k', '320k']
+            br = bitrates[min(q_level, 5)]
+            if bitrate_mode == 'ABR':
+                cmd.extend(['-abr', '1'])
+            cmd.extend(['-b:a', br])
+
+    elif fmt == 'ogg':
+        cmd.extend(['-c:a', 'libvorbis'])
+        # Vorbis quality: 0 to 10
+        vorbis_q = min(10, max(0, int(q_level * 2)))
+        cmd.extend(['-q:a', str(vorbis_q)])
+
+    elif fmt == 'flac':
+        cmd.extend(['-c:a', 'flac'])
+        # FLAC compression level: 0 (least) to 12 (most)
+        comp_map = {'Less': '0', 'Default': '5', 'Better': '12'}
+        cmd.extend(['-compression_level', comp_map.get(compression, '5')])
+
+    elif fmt == 'wav':
+        # Sample width mapping
+        width_map = {
+            '8 bits': 'pcm_u8',
+            '16 bits': 'pcm_s16le',
+            '32 bits': 'pcm_s32le'
+        }
+        codec = width_map.get(sample_width, 'pcm_s16le')
+        cmd.extend(['-c:a', codec])
+
+    elif fmt == 'm4a':
+        cmd.extend(['-c:a', 'aac'])
+        # AAC quality: VBR 1-5 (higher = better)
+        aac_q = ['1', '2', '2', '3', '4', '5'][min(q_level, 5)]
+        cmd.extend(['-q:a', aac_q])
+
+    elif fmt == 'opus':
+        cmd.extend(['-c:a', 'libopus'])
+        # Opus bitrate mapping
+        opus_bitrates = ['32k', '64k', '96k', '128k', '192k', '256k']
+        cmd.extend(['-b:a', opus_bitrates[min(q_level, 5)]])
+
+    cmd.append(output_path)
+    return cmd
+
+
+def hw_pixel_format_args(codec, is_hw):
+    """Enforce yuv420p for better compatibility with HW encoders."""
+    if is_hw and ('nvenc' in codec or 'amf' in codec or 'qsv' in codec) and ('h264' in codec or 'hevc' in codec):
+        return ['-pix_fmt', 'yuv420p']
+    return []
+
+
+def hw_encoder_test_command(codec, ffmpeg_bin='ffmpeg'):
+    """Encode a tiny generated clip with 'codec' the way video_command() would, discarding the output."""
+    return ([ffmpeg_bin, '-hide_banner', '-nostdin', '-loglevel', 'error',
+             '-f', 'lavfi', '-i', 'testsrc2=size=320x240:rate=30:duration=0.5']
+            + hw_pixel_format_args(codec, True)
+            + ['-c:v', codec, '-b:v', '500k', '-frames:v', '10', '-f', 'null', '-'])
+
+
+def video_command(input_path, output_path, codec, settings, is_hw=False, ffmpeg_bin='ffmpeg', start_seconds=0,
+                  source=None):
+    """
+    Build the FFmpeg command converting a video with '-progress pipe:1' reporting.
+    'start_seconds' skips the beginning of the (trimmed) input, used to resume a failed encode.
+    With codec 'copy' the streams are cut/remuxed without filters or re-encoding.
+    'source' (parse_probe_output() of the input) caps resolution and fps at the source's.
+    """
+    source = source or {}
+    a_codec = settings.get('audio_codec', 'aac')
+    bitrate = settings.get('video_bitrate', '2500k')
+    fps = settings.get('video_fps', '30')
+    preserve_md = settings.get('video_metadata', 'true') == 'true'
+
+    # Input seeking: frame-accurate when re-encoding, on the nearest keyframe when copying
+    start, end = trim_range(settings)
+    cmd = [ffmpeg_bin] + trim_input_args(start + start_seconds, end)
+    cmd.extend(['-i', input_path, '-progress', 'pipe:1', '-nostats'])
+
+    if preserve_md: cmd.extend(['-map_metadata', '0'])
+    else: cmd.extend(['-map_metadata', '-1'])
+
+    if codec == 'copy':
+        audio = ['-an'] if a_codec == "No Audio" else ['-c:a', 'copy' if is_trim_copy(settings) else a_codec]
+        cmd.extend(audio + ['-c:v', 'copy', '-avoid_negative_ts', 'make_zero', '-y', output_path])
+        return cmd
+
+    # Audio handling
+    if a_codec == "No Audio" or codec == 'gif':
+        cmd.append('-an')
+    else:
+        cmd.extend(['-c:a', a_codec])
+
+    # Filters & Pixel Format
+    vf = []
+    cmd.extend(hw_pixel_format_args(codec, is_hw))
+
+    h = output_height(settings, source.get('height', 0))
+    if h: vf.append(f"scale=-2:{h}")
+
+    if codec == 'gif':
+        # Dedicated GIF path: palette graph, its own fps cap, no bitrate
+        gif_fps = capped_fps(settings.get('gif_fps', '15'), source.get('fps', 0), settings)
+        gif_settings = dict(settings, gif_fps=gif_fps or '0')
+        cmd.extend(['-vf', gif_filter(gif_settings, vf), '-c:v', 'gif', '-y', output_path])
+        return cmd
+
+    if vf: cmd.extend(['-vf', ','.join(vf)])
+
+    fps = capped_fps(fps, source.get('fps', 0), settings)
+    if fps: cmd.extend(['-r', fps])
+
+    # 'video_crf' (set by adaptive rate control) replaces the fixed bitrate
+    crf = settings.get('video_crf', '')
+    rate = crf_args(codec, crf, settings.get('video_max_bitrate', '')) if crf else ['-b:v', bitrate]
+    cmd.extend(['-c:v', codec] + rate + ['-y', output_path])
+    return cmd
+
+
+def crf_args(codec, crf, max_bitrate=''):
+    """
+    Constant-quality options of a CRF encoder, optionally capped at 'max_bitrate'.
+    VP9 and AV1 take the cap as '-b:v' (constrained quality); '-b:v 0' is pure CRF.
+    """
+    if codec in ('libvpx-vp9', 'libaom-av1'):
+        return ['-crf', str(crf), '-b:v', max_bitrate or '0']
+    if max_bitrate:
+        bufsize = f"{parse_bitrate(max_bitrate) * 2 // 1000}k"
+        return ['-crf', str(crf), '-maxrate', max_bitrate, '-bufsize', bufsize]
+    return ['-crf', str(crf)]
+
+
+def excerpt_reference_command(input_path, output_path, excerpts, height, ffmpeg_bin='ffmpeg'):
+    """
+    Cut (start, length) excerpts out of a video, scale them to 'height' and join them
+    losslessly (FFV1): the reference that CRF probe encodes are measured against.
+    """
+    cmd = [ffmpeg_bin, '-y']
+    for start, length in excerpts:
+        cmd.extend(['-ss', f"{start:.3f}", '-t', f"{length:.3f}", '-i', input_path])
+    chains = [f"[{i}:v]scale=-2:{height},setsar=1[v{i}]" for i in range(len(excerpts))]
+    inputs = ''.join(f"[v{i}]" for i in range(len(excerpts)))
+    graph = ';'.join(chains) + f";{inputs}concat=n={len(excerpts)}:v=1:a=0,format=yuv420p[ref]"
+    return cmd + ['-filter_complex', graph, '-map', '[ref]', '-an', '-c:v', 'ffv1', output_path]
+
+
+def crf_probe_command(reference_path, output_path, codec, crf, ffmpeg_bin='ffmpeg'):
+    """Encode the excerpt reference at one CRF with the encoder's fastest settings."""
+    return ([ffmpeg_bin, '-y', '-i', reference_path, '-an', '-c:v', codec] + crf_args(codec, crf)
+            + CRF_PROBE_SPEED.get(codec, []) + [output_path])
+
+
+def ssim_command(distorted_path, reference_path, ffmpeg_bin='ffmpeg'):
+    return [ffmpeg_bin, '-i', distorted_path, '-i', reference_path, '-lavfi', '[0:v][1:v]ssim', '-f', 'null', '-']
+
+
+def parse_ssim_output(text):
+    """Overall SSIM from the ssim filter's summary line ('SSIM Y:... All:0.981 (17.2)'), or None."""
+    for line in reversed(text.splitlines()):
+        if 'SSIM' in line and 'All:' in line:
+            try:
+                return float(line.split('All:')[1].split()[0])
+            except (IndexError, ValueError):
+                return None
+    return None
+
+
+def segment_copy_command(input_path, output_path, length_seconds, ffmpeg_bin='ffmpeg'):
+    """Stream-copy the first 'length_seconds' of a file, reporting progress on stdout."""
+    return [ffmpeg_bin, '-v', 'error', '-i', input_path, '-map', '0', '-c', 'copy',
+            '-t', f"{length_seconds:.3f}", '-progress', 'pipe:1', '-nostats', '-y', output_path]
+
+
+def remux_command(input_path, output_path, ffmpeg_bin='ffmpeg'):
+    """Move all streams into another container without re-encoding."""
+    return [ffmpeg_bin, '-v', 'error', '-i', input_path, '-map', '0', '-c', 'copy', '-y', output_path]
+
+
+# Stream properties that must be equal on both sides of a stream-copy join
+JOIN_STREAM_KEYS = ('codec_type', 'codec_name', 'width', 'height', 'pix_fmt', 'sample_rate', 'channels')
+
+
+def parse_stream_params(text):
+    """Per-stream JOIN_STREAM_KEYS values from ffprobe JSON output, or None when it can't be parsed."""
+    try:
+        streams = json.loads(text)['streams']
+    except (ValueError, KeyError, TypeError):
+        return None
+    return [{key: str(stream.get(key, '')) for key in JOIN_STREAM_KEYS} for stream in streams]
+
+
+def join_mismatch(head_streams, tail_streams):
+    """
+    Why two segments can't be joined by stream copy (see parse_stream_params), or None.
+    Parameter sets (SPS/PPS) may still differ between encoders; the join is
+    decode-checked at the seam for that.
+    """
+    if len(head_streams) != len(tail_streams):
+        return f"{len(head_streams)} streams before the seam, {len(tail_streams)} after"
+    for head, tail in zip(head_streams, tail_streams):
+        for key in JOIN_STREAM_KEYS:
+            if head[key] != tail[key]:
+                return f"{head['codec_type']} {key} {head[key] or '?'} before the seam, {tail[key] or '?'} after"
+    return None
+
+
+def concat_list_text(paths):
+    """Input list for FFmpeg's concat demuxer."""
+    return ''.join("file '{}'\n".format(os.path.abspath(p).replace("'", "'\\''")) for p in paths)
+
+
+def concat_command(list_path, output_path, ffmpeg_bin='ffmpeg'):
+    """Join the segments listed in 'list_path' without re-encoding."""
+    return [ffmpeg_bin, '-v', 'error', '-f', 'concat', '-safe', '0', '-i', list_path,
+            '-map', '0', '-c', 'copy', '-y', output_path]
+
+
+def decode_check_command(path, samples=None, ffmpeg_bin='ffmpeg'):
+    """
+    Decode a file to nowhere, stopping at the first error (only errors are printed).
+    'samples' = [(start, length), ...] decodes just those ranges, each as its own input.
+    """
+    cmd = [ffmpeg_bin, '-v', 'error', '-xerror']
+    if not samples:
+        return cmd + ['-i', path, '-map', '0:v?', '-map', '0:a?', '-f', 'null', '-']
+    maps = []
+    for i, (start, length) in enumerate(samples):
+        cmd.extend(['-ss', f"{start:.3f}", '-t', f"{length:.3f}", '-i', path])
+        maps.extend(['-map', f"{i}:v?", '-map', f"{i}:a?"])
+    return cmd + maps + ['-f', 'null', '-']
@@ -0,0 +1,122 @@
+"""
+Asyncio FFmpeg/FFprobe runner and the media probes built on it, shared by the
+conversion API and the batch planner.
+"""
+
+import asyncio
+from collections import deque
+
+from logger import app_logger
+from archive_io import COPY_CHUNK
+from proc_stats import ChildMonitor, SAMPLE_INTERVAL
+from ffmpeg_commands import get_bin_path, duration_probe_command, media_probe_command, parse_probe_output
+
+# asyncio's default 64 KiB line limit is too small for some FFmpeg banners
+STREAM_LIMIT = 1024 * 1024
+
+
+class FFmpegRun:
+    """
+    One asyncio FFmpeg/FFprobe invocation with merged stdout/stderr.
+    'stdin_opener' returns a context manager giving a binary file object that is
+    streamed into the process's stdin (for 'pipe:0' inputs).
+    'on_sample' enables resource sampling: it is called with each proc_stats sample
+    of the process, and 'monitor' keeps the totals once the run is over.
+    """
+    def __init__(self, cmd, stdin_opener=None, on_sample=None):
+        self.cmd = cmd
+        self.stdin_opener = stdin_opener
+        self.on_sample = on_sample
+        self.monitor = None
+        self.returncode = None
+        self.output_tail = deque(maxlen=40) # last lines, for error reporting
+
+    async def sample_resources(self):
+        while True:
+            await asyncio.sleep(SAMPLE_INTERVAL)
+            sample = self.monitor.sample()
+            if sample is None:
+                return # exited, or no /proc on this platform
+            self.on_sample(sample)
+
+    async def feed_stdin(self, process):
+        try:
+            with self.stdin_opener() as source:
+                while True:
+                    chunk = await asyncio.to_thread(source.read, COPY_CHUNK)
+                    if not chunk:
+                        break
+                    process.stdin.write(chunk)
+                    await process.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            pass # FFmpeg stopped reading (done or failed); its exit code tells which
+        except Exception as e:
+            app_logger.error(f"Feeding FFmpeg input failed: {e}")
+        finally:
+            process.stdin.close()
+
+    async def lines(self):
+        """Start the process and yield its output line by line until it exits."""
+        process = await asyncio.create_subprocess_exec(
+            *self.cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT,
+            stdin=asyncio.subprocess.PIPE if self.stdin_opener else asyncio.subprocess.DEVNULL,
+            limit=STREAM_LIMIT)
+        feeder = asyncio.create_task(self.feed_stdin(process)) if self.stdin_opener else None
+        sampler = None
+        if self.on_sample is not None:
+            self.monitor = ChildMonitor(process.pid)
+            self.monitor.sample() # baseline for the first CPU% reading
+            sampler = asyncio.create_task(self.sample_resources())
+        try:
+            while True:
+                raw = await process.stdout.readline()
+                if not raw:
+                    break
+                line = raw.decode('utf-8', errors='replace').rstrip()
+                self.output_tail.append(line)
+                yield line
+            if self.monitor is not None:
+                # Output closed, the process is exiting: last chance to read its totals
+                self.monitor.sample()
+            self.returncode = await process.wait()
+        finally:
+            if sampler is not None:
+                sampler.cancel()
+                await asyncio.gather(sampler, return_exceptions=True)
+            if process.returncode is None:
+                # Consumer stopped early (cancelled): don't leave FFmpeg running
+                process.kill()
+                await process.wait()
+            if feeder is not None:
+                feeder.cancel()
+                await asyncio.gather(feeder, return_exceptions=True)
+
+    async def run(self):
+        """Run to completion and return the return code."""
+        async for _ in self.lines():
+            pass
+        return self.returncode
+
+    def error_output(self):
+        return '\n'.join(self.output_tail)
+
+
+async def probe_duration(path):
+    """Get media duration in seconds using ffprobe (0 if unknown)."""
+    try:
+        run = FFmpegRun(duration_probe_command(path, get_bin_path('ffprobe')))
+        output = [line async for line in run.lines()]
+        return float(output[0].strip())
+    except Exception:
+        return 0
+
+
+async def probe_media(path):
+    """Probe a file with ffprobe and return the parse_probe_output() dictionary."""
+    try:
+        run = FFmpegRun(media_probe_command(path, get_bin_path('ffprobe')))
+        output = [line async for line in run.lines()]
+    except Exception as e:
+        app_logger.warning(f"Probe failed for {path}: {e}")
+        output = []
+    return parse_probe_output('\n'.join(output))
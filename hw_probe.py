@@ -0,0 +1,127 @@
+"""
+Functional self-test for hardware video encoders.
+'ffmpeg -encoders' only says an encoder was compiled in, not that a GPU and driver
+can run it. Each hardware encoder gets one tiny lavfi encode instead; results are
+cached per FFmpeg build and driver, so the test only runs again after an update.
+"""
+
+import glob
+import hashlib
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from logger import app_logger
+from app_paths import get_data_file, load_json, save_json
+from ffmpeg_commands import get_bin_path, hw_encoder_test_command
+
+TEST_TIMEOUT = 10 # seconds per encoder; a hung driver counts as a failure
+MAX_PARALLEL_TESTS = 4
+
+_health = None
+_health_lock = threading.Lock()
+
+
+def device_available(codec):
+    """
+    Cheap pre-check for the device an encoder needs. Without it the encoder can't
+    work, so no test process is started (keeps GPU-less machines and CI fast).
+    """
+    if 'videotoolbox' in codec:
+        return sys.platform == 'darwin'
+    if sys.platform.startswith('linux'):
+        if 'nvenc' in codec:
+            return bool(glob.glob('/dev/nvidia[0-9]*'))
+        if 'vaapi' in codec or 'qsv' in codec or 'amf' in codec:
+            return bool(glob.glob('/dev/dri/renderD*'))
+    return True
+
+
+def ffmpeg_fingerprint(ffmpeg_bin):
+    """Identify the FFmpeg build by its resolved path, size and modification time."""
+    resolved = shutil.which(ffmpeg_bin) or ffmpeg_bin
+    try:
+        st = os.stat(resolved)
+        return f"{os.path.realpath(resolved)}|{st.st_size}|{st.st_mtime_ns}"
+    except OSError:
+        return resolved
+
+
+def driver_fingerprint():
+    """Best-effort identity of the GPU drivers (NVIDIA version, DRM drivers, OS build)."""
+    parts = [platform.platform()]
+    try:
+        with open('/proc/driver/nvidia/version', 'r') as f:
+            parts.append(f.readline().strip())
+    except OSError:
+        pass
+    for card in sorted(glob.glob('/sys/class/drm/card[0-9]*/device')):
+        driver = os.path.basename(os.path.realpath(os.path.join(card, 'driver')))
+        ids = []
+        for name in ('vendor', 'device'):
+            try:
+                with open(os.path.join(card, name), 'r') as f:
+                    ids.append(f.read().strip())
+            except OSError:
+                pass
+        parts.append(f"{driver}:{':'.join(ids)}")
+    return "|".join(parts)
+
+
+def run_self_test(codec, ffmpeg_bin):
+    if not device_available(codec):
+        return False
+    cmd = hw_encoder_test_command(codec, ffmpeg_bin)
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=TEST_TIMEOUT)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        app_logger.warning(f"Encoder self-test {codec} failed: {e}")
+        return False
+    if result.returncode != 0:
+        app_logger.info(f"Encoder self-test {codec} failed: {result.stderr.strip()[-300:]}")
+    return result.returncode == 0
+
+
+class EncoderHealth:
+    """Cached pass/fail self-test results for one FFmpeg build and driver set."""
+    def __init__(self, cache_path, ffmpeg_bin):
+        self.cache_path = cache_path
+        self.ffmpeg_bin = ffmpeg_bin
+        fingerprint = f"{ffmpeg_fingerprint(ffmpeg_bin)}||{driver_fingerprint()}"
+        self.fingerprint = hashlib.sha1(fingerprint.encode('utf-8', errors='replace')).hexdigest()
+        cached = load_json(cache_path, {})
+        # A different build or driver invalidates every earlier result
+        self.results = cached.get('results', {}) if cached.get('fingerprint') == self.fingerprint else {}
+        self.lock = threading.Lock()
+
+    def check(self, codecs):
+        """Return {codec: works} for the given encoders, testing the unknown ones in parallel."""
+        with self.lock:
+            missing = [c for c in dict.fromkeys(codecs) if c not in self.results]
+            if missing:
+                with ThreadPoolExecutor(max_workers=min(MAX_PARALLEL_TESTS, len(missing))) as pool:
+                    outcomes = list(pool.map(lambda c: run_self_test(c, self.ffmpeg_bin), missing))
+                for codec, works in zip(missing, outcomes):
+                    self.results[codec] = works
+                    app_logger.info(f"Encoder self-test {codec}: {'OK' if works else 'unavailable'}")
+                try:
+                    save_json(self.cache_path, {'fingerprint': self.fingerprint, 'results': self.results})
+                except OSError as e:
+                    app_logger.warning(f"Failed to save encoder self-test results: {e}")
+            return {c: self.results[c] for c in codecs}
+
+    def works(self, codec):
+        return self.check([codec])[codec]
+
+
+def get_encoder_health():
+    """Shared EncoderHealth for the bundled/system FFmpeg."""
+    global _health
+    with _health_lock:
+        if _health is None:
+            _health = EncoderHealth(get_data_file('hw_encoder_health.json'), get_bin_path('ffmpeg'))
+        return _health
@@ -0,0 +1,84 @@
+"""
+Responsive image sets for web publishing.
+With 'image_set_widths' set, every image is written at several widths and in one or
+more formats from a single decode (see ffmpeg_commands.image_set_command), named
+'<output name>-<width>w.<format>'. A JSON manifest with the sizes, byte counts and
+ready-made srcset strings can be written next to them.
+"""
+
+import json
+import os
+
+# Formats browsers accept in <img srcset> / <picture>
+IMAGE_SET_FORMATS = ('webp', 'avif', 'jpg', 'jpeg', 'png')
+
+
+def set_widths(settings):
+    """Sorted output widths from 'image_set_widths' (e.g. '320,640,1280'); empty = sets are off."""
+    widths = set()
+    for part in settings.get('image_set_widths', '').replace(' ', '').split(','):
+        if part.isdigit() and int(part) > 0:
+            widths.add(int(part))
+    return sorted(widths)
+
+
+def set_formats(settings, target_format):
+    """
+    Output formats from 'image_set_formats' (e.g. 'webp,avif'), else the target format.
+    Formats outside IMAGE_SET_FORMATS are ignored.
+    """
+    formats = [f.strip().lower() for f in settings.get('image_set_formats', '').split(',')]
+    valid = [f for f in dict.fromkeys(formats) if f in IMAGE_SET_FORMATS]
+    if not valid:
+        valid = [target_format.lower() if target_format.lower() in IMAGE_SET_FORMATS else 'webp']
+    return valid
+
+
+def is_enabled(settings):
+    return bool(set_widths(settings))
+
+
+def codec_name(formats):
+    """Codec label of an image set for the throughput history, e.g. 'webp+avif-set'."""
+    return f"{'+'.join(formats)}-set"
+
+
+def plan_outputs(output_path, widths, formats, source_width=0):
+    """
+    (width, format, path) of every output of an image set. Widths that would upscale
+    a source of known width are replaced by one output at the source width.
+    """
+    if source_width > 0 and widths and widths[-1] >= source_width:
+        widths = [w for w in widths if w < source_width] + [source_width]
+    stem = os.path.splitext(output_path)[0]
+    return [(width, fmt, f"{stem}-{width}w.{fmt}") for width in widths for fmt in formats]
+
+
+def manifest_path(output_path):
+    return f"{os.path.splitext(output_path)[0]}-srcset.json"
+
+
+def write_manifest(path, source_name, source_size, outputs):
+    """Write the manifest of a finished image set; paths in it are relative to the manifest."""
+    source_width, source_height = source_size
+    images = []
+    srcset = {}
+    for width, fmt, output in outputs:
+        name = os.path.basename(output)
+        images.append({
+            'path': name,
+            'format': fmt,
+            'width': width,
+            'height': round(source_height * width / source_width) if source_width and source_height else None,
+            'bytes': os.path.getsize(output)
+        })
+        srcset.setdefault(fmt, []).append(f"{name} {width}w")
+    manifest = {
+        'source': source_name,
+        'width': source_width or None,
+        'height': source_height or None,
+        'images': images,
+        'srcset': {fmt: ", ".join(entries) for fmt, entries in srcset.items()}
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
@@ -0,0 +1,163 @@
+"""
+Storage-device-aware I/O scheduling.
+Jobs are grouped by the device (st_dev) of their source and destination, and each
+device gets its own concurrency limit on top of the global one: spinning disks and
+network shares thrash when read by many encoders at once, SSDs/NVMe do not.
+Device kinds are auto-detected on Linux from /sys/block and /proc/self/mountinfo.
+"""
+
+import asyncio
+import contextlib
+import os
+import sys
+
+from logger import app_logger
+
+DEVICE_SSD = 'ssd'
+DEVICE_HDD = 'hdd'
+DEVICE_NETWORK = 'network'
+DEVICE_UNKNOWN = 'unknown'
+
+NETWORK_FILESYSTEMS = {'nfs', 'nfs4', 'cifs', 'smb3', 'smbfs', '9p', 'afpfs', 'davfs', 'fuse.sshfs',
+                       'fuse.rclone', 'fuse.gvfsd-fuse', 'ceph', 'glusterfs'}
+
+# Per-device job limits (0 = only the global limit applies) and their setting keys
+DEFAULT_LIMITS = {DEVICE_HDD: 1, DEVICE_NETWORK: 2, DEVICE_SSD: 0, DEVICE_UNKNOWN: 0}
+LIMIT_SETTINGS = {DEVICE_HDD: 'io_hdd_jobs', DEVICE_NETWORK: 'io_network_jobs', DEVICE_SSD: 'io_ssd_jobs'}
+
+
+def device_of(path):
+    """st_dev of a path, or of its closest existing parent (outputs may not exist yet)."""
+    path = os.path.abspath(path)
+    while True:
+        try:
+            return os.stat(path).st_dev
+        except OSError:
+            parent = os.path.dirname(path)
+            if parent == path:
+                return None
+            path = parent
+
+
+def read_mountinfo():
+    """Map 'major:minor' -> (fstype, source) from /proc/self/mountinfo."""
+    mounts = {}
+    try:
+        with open('/proc/self/mountinfo', 'r', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                fields, _, rest = line.partition(' - ')
+                fields, rest = fields.split(), rest.split()
+                if len(fields) >= 3 and len(rest) >= 2:
+                    mounts.setdefault(fields[2], (rest[0], rest[1]))
+    except OSError:
+        pass
+    return mounts
+
+
+def block_rotational(major, minor):
+    """True/False from the kernel's rotational flag, None if there is no block device."""
+    base = f"/sys/dev/block/{major}:{minor}"
+    # Partitions don't have a queue of their own; their parent disk does
+    for queue_dir in (os.path.join(base, 'queue'), os.path.join(os.path.realpath(base), '..', 'queue')):
+        try:
+            with open(os.path.join(queue_dir, 'rotational'), 'r') as f:
+                return f.read().strip() == '1'
+        except OSError:
+            continue
+    return None
+
+
+def classify_device(device, mounts=None):
+    """Device kind for an st_dev value; DEVICE_UNKNOWN off Linux or when undetectable."""
+    if device is None or not sys.platform.startswith('linux'):
+        return DEVICE_UNKNOWN
+    if mounts is None:
+        mounts = read_mountinfo()
+    major, minor = os.major(device), os.minor(device)
+    fstype, source = mounts.get(f"{major}:{minor}", ("", ""))
+    if fstype in NETWORK_FILESYSTEMS:
+        return DEVICE_NETWORK
+
+    rotational = block_rotational(major, minor)
+    if rotational is None and source.startswith('/dev/'):
+        # btrfs and friends report an anonymous st_dev: follow the mount source instead
+        try:
+            rdev = os.stat(source).st_rdev
+            rotational = block_rotational(os.major(rdev), os.minor(rdev))
+        except OSError:
+            pass
+    if rotational is None:
+        return DEVICE_UNKNOWN
+    return DEVICE_HDD if rotational else DEVICE_SSD
+
+
+def device_limits(settings):
+    """Per-kind job limits from settings, falling back to DEFAULT_LIMITS."""
+    limits = dict(DEFAULT_LIMITS)
+    for kind, key in LIMIT_SETTINGS.items():
+        try:
+            limits[kind] = max(0, int(settings.get(key, str(DEFAULT_LIMITS[kind]))))
+        except (TypeError, ValueError):
+            pass
+    return limits
+
+
+class IOScheduler:
+    """
+    Hands out per-device slots for jobs. A job holds one slot on its source device
+    and one on its destination device (a single one when both are the same).
+    Slots are always taken in device order so two jobs can't deadlock each other.
+    Must be used from a single event loop.
+    """
+    def __init__(self, settings):
+        self.enabled = settings.get('io_scheduling', 'true') == 'true'
+        self.limits = device_limits(settings)
+        self.mounts = None
+        self.kinds = {} # st_dev -> device kind
+        self.semaphores = {} # st_dev -> asyncio.Semaphore, only for limited devices
+
+    def kind(self, device):
+        if device not in self.kinds:
+            if self.mounts is None:
+                self.mounts = read_mountinfo()
+            self.kinds[device] = classify_device(device, self.mounts)
+            limit = self.limits[self.kinds[device]]
+            app_logger.info(f"I/O device {device}: {self.kinds[device]}"
+                            f"{f', limit {limit}' if limit else ''}")
+        return self.kinds[device]
+
+    def devices_for(self, job):
+        devices = set()
+        for path in (job.input_path, job.output_path):
+            if path:
+                device = device_of(path)
+                if device is not None:
+                    devices.add(device)
+        return sorted(devices)
+
+    def semaphore_for(self, device):
+        if device not in self.semaphores:
+            limit = self.limits[self.kind(device)]
+            self.semaphores[device] = asyncio.Semaphore(limit) if limit else None
+        return self.semaphores[device]
+
+    @contextlib.asynccontextmanager
+    async def device_slot(self, path):
+        """Hold a slot on the device of 'path' for I/O outside a job's own (e.g. read-ahead)."""
+        device = device_of(path) if self.enabled else None
+        semaphore = self.semaphore_for(device) if device is not None else None
+        async with contextlib.AsyncExitStack() as stack:
+            if semaphore is not None:
+                await stack.enter_async_context(semaphore)
+            yield
+
+    @contextlib.asynccontextmanager
+    async def slot(self, job):
+        """Hold the device slots a job needs for as long as the context is open."""
+        async with contextlib.AsyncExitStack() as stack:
+            if self.enabled:
+                for device in self.devices_for(job):
+                    semaphore = self.semaphore_for(device)
+                    if semaphore is not None:
+                        await stack.enter_async_context(semaphore)
+            yield
@@ -0,0 +1,164 @@
+"""
+Persistent queue of conversion batches.
+Each batch keeps its own file list, settings snapshot, target formats and output
+folder, so new batches can be staged and queued while an earlier one is running.
+The queue is saved after every change and restored on the next launch.
+"""
+
+import os
+import time
+import uuid
+
+from logger import app_logger
+from app_paths import load_json, save_json
+
+STATUS_QUEUED = 'queued'
+STATUS_RUNNING = 'running'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+
+class QueuedBatch:
+    """One staged set of files converted with the settings it was queued with."""
+    def __init__(self, files, settings, target_formats, source_folder_name="", output_base_dir="",
+                 batch_id=None, status=STATUS_QUEUED, summary="", created=None):
+        self.batch_id = batch_id or uuid.uuid4().hex[:12]
+        self.files = list(files)
+        self.settings = dict(settings)
+        self.target_formats = dict(target_formats) # media -> target format
+        self.source_folder_name = source_folder_name
+        self.output_base_dir = output_base_dir
+        self.status = status
+        self.summary = summary
+        self.created = created or time.time()
+
+    def label(self):
+        """Short description for the queue list."""
+        if self.source_folder_name:
+            name = f"Folder '{self.source_folder_name}'"
+        elif len(self.files) == 1:
+            name = os.path.basename(self.files[0])
+        else:
+            name = f"{os.path.basename(self.files[0])} +{len(self.files) - 1}"
+        formats = "/".join(self.target_formats[m] for m in ('image', 'video', 'audio') if m in self.target_formats)
+        return f"[{self.status.capitalize()}] {name} - {len(self.files)} files -> {formats}"
+
+    def to_dict(self):
+        return {
+            'batch_id': self.batch_id,
+            'files': self.files,
+            'settings': self.settings,
+            'target_formats': self.target_formats,
+            'source_folder_name': self.source_folder_name,
+            'output_base_dir': self.output_base_dir,
+            'status': self.status,
+            'summary': self.summary,
+            'created': self.created
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['files'], data.get('settings', {}), data.get('target_formats', {}),
+                   data.get('source_folder_name', ""), data.get('output_base_dir', ""),
+                   data.get('batch_id'), data.get('status', STATUS_QUEUED),
+                   data.get('summary', ""), data.get('created'))
+
+
+class JobQueue:
+    """
+    Ordered list of batches, persisted as JSON.
+    Only queued batches can be moved or removed; the running one stays put until
+    it finishes. A batch left 'running' by a previous session is queued again.
+    """
+    def __init__(self, queue_path):
+        self.queue_path = queue_path
+        self.batches = []
+        for data in load_json(queue_path, []):
+            try:
+                batch = QueuedBatch.from_dict(data)
+            except (KeyError, TypeError):
+                continue
+            if batch.status == STATUS_RUNNING:
+                batch.status = STATUS_QUEUED
+            self.batches.append(batch)
+
+    def get(self, batch_id):
+        for batch in self.batches:
+            if batch.batch_id == batch_id:
+                return batch
+        return None
+
+    def pending(self):
+        return [b for b in self.batches if b.status == STATUS_QUEUED]
+
+    def running(self):
+        for batch in self.batches:
+            if batch.status == STATUS_RUNNING:
+                return batch
+        return None
+
+    def add(self, batch):
+        self.batches.append(batch)
+        self.save()
+        app_logger.info(f"Queued batch {batch.batch_id}: {len(batch.files)} files")
+
+    def remove(self, batch_id):
+        """Remove a queued or finished batch. Returns False for the running one."""
+        batch = self.get(batch_id)
+        if batch is None or batch.status == STATUS_RUNNING:
+            return False
+        self.batches.remove(batch)
+        self.save()
+        return True
+
+    def move(self, batch_id, offset):
+        """Move a queued batch up (negative) or down (positive) among the queued ones."""
+        batch = self.get(batch_id)
+        if batch is None or batch.status != STATUS_QUEUED:
+            return False
+        queued = self.pending()
+        position = queued.index(batch)
+        target = max(0, min(len(queued) - 1, position + offset))
+        if target == position:
+            return False
+        # Re-insert before (moving up) or after (moving down) the queued batch at the target
+        other = queued[target]
+        self.batches.remove(batch)
+        index = self.batches.index(other)
+        self.batches.insert(index if target < position else index + 1, batch)
+        self.save()
+        return True
+
+    def prioritize(self, batch_id):
+        """Make a queued batch the next one to run."""
+        batch = self.get(batch_id)
+        if batch is None or batch.status != STATUS_QUEUED:
+            return False
+        return self.move(batch_id, -len(self.batches))
+
+    def start_next(self):
+        """Mark the next queued batch as running and return it, or None if the queue is drained."""
+        queued = self.pending()
+        if not queued:
+            return None
+        queued[0].status = STATUS_RUNNING
+        self.save()
+        return queued[0]
+
+    def finish(self, batch_id, success, summary):
+        batch = self.get(batch_id)
+        if batch is None:
+            return
+        batch.status = STATUS_DONE if success else STATUS_FAILED
+        batch.summary = summary
+        self.save()
+
+    def clear_finished(self):
+        self.batches = [b for b in self.batches if b.status in (STATUS_QUEUED, STATUS_RUNNING)]
+        self.save()
+
+    def save(self):
+        try:
+            save_json(self.queue_path, [b.to_dict() for b in self.batches])
+        except OSError as e:
+            app_logger.warning(f"Failed to save job queue: {e}")
@@ -43,6 +43,16 @@ class Logger:
     def warning(self, message):
         self.logger.warning(message)
 
+    def exception(self, message):
+        """Log an error with the traceback of the exception being handled."""
+        self.logger.exception(message)
+
+    def set_console_level(self, level):
+        """Change what is echoed to stderr; the log file keeps everything."""
+        for handler in logging.getLogger().handlers:
+            if not isinstance(handler, logging.FileHandler):
+                handler.setLevel(level)
+
     def get_log_dir(self):
         """Return the directory where logs are stored."""
         return self.log_dir
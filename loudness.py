@@ -0,0 +1,75 @@
+"""
+EBU R128 loudness normalization support.
+First-pass loudnorm measurements are cached per file identity and target, so
+re-exporting the same source to other formats skips the analysis decode.
+Album mode derives one shared gain for all tracks of a folder.
+"""
+
+import math
+
+from app_paths import FileKeyedStore
+from ffmpeg_commands import loudnorm_filter
+
+NORMALIZE_OFF = 'Off'
+NORMALIZE_TRACK = 'Track'
+NORMALIZE_ALBUM = 'Album'
+
+# Wide loudness range target so loudnorm can stay in linear (dynamics preserving) mode
+TARGET_LRA = 20
+
+
+def loudness_targets(settings):
+    """(integrated LUFS, true peak dBTP, LRA) from settings, with EBU R128 defaults."""
+    try:
+        target_i = max(-70.0, min(-5.0, float(settings.get('audio_target_lufs', '-23'))))
+    except ValueError:
+        target_i = -23.0
+    try:
+        target_tp = max(-9.0, min(0.0, float(settings.get('audio_true_peak', '-1'))))
+    except ValueError:
+        target_tp = -1.0
+    return target_i, target_tp, TARGET_LRA
+
+
+def is_measurable(measured):
+    """Silent or undecodable files report -inf loudness and can't be normalized."""
+    return measured is not None and all(math.isfinite(v) for v in measured.values())
+
+
+def track_filter(targets, measured, sample_rate):
+    """
+    Second-pass filter for one track. loudnorm works at 192 kHz internally,
+    so resample back to the source rate (later '-ar' settings still apply).
+    """
+    return f"{loudnorm_filter(*targets, measured)},aresample={sample_rate or 48000}"
+
+
+def album_gain(tracks, targets):
+    """
+    One gain (dB) for a set of (measured, duration) tracks: the duration-weighted
+    energy average of their integrated loudness brought to the target, limited so
+    the loudest true peak stays under the true peak target.
+    """
+    usable = [(m, d) for m, d in tracks if is_measurable(m)]
+    if not usable:
+        return None
+    target_i, target_tp, _ = targets
+    weights = [d if d > 0 else 1.0 for _, d in usable]
+    energy = sum(w * math.pow(10, m['input_i'] / 10) for (m, _), w in zip(usable, weights)) / sum(weights)
+    album_i = 10 * math.log10(energy)
+    gain = target_i - album_i
+    max_peak = max(m['input_tp'] for m, _ in usable)
+    return min(gain, target_tp - max_peak)
+
+
+def album_filter(gain):
+    return f"volume={gain:.2f}dB"
+
+
+class LoudnessCache(FileKeyedStore):
+    """Persistent first-pass measurements keyed by path, size, mtime and loudness target."""
+    description = "loudness cache"
+    key_fields = 5
+
+    def key_for(self, path, targets):
+        return self.file_key(path, targets[0], targets[1], targets[2])
@@ -1,3 +1,6 @@
+import time
+STARTUP_STARTED = time.perf_counter()
+
 import sys
 import os
 import subprocess
@@ -5,49 +8,110 @@ from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                              QHBoxLayout, QLabel, QPushButton, QListWidget, 
                              QProgressBar, QFileDialog, QDialog, QFormLayout, 
                              QLineEdit, QComboBox, QMessageBox, QTabWidget, 
-                             QCheckBox, QFrame, QMenu)
-from PySide6.QtCore import Qt, QMimeData, Signal, QUrl, QThread
-from PySide6.QtGui import QDragEnterEvent, QDropEvent, QDesktopServices
+                             QCheckBox, QFrame, QMenu, QListWidgetItem)
+from PySide6.QtCore import Qt, QMimeData, Signal, QUrl, QThread, QTimer, QSize, QPoint
+from PySide6.QtGui import QDragEnterEvent, QDropEvent, QDesktopServices, QIcon
 
 from styles import MAIN_STYLE
 from settings_manager import SettingsManager
 from codec_manager import CodecManager
-from converter_worker import ConverterWorker
+from thumbnails import ThumbnailLoader
+from ffmpeg_commands import folder_output_dir
+from app_paths import get_data_file, load_json, save_json
+from job_queue import JobQueue, QueuedBatch
+from archive_io import is_archive, list_members, ARCHIVE_EXTENSIONS
 from logger import app_logger
 from config import (VIDEO_FORMAT_CONFIG, VIDEO_FORMATS, IMAGE_FORMATS, 
                     ALL_SUPPORTED_EXTENSIONS, AUDIO_FORMATS, AUDIO_FORMAT_CONFIG,
                     AUDIO_QUALITY_LEVELS, AUDIO_BITRATE_MODES, AUDIO_COMPRESSION_LEVELS,
-                    AUDIO_SAMPLE_WIDTHS, AUDIO_RESAMPLE_RATES)
+                    AUDIO_SAMPLE_WIDTHS, AUDIO_RESAMPLE_RATES, AUDIO_NORMALIZE_MODES, SCHEDULING_POLICIES, ARCHIVE_OUTPUT_MODES, GIF_STATS_MODES, GIF_DITHER_MODES,
+                    IMAGE_ENGINES, IMAGE_RESIZE_MODES, TRIM_MODES, VIDEO_RATE_MODES, VIDEO_ADAPTIVE_QUALITIES, VERIFY_LEVELS)
+# The conversion pipeline (asyncio, conversion_api, batch_planner, Pillow) is imported
+# on first use so the window can paint before it is loaded.
+
+IMPORTS_FINISHED = time.perf_counter()
 
 CLIENT_VERSION = "v1.1.1"
+UPDATE_CHECK_TTL = 24 * 3600 # seconds between GitHub release lookups
+UPDATE_CHECK_TIMEOUT = 5
 
 class UpdateWorker(QThread):
-    """Worker to check for updates from GitHub API."""
+    """
+    Worker to check for updates from GitHub API.
+    The answer is cached for UPDATE_CHECK_TTL so most launches make no request at all.
+    """
     update_available = Signal(str)
 
     def run(self):
+        cache_path = get_data_file("update_check.json")
+        cached = load_json(cache_path, {})
+        if time.time() - cached.get('checked_at', 0) < UPDATE_CHECK_TTL:
+            latest_version = cached.get('latest_version')
+        else:
+            latest_version = self.fetch_latest_version()
+            if latest_version is None:
+                return
+            try:
+                save_json(cache_path, {'checked_at': time.time(), 'latest_version': latest_version})
+            except OSError as e:
+                app_logger.warning(f"Failed to cache update check: {e}")
+
+        if latest_version and latest_version != CLIENT_VERSION:
+            self.update_available.emit(latest_version)
+
+    def fetch_latest_version(self):
         url = "https://api.github.com/repos/cenullum/Yet-Another-Open-File-Converter/releases/latest"
         try:
             import urllib.request
             import json
             req = urllib.request.Request(url, headers={'User-Agent': 'Mozilla/5.0'})
-            with urllib.request.urlopen(req) as response:
+            with urllib.request.urlopen(req, timeout=UPDATE_CHECK_TIMEOUT) as response:
                 latest_data = json.loads(response.read())
-                latest_version = latest_data.get('name', latest_data.get('tag_name'))
-            
-            if latest_version and latest_version != CLIENT_VERSION:
-                self.update_available.emit(latest_version)
+                return latest_data.get('name', latest_data.get('tag_name')) or ""
         except Exception as e:
             app_logger.error(f"Update check failed: {e}")
+            return None
+
+class CodecDetectionWorker(QThread):
+    """Worker to detect FFmpeg encoders (including the hardware self-tests) off the UI thread."""
+    def __init__(self, codec_manager):
+        super().__init__()
+        self.codec_manager = codec_manager
+
+    def run(self):
+        self.codec_manager.ensure_detected()
+
+class PlannerWorker(QThread):
+    """Worker to run the pre-flight batch planner without blocking the UI."""
+    planned = Signal(object)
+
+    def __init__(self, jobs, settings):
+        super().__init__()
+        self.jobs = jobs
+        self.settings = settings
+
+    def run(self):
+        import asyncio
+        from batch_planner import plan_batch
+        from conversion_api import configured_concurrency
+        try:
+            plan = asyncio.run(plan_batch(self.jobs, self.settings, configured_concurrency(self.settings)))
+        except Exception as e:
+            app_logger.error(f"Batch planning failed: {e}")
+            plan = None
+        self.planned.emit(plan)
 
 # CLIENT_VERSION is defined above
 
 class SettingsDialog(QDialog):
     """Dialogue for adjusting image, video, and general settings."""
-    def __init__(self, settings_manager, codec_manager, parent=None):
+    def __init__(self, settings_manager, codec_manager, parent=None, codec_detector=None):
         super().__init__(parent)
         self.settings_manager = settings_manager
         self.codec_manager = codec_manager
+        if codec_detector is not None:
+            # Codec lists show software encoders until detection finishes, then refresh
+            codec_detector.finished.connect(self.update_ui_state)
         self.setWindowTitle("Settings")
         self.setMinimumWidth(550)
         
@@ -72,6 +136,13 @@ class SettingsDialog(QDialog):
         self.img_resize.setPlaceholderText("e.g. 1920")
         self.img_resize.setText(self.settings_manager.get_setting("image_resize", "0"))
         img_layout.addRow("Resize (Longest Side):", self.img_resize)
+
+        self.img_resize_mode = QComboBox()
+        self.img_resize_mode.addItems(IMAGE_RESIZE_MODES)
+        self.img_resize_mode.setCurrentText(self.settings_manager.get_setting("image_resize_mode", "Balanced"))
+        self.img_resize_mode.setToolTip("Balanced/Fast decode large JPEGs at reduced resolution before resizing: "
+                                        "much faster, slightly softer in Fast mode")
+        img_layout.addRow("Resize Mode:", self.img_resize_mode)
         
         self.img_grayscale = QCheckBox("Black & White")
         self.img_grayscale.setChecked(self.settings_manager.get_setting("image_grayscale", "false") == "true")
@@ -81,9 +152,33 @@ class SettingsDialog(QDialog):
         self.img_metadata.setChecked(self.settings_manager.get_setting("image_metadata", "true") == "true")
         img_layout.addRow("", self.img_metadata)
         
-        hint_img = QLabel("Tip: 0 means original size.")
+        self.img_engine = QComboBox()
+        self.img_engine.addItems(IMAGE_ENGINES)
+        self.img_engine.setCurrentText(self.settings_manager.get_setting("image_engine", "auto"))
+        img_layout.addRow("Engine:", self.img_engine)
+
+        hint_img = QLabel("Tip: 0 means original size. 'auto' converts jpg/png/webp/bmp/tiff in-process when Pillow is installed.")
         hint_img.setStyleSheet("color: gray; font-size: 10px;")
         img_layout.addRow("", hint_img)
+
+        # Responsive image sets: several widths/formats per image, from one decode
+        self.img_set_widths = QLineEdit()
+        self.img_set_widths.setPlaceholderText("e.g. 320,640,1280,2560 (empty = off)")
+        self.img_set_widths.setText(self.settings_manager.get_setting("image_set_widths", ""))
+        img_layout.addRow("Image Set Widths:", self.img_set_widths)
+
+        self.img_set_formats = QLineEdit()
+        self.img_set_formats.setPlaceholderText("e.g. webp,avif (empty = Format above)")
+        self.img_set_formats.setText(self.settings_manager.get_setting("image_set_formats", ""))
+        img_layout.addRow("Image Set Formats:", self.img_set_formats)
+
+        self.img_set_manifest = QCheckBox("Write a JSON manifest (sizes, bytes, srcset)")
+        self.img_set_manifest.setChecked(self.settings_manager.get_setting("image_set_manifest", "false") == "true")
+        img_layout.addRow("", self.img_set_manifest)
+
+        hint_set = QLabel("Tip: each image is saved at every width and format, e.g. name-640w.webp.")
+        hint_set.setStyleSheet("color: gray; font-size: 10px;")
+        img_layout.addRow("", hint_set)
         
         self.tabs.addTab(self.image_tab, "Image")
         
@@ -106,6 +201,20 @@ class SettingsDialog(QDialog):
         self.video_bitrate = QLineEdit()
         self.video_bitrate.setText(self.settings_manager.get_setting("video_bitrate", "2500k"))
         vid_layout.addRow("Bitrate (e.g. 2500k):", self.video_bitrate)
+
+        # Adaptive picks a CRF per file; the bitrate above then only sets the ceiling (2x)
+        self.video_rate_control = QComboBox()
+        self.video_rate_control.addItems(VIDEO_RATE_MODES)
+        self.video_rate_control.setCurrentText(self.settings_manager.get_setting("video_rate_control", "Fixed Bitrate"))
+        self.video_rate_control.setToolTip("Adaptive: short probe encodes pick the smallest size that keeps "
+                                           "the chosen quality; still footage gets far less than the bitrate")
+        self.video_rate_control.currentTextChanged.connect(self.update_ui_state)
+        vid_layout.addRow("Rate Control:", self.video_rate_control)
+
+        self.video_adaptive_quality = QComboBox()
+        self.video_adaptive_quality.addItems(VIDEO_ADAPTIVE_QUALITIES)
+        self.video_adaptive_quality.setCurrentText(self.settings_manager.get_setting("video_adaptive_quality", "Balanced"))
+        vid_layout.addRow("Adaptive Quality:", self.video_adaptive_quality)
         
         self.video_res = QComboBox()
         self.video_res.addItems(["Original", "4K (2160p)", "2K (1440p)", "1080p", "720p", "480p", "360p"])
@@ -116,6 +225,11 @@ class SettingsDialog(QDialog):
         self.video_fps.setText(self.settings_manager.get_setting("video_fps", "30"))
         vid_layout.addRow("FPS:", self.video_fps)
 
+        # Resolution and FPS are maximums unless forced
+        self.video_allow_upscale = QCheckBox("Allow upscaling / higher FPS than the source")
+        self.video_allow_upscale.setChecked(self.settings_manager.get_setting("video_allow_upscale", "false") == "true")
+        vid_layout.addRow("", self.video_allow_upscale)
+
         self.video_metadata = QCheckBox("Keep Metadata")
         self.video_metadata.setChecked(self.settings_manager.get_setting("video_metadata", "true") == "true")
         vid_layout.addRow("", self.video_metadata)
@@ -179,9 +293,184 @@ class SettingsDialog(QDialog):
         self.snd_force_mono = QCheckBox("Force Mono Output")
         self.snd_force_mono.setChecked(self.settings_manager.get_setting("audio_force_mono", "false") == "true")
         snd_layout.addRow("", self.snd_force_mono)
+
+        self.snd_allow_upsample = QCheckBox("Allow resampling above the source rate")
+        self.snd_allow_upsample.setChecked(self.settings_manager.get_setting("audio_allow_upsample", "false") == "true")
+        snd_layout.addRow("", self.snd_allow_upsample)
+        
+        # Loudness normalization (all formats)
+        self.snd_normalize = QComboBox()
+        self.snd_normalize.addItems(AUDIO_NORMALIZE_MODES)
+        self.snd_normalize.setCurrentText(self.settings_manager.get_setting("audio_normalize", "Off"))
+        snd_layout.addRow("Normalize Loudness:", self.snd_normalize)
+        
+        self.snd_target_lufs = QLineEdit()
+        self.snd_target_lufs.setText(self.settings_manager.get_setting("audio_target_lufs", "-23"))
+        self.snd_target_lufs.setPlaceholderText("e.g. -23 (EBU R128), -14 (streaming)")
+        snd_layout.addRow("Target Loudness (LUFS):", self.snd_target_lufs)
+        
+        self.snd_true_peak = QLineEdit()
+        self.snd_true_peak.setText(self.settings_manager.get_setting("audio_true_peak", "-1"))
+        snd_layout.addRow("True Peak Limit (dBTP):", self.snd_true_peak)
         
         self.tabs.addTab(self.sound_tab, "Sound")
 
+        # --- GIF Tab ---
+        self.gif_tab = QWidget()
+        gif_layout = QFormLayout(self.gif_tab)
+
+        self.gif_fps = QLineEdit()
+        self.gif_fps.setText(self.settings_manager.get_setting("gif_fps", "15"))
+        gif_layout.addRow("Max FPS:", self.gif_fps)
+
+        self.gif_max_width = QLineEdit()
+        self.gif_max_width.setText(self.settings_manager.get_setting("gif_max_width", "480"))
+        gif_layout.addRow("Max Width:", self.gif_max_width)
+
+        self.gif_max_colors = QLineEdit()
+        self.gif_max_colors.setText(self.settings_manager.get_setting("gif_max_colors", "256"))
+        gif_layout.addRow("Max Colors (2-256):", self.gif_max_colors)
+
+        self.gif_stats_mode = QComboBox()
+        self.gif_stats_mode.addItems(GIF_STATS_MODES)
+        self.gif_stats_mode.setCurrentText(self.settings_manager.get_setting("gif_stats_mode", "diff"))
+        gif_layout.addRow("Palette Stats:", self.gif_stats_mode)
+
+        self.gif_dither = QComboBox()
+        self.gif_dither.addItems(GIF_DITHER_MODES)
+        self.gif_dither.setCurrentText(self.settings_manager.get_setting("gif_dither", "sierra2_4a"))
+        gif_layout.addRow("Dithering:", self.gif_dither)
+
+        hint_gif = QLabel("Tip: used for GIF output from videos and images. 0 FPS/width means original.")
+        hint_gif.setStyleSheet("color: gray; font-size: 10px;")
+        gif_layout.addRow("", hint_gif)
+
+        self.tabs.addTab(self.gif_tab, "GIF")
+
+        # --- General Tab ---
+        self.general_tab = QWidget()
+        gen_layout = QFormLayout(self.general_tab)
+
+        self.conversion_concurrency = QLineEdit()
+        self.conversion_concurrency.setText(self.settings_manager.get_setting("conversion_concurrency", "1"))
+        gen_layout.addRow("Parallel Jobs:", self.conversion_concurrency)
+
+        hint_gen = QLabel("Tip: number of files converted at the same time.")
+        hint_gen.setStyleSheet("color: gray; font-size: 10px;")
+        gen_layout.addRow("", hint_gen)
+
+        self.show_thumbnails = QCheckBox("Show thumbnails and media info in the file list")
+        self.show_thumbnails.setChecked(self.settings_manager.get_setting("show_thumbnails", "true") == "true")
+        gen_layout.addRow("", self.show_thumbnails)
+
+        self.preflight_check = QCheckBox("Check disk space and estimate time before converting")
+        self.preflight_check.setChecked(self.settings_manager.get_setting("preflight_check", "true") == "true")
+        gen_layout.addRow("", self.preflight_check)
+
+        self.dedupe_inputs = QCheckBox("Convert identical files only once")
+        self.dedupe_inputs.setChecked(self.settings_manager.get_setting("dedupe_inputs", "false") == "true")
+        gen_layout.addRow("", self.dedupe_inputs)
+
+        self.dedupe_index = QCheckBox("Reuse outputs of identical files from earlier runs")
+        self.dedupe_index.setChecked(self.settings_manager.get_setting("dedupe_index", "false") == "true")
+        gen_layout.addRow("", self.dedupe_index)
+
+        self.scheduling_policy = QComboBox()
+        self.scheduling_policy.addItems(SCHEDULING_POLICIES)
+        self.scheduling_policy.setCurrentText(self.settings_manager.get_setting("scheduling_policy", "FIFO"))
+        gen_layout.addRow("Job Order:", self.scheduling_policy)
+
+        hint_order = QLabel("Shortest First: quick files are ready sooner. Longest First: whole batch finishes sooner.")
+        hint_order.setStyleSheet("color: gray; font-size: 10px;")
+        gen_layout.addRow("", hint_order)
+
+        self.verify_outputs = QComboBox()
+        self.verify_outputs.addItems(VERIFY_LEVELS)
+        self.verify_outputs.setCurrentText(self.settings_manager.get_setting("verify_outputs", "Off"))
+        gen_layout.addRow("Verify Outputs:", self.verify_outputs)
+
+        hint_verify = QLabel("Probe: container and duration. Sampled: also decodes start, middle and end. Full: decodes all.")
+        hint_verify.setStyleSheet("color: gray; font-size: 10px;")
+        gen_layout.addRow("", hint_verify)
+
+        # Outputs are always staged and renamed into place; this only adds fsync batches
+        self.output_sync_every = QLineEdit()
+        self.output_sync_every.setText(self.settings_manager.get_setting("output_sync_every", "0"))
+        self.output_sync_every.setPlaceholderText("0 = off, 1 = every file")
+        gen_layout.addRow("Sync to Disk Every (files):", self.output_sync_every)
+
+        hint_sync = QLabel("Tip: synced outputs survive a power loss. Larger batches cost less on slow drives.")
+        hint_sync.setStyleSheet("color: gray; font-size: 10px;")
+        gen_layout.addRow("", hint_sync)
+
+        self.archive_output = QComboBox()
+        self.archive_output.addItems(ARCHIVE_OUTPUT_MODES)
+        self.archive_output.setCurrentText(self.settings_manager.get_setting("archive_output", "Off"))
+        gen_layout.addRow("Archive Outputs:", self.archive_output)
+
+        # Rules in profiles.json send matching files to their own format and settings
+        self.conversion_profiles = QCheckBox("Use conversion profiles (per-file formats by rules)")
+        self.conversion_profiles.setChecked(self.settings_manager.get_setting("conversion_profiles", "false") == "true")
+        self.btn_edit_profiles = QPushButton("Edit Profiles...")
+        self.btn_edit_profiles.clicked.connect(self.open_profiles)
+        profiles_row = QHBoxLayout()
+        profiles_row.addWidget(self.conversion_profiles)
+        profiles_row.addWidget(self.btn_edit_profiles)
+        gen_layout.addRow("", profiles_row)
+
+        hint_profiles = QLabel("Tip: files no rule matches use the format tabs. Rules match globs, extensions, size or media info.")
+        hint_profiles.setStyleSheet("color: gray; font-size: 10px;")
+        gen_layout.addRow("", hint_profiles)
+
+        # Trimming applies to every video and audio file of the batch
+        self.trim_start = QLineEdit()
+        self.trim_start.setPlaceholderText("e.g. 1:30")
+        self.trim_start.setText(self.settings_manager.get_setting("trim_start", ""))
+        gen_layout.addRow("Trim Start:", self.trim_start)
+
+        self.trim_end = QLineEdit()
+        self.trim_end.setPlaceholderText("e.g. 01:02:03.5")
+        self.trim_end.setText(self.settings_manager.get_setting("trim_end", ""))
+        gen_layout.addRow("Trim End:", self.trim_end)
+
+        self.trim_mode = QComboBox()
+        self.trim_mode.addItems(TRIM_MODES)
+        self.trim_mode.setCurrentText(self.settings_manager.get_setting("trim_mode", "Exact"))
+        gen_layout.addRow("Trim Mode:", self.trim_mode)
+
+        hint_trim = QLabel("Tip: empty means from the start / to the end. Copy cuts on keyframes without re-encoding.")
+        hint_trim.setStyleSheet("color: gray; font-size: 10px;")
+        gen_layout.addRow("", hint_trim)
+
+        # Per-device limits on top of Parallel Jobs (0 = no extra limit)
+        self.io_scheduling = QCheckBox("Limit parallel jobs per disk (detects hard drives and network shares)")
+        self.io_scheduling.setChecked(self.settings_manager.get_setting("io_scheduling", "true") == "true")
+        gen_layout.addRow("", self.io_scheduling)
+
+        self.io_hdd_jobs = QLineEdit()
+        self.io_hdd_jobs.setText(self.settings_manager.get_setting("io_hdd_jobs", "1"))
+        gen_layout.addRow("Jobs per Hard Drive:", self.io_hdd_jobs)
+
+        self.io_network_jobs = QLineEdit()
+        self.io_network_jobs.setText(self.settings_manager.get_setting("io_network_jobs", "2"))
+        gen_layout.addRow("Jobs per Network Share:", self.io_network_jobs)
+
+        self.io_ssd_jobs = QLineEdit()
+        self.io_ssd_jobs.setText(self.settings_manager.get_setting("io_ssd_jobs", "0"))
+        self.io_ssd_jobs.setPlaceholderText("0 = no limit")
+        gen_layout.addRow("Jobs per SSD:", self.io_ssd_jobs)
+
+        self.prefetch_depth = QLineEdit()
+        self.prefetch_depth.setText(self.settings_manager.get_setting("prefetch_depth", "2"))
+        self.prefetch_depth.setPlaceholderText("0 = off")
+        gen_layout.addRow("Prefetch Files:", self.prefetch_depth)
+
+        hint_prefetch = QLabel("Tip: upcoming files are probed and read into memory while others convert.")
+        hint_prefetch.setStyleSheet("color: gray; font-size: 10px;")
+        gen_layout.addRow("", hint_prefetch)
+
+        self.tabs.addTab(self.general_tab, "General")
+
         # --- Help Tab ---
         self.help_tab = QWidget()
         help_vbox = QVBoxLayout(self.help_tab)
@@ -223,6 +512,7 @@ class SettingsDialog(QDialog):
         
         # Video/Audio codec filtering
         vid_fmt = self.target_vid_format.currentText()
+        self.video_adaptive_quality.setEnabled(self.video_rate_control.currentText() == "Adaptive")
         if vid_fmt in VIDEO_FORMAT_CONFIG:
             config = VIDEO_FORMAT_CONFIG[vid_fmt]
             
@@ -299,20 +589,39 @@ class SettingsDialog(QDialog):
         if os.path.exists(log_dir):
             QDesktopServices.openUrl(QUrl.fromLocalFile(log_dir))
 
+    def open_profiles(self):
+        """Open profiles.json in the system editor, creating it from the example first."""
+        from profiles import ensure_profiles_file, PROFILES_FILE
+        profiles_path = get_data_file(PROFILES_FILE)
+        try:
+            ensure_profiles_file(profiles_path)
+        except OSError as e:
+            app_logger.error(f"Failed to create {profiles_path}: {e}")
+            return
+        QDesktopServices.openUrl(QUrl.fromLocalFile(profiles_path))
+
     def save_settings(self):
         """Persist all settings."""
         settings = {
             "target_img_format": self.target_img_format.currentText(),
             "image_quality": self.img_quality.text(),
             "image_resize": self.img_resize.text(),
+            "image_resize_mode": self.img_resize_mode.currentText(),
             "image_grayscale": "true" if self.img_grayscale.isChecked() else "false",
             "image_metadata": "true" if self.img_metadata.isChecked() else "false",
+            "image_engine": self.img_engine.currentText(),
+            "image_set_widths": self.img_set_widths.text(),
+            "image_set_formats": self.img_set_formats.text(),
+            "image_set_manifest": "true" if self.img_set_manifest.isChecked() else "false",
             "target_vid_format": self.target_vid_format.currentText(),
             "video_codec": self.video_codec.currentText(),
             "audio_codec": self.audio_codec.currentText(),
             "video_bitrate": self.video_bitrate.text(),
+            "video_rate_control": self.video_rate_control.currentText(),
+            "video_adaptive_quality": self.video_adaptive_quality.currentText(),
             "video_resolution": self.video_res.currentText(),
             "video_fps": self.video_fps.text(),
+            "video_allow_upscale": "true" if self.video_allow_upscale.isChecked() else "false",
             "video_metadata": "true" if self.video_metadata.isChecked() else "false",
             "video_hw_accel": "true" if self.video_hw_accel.isChecked() else "false",
             # Sound settings
@@ -322,7 +631,36 @@ class SettingsDialog(QDialog):
             "audio_compression": self.snd_compression.currentText(),
             "audio_sample_width": self.snd_sample_width.currentText(),
             "audio_resample": self.snd_resample.currentText(),
-            "audio_force_mono": "true" if self.snd_force_mono.isChecked() else "false"
+            "audio_force_mono": "true" if self.snd_force_mono.isChecked() else "false",
+            "audio_allow_upsample": "true" if self.snd_allow_upsample.isChecked() else "false",
+            "audio_normalize": self.snd_normalize.currentText(),
+            "audio_target_lufs": self.snd_target_lufs.text(),
+            "audio_true_peak": self.snd_true_peak.text(),
+            # GIF settings
+            "gif_fps": self.gif_fps.text(),
+            "gif_max_width": self.gif_max_width.text(),
+            "gif_max_colors": self.gif_max_colors.text(),
+            "gif_stats_mode": self.gif_stats_mode.currentText(),
+            "gif_dither": self.gif_dither.currentText(),
+            # General settings
+            "conversion_concurrency": self.conversion_concurrency.text(),
+            "show_thumbnails": "true" if self.show_thumbnails.isChecked() else "false",
+            "preflight_check": "true" if self.preflight_check.isChecked() else "false",
+            "dedupe_inputs": "true" if self.dedupe_inputs.isChecked() else "false",
+            "dedupe_index": "true" if self.dedupe_index.isChecked() else "false",
+            "scheduling_policy": self.scheduling_policy.currentText(),
+            "archive_output": self.archive_output.currentText(),
+            "verify_outputs": self.verify_outputs.currentText(),
+            "output_sync_every": self.output_sync_every.text(),
+            "trim_start": self.trim_start.text(),
+            "trim_end": self.trim_end.text(),
+            "trim_mode": self.trim_mode.currentText(),
+            "io_scheduling": "true" if self.io_scheduling.isChecked() else "false",
+            "io_hdd_jobs": self.io_hdd_jobs.text(),
+            "io_network_jobs": self.io_network_jobs.text(),
+            "io_ssd_jobs": self.io_ssd_jobs.text(),
+            "prefetch_depth": self.prefetch_depth.text(),
+            "conversion_profiles": "true" if self.conversion_profiles.isChecked() else "false"
         }
         self.settings_manager.save_all_settings(settings)
         self.accept()
@@ -389,6 +727,7 @@ class MainWindow(QMainWindow):
         
         self.settings_manager = SettingsManager()
         self.codec_manager = CodecManager()
+        self.codec_detector = CodecDetectionWorker(self.codec_manager)
         
         self.files_to_convert = []
         self.source_folder_name = ""
@@ -419,17 +758,58 @@ class MainWindow(QMainWindow):
         layout.addWidget(self.drop_area)
 
         self.file_list = QListWidget()
+        self.file_list.setIconSize(QSize(64, 64))
+        self.file_list.verticalScrollBar().valueChanged.connect(self.request_visible_thumbnails)
+        # A resize that shows more or fewer rows changes the scroll range
+        self.file_list.verticalScrollBar().rangeChanged.connect(self.request_visible_thumbnails)
         layout.addWidget(self.file_list)
 
+        # Thumbnails are generated lazily, only for rows that scroll into view
+        self.show_thumbnails = self.settings_manager.get_setting("show_thumbnails", "true") == "true"
+        self.list_items = {} # path -> QListWidgetItem
+        self.thumbnail_loader = ThumbnailLoader(self)
+        self.thumbnail_loader.ready.connect(self.apply_thumbnail)
+
+        # Batch queue: new batches can be queued while an earlier one is converting
+        self.job_queue = JobQueue(get_data_file("job_queue.json"))
+        self.worker = None
+        self.current_batch = None
+        self.finished_batches = [] # (batch, success, summary) since the queue last drained
+
+        queue_label = QLabel("Queue")
+        queue_label.setStyleSheet("font-weight: bold; margin-top: 5px;")
+        layout.addWidget(queue_label)
+
+        self.queue_list = QListWidget()
+        self.queue_list.setMaximumHeight(110)
+        layout.addWidget(self.queue_list)
+
+        queue_btns = QHBoxLayout()
+        for text, handler in (("Up", lambda: self.move_selected_batch(-1)),
+                              ("Down", lambda: self.move_selected_batch(1)),
+                              ("Run Next", self.prioritize_selected_batch),
+                              ("Remove", self.remove_selected_batch),
+                              ("Clear Finished", self.clear_finished_batches)):
+            btn = QPushButton(text)
+            btn.setObjectName("SettingsButton")
+            btn.clicked.connect(handler)
+            queue_btns.addWidget(btn)
+        layout.addLayout(queue_btns)
+
         btns = QHBoxLayout()
         self.btn_convert = QPushButton("Convert Now")
         self.btn_convert.clicked.connect(self.start_process)
         
+        self.btn_plan = QPushButton("Estimate")
+        self.btn_plan.setObjectName("SettingsButton")
+        self.btn_plan.clicked.connect(self.show_estimate)
+
         self.btn_settings = QPushButton("Settings")
         self.btn_settings.setObjectName("SettingsButton")
         self.btn_settings.clicked.connect(self.show_settings)
         
         btns.addWidget(self.btn_convert)
+        btns.addWidget(self.btn_plan)
         btns.addWidget(self.btn_settings)
         layout.addLayout(btns)
 
@@ -442,12 +822,47 @@ class MainWindow(QMainWindow):
         self.status = QLabel("Ready")
         layout.addWidget(self.status)
 
+        # Live CPU/memory of each running FFmpeg process (Linux)
+        self.resource_label = QLabel("")
+        self.resource_label.setStyleSheet("color: gray; font-size: 10px;")
+        self.resource_label.setVisible(False)
+        layout.addWidget(self.resource_label)
+
         self.error_label = QLabel("")
         self.error_label.setStyleSheet("color: #ff5555; font-size: 12px; margin-top: 5px;")
         self.error_label.setVisible(False)
         layout.addWidget(self.error_label)
 
-        # Start update check
+        self.refresh_queue_list()
+        if self.job_queue.pending():
+            self.status.setText(f"{len(self.job_queue.pending())} batches waiting in the queue. "
+                                "Press Convert Now to resume.")
+
+        # Subprocess and network work waits until the window has been painted
+        self.first_paint_done = False
+        self.startup_budget_ms = None # set by --measure-startup: report timings and exit
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if not self.first_paint_done:
+            self.first_paint_done = True
+            QTimer.singleShot(0, self.start_background_tasks)
+
+    def start_background_tasks(self):
+        """Deferred startup work: encoder detection and the update check."""
+        first_paint = time.perf_counter()
+        app_logger.info(f"Startup: imports {(IMPORTS_FINISHED - STARTUP_STARTED) * 1000:.0f} ms, "
+                        f"first paint {(first_paint - STARTUP_STARTED) * 1000:.0f} ms")
+        if self.startup_budget_ms is not None:
+            imports_ms = (IMPORTS_FINISHED - STARTUP_STARTED) * 1000
+            paint_ms = (first_paint - STARTUP_STARTED) * 1000
+            print(f"imports_ms={imports_ms:.0f} first_paint_ms={paint_ms:.0f}")
+            over_budget = self.startup_budget_ms > 0 and paint_ms > self.startup_budget_ms
+            QApplication.exit(1 if over_budget else 0)
+            return
+
+        self.codec_detector.start()
+
         self.checker = UpdateWorker()
         self.checker.update_available.connect(self.show_update_notification)
         self.checker.start()
@@ -455,7 +870,11 @@ class MainWindow(QMainWindow):
     def handle_files(self, files, folder_name="", append=False):
         """Filter files by extension and store folder context if applicable."""
         self.error_label.setVisible(False) # Clear error on new files
-        new_files = [f for f in files if os.path.splitext(f)[1].lower() in ALL_SUPPORTED_EXTENSIONS]
+        # Archives are staged as their supported members, converted without extracting
+        expanded = []
+        for f in files:
+            expanded.extend(list_members(f, ALL_SUPPORTED_EXTENSIONS) if is_archive(f) else [f])
+        new_files = [f for f in expanded if os.path.splitext(f)[1].lower() in ALL_SUPPORTED_EXTENSIONS]
         
         if append:
             self.files_to_convert.extend(new_files)
@@ -466,9 +885,7 @@ class MainWindow(QMainWindow):
             self.files_to_convert = new_files
             self.source_folder_name = folder_name
         
-        self.file_list.clear()
-        for f in self.files_to_convert:
-            self.file_list.addItem(os.path.basename(f))
+        self.populate_file_list()
         
         if not self.files_to_convert:
             QMessageBox.warning(self, "Input Error", "No supported files found.")
@@ -479,6 +896,42 @@ class MainWindow(QMainWindow):
                 context = f"from folder '{folder_name}'" if folder_name else ""
                 self.status.setText(f"Staged {len(self.files_to_convert)} files {context}.")
 
+    def populate_file_list(self):
+        """Rebuild the staged list; thumbnails are requested for visible rows only."""
+        self.thumbnail_loader.reset()
+        self.file_list.clear()
+        self.list_items = {}
+        for f in self.files_to_convert:
+            item = QListWidgetItem(os.path.basename(f))
+            item.setData(Qt.UserRole, f)
+            self.file_list.addItem(item)
+            self.list_items[f] = item
+        # Wait for the layout pass so visible rows are known
+        QTimer.singleShot(0, self.request_visible_thumbnails)
+
+    def request_visible_thumbnails(self, *_):
+        if not self.show_thumbnails or self.file_list.count() == 0:
+            return
+        viewport = self.file_list.viewport()
+        first = self.file_list.indexAt(QPoint(0, 0)).row()
+        last = self.file_list.indexAt(QPoint(0, viewport.height() - 1)).row()
+        if first < 0:
+            return
+        if last < 0:
+            last = self.file_list.count() - 1
+        for row in range(first, last + 1):
+            self.thumbnail_loader.request(self.file_list.item(row).data(Qt.UserRole))
+
+    def apply_thumbnail(self, path, thumb_path, info):
+        item = self.list_items.get(path)
+        if item is None:
+            return
+        if thumb_path:
+            item.setIcon(QIcon(thumb_path))
+        description = info.get('description') if info else ""
+        if description:
+            item.setText(f"{os.path.basename(path)}\n{description}")
+
     def show_selection_menu(self):
         """Show context menu for choosing between files and folders."""
         menu = QMenu(self)
@@ -495,7 +948,8 @@ class MainWindow(QMainWindow):
             self.select_folder()
 
     def select_files(self):
-        ext_filter = "All Supported Files (" + " ".join([f"*{ext}" for ext in ALL_SUPPORTED_EXTENSIONS]) + ");;All Files (*)"
+        patterns = [f"*{ext}" for ext in ALL_SUPPORTED_EXTENSIONS] + [f"*{ext}" for ext in ARCHIVE_EXTENSIONS]
+        ext_filter = "All Supported Files (" + " ".join(patterns) + ");;All Files (*)"
         files, _ = QFileDialog.getOpenFileNames(
             self, "Select Files", "", ext_filter
         )
@@ -522,29 +976,153 @@ class MainWindow(QMainWindow):
 
     def show_settings(self):
         # Pass codec manager to settings dialog so it can filter codecs dynamically
-        SettingsDialog(self.settings_manager, self.codec_manager, self).exec()
+        SettingsDialog(self.settings_manager, self.codec_manager, self, self.codec_detector).exec()
+        show_thumbnails = self.settings_manager.get_setting("show_thumbnails", "true") == "true"
+        if show_thumbnails != self.show_thumbnails:
+            self.show_thumbnails = show_thumbnails
+            self.populate_file_list()
 
-    def start_process(self):
+    def target_formats(self):
+        return (self.settings_manager.get_setting("target_img_format", "webp"),
+                self.settings_manager.get_setting("target_vid_format", "webm"),
+                self.settings_manager.get_setting("target_snd_format", "mp3"))
+
+    def run_planner(self, start_after):
+        """Probe the staged files in the background and report the estimate (dry run)."""
+        from conversion_api import build_jobs
+        settings = self.settings_manager.load_all_settings()
+        img_fmt, vid_fmt, snd_fmt = self.target_formats()
+        output_base_dir = folder_output_dir(self.files_to_convert, self.source_folder_name)
+        jobs = build_jobs(self.files_to_convert, {'image': img_fmt, 'video': vid_fmt, 'audio': snd_fmt}, output_base_dir)
+
+        self.btn_convert.setEnabled(False)
+        self.btn_plan.setEnabled(False)
+        self.status.setText("Estimating batch size and time...")
+        self.planner = PlannerWorker(jobs, settings)
+        self.planner.planned.connect(lambda plan: self.handle_plan(plan, start_after))
+        self.planner.start()
+
+    def handle_plan(self, plan, start_after):
+        from batch_planner import format_plan, VERDICT_WARN, VERDICT_REFUSE
+        self.btn_convert.setEnabled(True)
+        self.btn_plan.setEnabled(True)
+        self.status.setText("Ready")
+        if plan is None:
+            if start_after:
+                self.launch_worker()
+            return
+
+        report = format_plan(plan)
+        app_logger.info(f"Batch plan ({plan.verdict}):\n{report}")
+        if plan.verdict == VERDICT_REFUSE:
+            QMessageBox.critical(self, "Not Enough Space", f"The converted files will not fit on the target drive.\n\n{report}")
+        elif not start_after:
+            QMessageBox.information(self, "Batch Estimate", report)
+        elif plan.verdict == VERDICT_WARN:
+            answer = QMessageBox.question(self, "Low Disk Space", f"The target drive will be nearly full.\n\n{report}\n\nStart anyway?")
+            if answer == QMessageBox.Yes:
+                self.launch_worker()
+        else:
+            self.launch_worker()
+
+    def show_estimate(self):
         if not self.files_to_convert:
             QMessageBox.warning(self, "Empty", "Drop files before converting.")
             return
+        self.run_planner(start_after=False)
+
+    def start_process(self):
+        if not self.files_to_convert:
+            if self.job_queue.pending() and self.current_batch is None:
+                self.start_next_batch()
+            else:
+                QMessageBox.warning(self, "Empty", "Drop files before converting.")
+            return
+
+        if self.settings_manager.get_setting("preflight_check", "true") == "true":
+            self.run_planner(start_after=True)
+        else:
+            self.launch_worker()
+
+    def launch_worker(self):
+        """Queue the staged files as a batch with a snapshot of the current settings."""
+        img_fmt, vid_fmt, snd_fmt = self.target_formats()
+        batch = QueuedBatch(self.files_to_convert, self.settings_manager.load_all_settings(),
+                            {'image': img_fmt, 'video': vid_fmt, 'audio': snd_fmt}, self.source_folder_name,
+                            folder_output_dir(self.files_to_convert, self.source_folder_name))
+        self.job_queue.add(batch)
+
+        self.files_to_convert = []
+        self.source_folder_name = ""
+        self.populate_file_list()
+        self.refresh_queue_list()
+
+        if self.current_batch is None:
+            self.start_next_batch()
+        else:
+            self.status.setText(f"Batch queued ({len(self.job_queue.pending())} waiting).")
+
+    def start_next_batch(self):
+        """Run the next queued batch, or report the results once the queue is drained."""
+        from converter_worker import ConverterWorker
+        batch = self.job_queue.start_next()
+        self.current_batch = batch
+        self.refresh_queue_list()
+        if batch is None:
+            self.progress.setVisible(False)
+            self.show_queue_results()
+            return
 
         self.progress.setValue(0)
         self.progress.setVisible(True)
-        self.btn_convert.setEnabled(False)
-        
-        settings = self.settings_manager.load_all_settings()
-        img_fmt = self.settings_manager.get_setting("target_img_format", "webp")
-        vid_fmt = self.settings_manager.get_setting("target_vid_format", "webm")
-        snd_fmt = self.settings_manager.get_setting("target_snd_format", "mp3")
-        
-        self.worker = ConverterWorker(self.files_to_convert, img_fmt, vid_fmt, snd_fmt, settings, self.source_folder_name)
+        formats = batch.target_formats
+        self.worker = ConverterWorker(batch.files, formats.get('image', 'webp'), formats.get('video', 'webm'),
+                                      formats.get('audio', 'mp3'), batch.settings, batch.source_folder_name,
+                                      batch.output_base_dir)
         self.worker.progress.connect(self.update_progress)
         self.worker.status.connect(self.status.setText)
         self.worker.hw_failed.connect(self.show_error)
+        self.worker.resources.connect(self.show_resources)
         self.worker.finished.connect(self.finish_ui)
         self.worker.start()
 
+    def refresh_queue_list(self):
+        selected = self.selected_batch_id()
+        self.queue_list.clear()
+        for batch in self.job_queue.batches:
+            item = QListWidgetItem(batch.label())
+            item.setData(Qt.UserRole, batch.batch_id)
+            if batch.summary:
+                item.setToolTip(batch.summary)
+            self.queue_list.addItem(item)
+            if batch.batch_id == selected:
+                self.queue_list.setCurrentItem(item)
+
+    def selected_batch_id(self):
+        item = self.queue_list.currentItem()
+        return item.data(Qt.UserRole) if item else None
+
+    def move_selected_batch(self, offset):
+        if self.job_queue.move(self.selected_batch_id(), offset):
+            self.refresh_queue_list()
+
+    def prioritize_selected_batch(self):
+        if self.job_queue.prioritize(self.selected_batch_id()):
+            self.refresh_queue_list()
+
+    def remove_selected_batch(self):
+        batch_id = self.selected_batch_id()
+        if batch_id is None:
+            return
+        if not self.job_queue.remove(batch_id):
+            QMessageBox.warning(self, "Queue", "The running batch can't be removed.")
+            return
+        self.refresh_queue_list()
+
+    def clear_finished_batches(self):
+        self.job_queue.clear_finished()
+        self.refresh_queue_list()
+
     def show_error(self, msg):
         self.error_label.setText(msg)
         self.error_label.setVisible(True)
@@ -553,10 +1131,32 @@ class MainWindow(QMainWindow):
         """Update progress bar with high-granularity value (0-1000)."""
         self.progress.setValue(val)
 
+    def show_resources(self, text):
+        self.resource_label.setText(text)
+        self.resource_label.setVisible(bool(text))
+
     def finish_ui(self, success, msg):
-        self.btn_convert.setEnabled(True)
-        self.progress.setVisible(False)
-        
+        """A batch finished: record it and keep draining the queue."""
+        self.show_resources("")
+        batch = self.current_batch
+        self.job_queue.finish(batch.batch_id, success, msg)
+        self.finished_batches.append((batch, success, msg))
+        app_logger.info(f"Batch {batch.batch_id} finished:\n{msg}")
+        self.start_next_batch()
+
+    def show_queue_results(self):
+        """Summary of every batch finished since the queue was last idle."""
+        results = self.finished_batches
+        self.finished_batches = []
+        self.status.setText("Ready")
+        if not results:
+            return
+        success = all(ok for _, ok, _ in results)
+        if len(results) == 1:
+            msg = results[0][2]
+        else:
+            msg = "\n\n".join(f"{batch.label()}\n{summary}" for batch, _, summary in results)
+
         # Custom message box with Open Logs button
         box = QMessageBox(self)
         box.setWindowTitle("Conversion Finished")
@@ -572,12 +1172,13 @@ class MainWindow(QMainWindow):
             log_dir = app_logger.get_log_dir()
             if os.path.exists(log_dir):
                 QDesktopServices.openUrl(QUrl.fromLocalFile(log_dir))
-        
-        self.files_to_convert = []
-        self.file_list.clear()
-        self.status.setText("Ready")
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and not sys.argv[1].startswith('-'):
+        # 'main.py <image|video|audio> --to FMT INPUT OUTPUT': headless pipe mode, no window
+        from pipe_mode import main as pipe_main
+        sys.exit(pipe_main(sys.argv[1:]))
+
     app_logger.info("Initializing application.")
     app = QApplication(sys.argv)
     
@@ -585,5 +1186,10 @@ if __name__ == "__main__":
 
     
     win = MainWindow()
+    for arg in sys.argv[1:]:
+        # --measure-startup[=BUDGET_MS]: print startup timings and exit (non-zero if over budget)
+        if arg.split('=')[0] == "--measure-startup":
+            budget = arg.partition('=')[2]
+            win.startup_budget_ms = int(budget) if budget.isdigit() else 0
     win.show()
     sys.exit(app.exec())
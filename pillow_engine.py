@@ -0,0 +1,134 @@
+"""
+Optional in-process image backend based on Pillow.
+For common formats at web sizes most of the FFmpeg path is process start-up, so these
+conversions run on a thread pool inside the app instead. Everything else (avif, exr,
+hdr, ico, ...) and every failure here falls back to FFmpeg.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from ffmpeg_commands import resize_decode_margin, jpeg_qscale, jpeg_qtable
+
+try:
+    from PIL import Image, JpegImagePlugin
+except ImportError: # Pillow is optional
+    Image = None
+
+# Formats handled in-process, both as input extension and as target
+PILLOW_FORMATS = {'jpg', 'jpeg', 'png', 'webp', 'bmp', 'tiff', 'tif'}
+
+# Pillow's format name and the pixel modes each encoder accepts (FFmpeg's mjpeg encoder
+# has no gray format, so grayscale JPEGs are written as color like it does)
+SAVE_FORMATS = {
+    'jpg': ('JPEG', ('RGB',)),
+    'jpeg': ('JPEG', ('RGB',)),
+    'png': ('PNG', ('RGB', 'RGBA', 'L', 'LA', 'P', 'I', 'I;16')),
+    'webp': ('WEBP', ('RGB', 'RGBA')),
+    'bmp': ('BMP', ('RGB', 'L', 'P')),
+    'tiff': ('TIFF', ('RGB', 'RGBA', 'L', 'LA', 'CMYK', 'I;16')),
+    'tif': ('TIFF', ('RGB', 'RGBA', 'L', 'LA', 'CMYK', 'I;16'))
+}
+
+_executor = None
+
+
+def is_available():
+    return Image is not None
+
+
+def get_executor():
+    """Shared worker pool; Pillow releases the GIL while decoding, resizing and encoding."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 2, thread_name_prefix="pillow")
+    return _executor
+
+
+def can_handle(input_path, target_format, settings):
+    """Whether this job should run in-process given the 'image_engine' setting."""
+    if Image is None or settings.get('image_engine', 'auto') != 'auto':
+        return False
+    ext = os.path.splitext(input_path)[1].lower().lstrip('.')
+    return ext in PILLOW_FORMATS and target_format.lower() in PILLOW_FORMATS
+
+
+def scaled_size(width, height, resize):
+    """
+    Longest side limited to 'resize' keeping the aspect ratio, never upscaling.
+    Mirrors the scale expression used by image_command(), including its rounding of
+    halves away from zero (round() would round them to even).
+    """
+    if resize <= 0 or max(width, height) <= resize:
+        return width, height
+    if width >= height:
+        return resize, max(1, (2 * height * resize + width) // (2 * width))
+    return max(1, (2 * width * resize + height) // (2 * height)), resize
+
+
+def convert_image(input_path, output_path, target_format, settings):
+    """Convert one image like image_command() would. Raises on any Pillow error."""
+    quality = settings.get('image_quality', '80')
+    resize = settings.get('image_resize', '0')
+    grayscale = settings.get('image_grayscale', 'false') == 'true'
+    preserve_md = settings.get('image_metadata', 'true') == 'true'
+    margin = resize_decode_margin(settings)
+    fmt = target_format.lower()
+    pil_format, allowed_modes = SAVE_FORMATS[fmt]
+
+    with Image.open(input_path) as img:
+        exif = img.info.get('exif')
+        icc_profile = img.info.get('icc_profile')
+        # FFmpeg keeps a JPEG source's chroma subsampling and encodes anything else at full chroma
+        subsampling = 0
+        if img.format == 'JPEG' and not grayscale:
+            subsampling = max(0, JpegImagePlugin.get_sampling(img))
+        size = img.size
+        if resize != '0' and resize.isdigit():
+            size = scaled_size(img.width, img.height, int(resize))
+        if margin and size != img.size:
+            # JPEG only: let the decoder downscale (1/2..1/8) while staying >= margin x the target
+            img.draft(img.mode, (size[0] * margin, size[1] * margin))
+        img.load()
+
+        if grayscale:
+            img = img.convert('L')
+
+        if size != img.size:
+            # FFmpeg's scale filter defaults to bicubic; fast modes finish with lanczos like image_command()
+            img = img.resize(size, Image.LANCZOS if margin else Image.BICUBIC)
+
+        if img.mode not in allowed_modes:
+            has_alpha = 'A' in img.mode or 'transparency' in img.info
+            img = img.convert('RGBA' if has_alpha and 'RGBA' in allowed_modes else 'RGB')
+
+        options = {}
+        if fmt == 'webp':
+            try:
+                q_val = int(quality)
+            except ValueError:
+                q_val = 80
+            # Same 0-100 scale and effort as libwebp's defaults in FFmpeg
+            options.update(quality=max(0, min(100, q_val)), method=4)
+        elif fmt in ('jpg', 'jpeg'):
+            # The tables (and optimal Huffman coding) FFmpeg's mjpeg uses for the same setting
+            table = jpeg_qtable(jpeg_qscale(quality))
+            options.update(qtables=[table, table], subsampling=subsampling, optimize=True)
+        elif fmt in ('tiff', 'tif'):
+            # FFmpeg's TIFF encoder defaults to PackBits
+            options['compression'] = 'packbits'
+
+        if preserve_md:
+            if exif:
+                options['exif'] = exif
+            if icc_profile:
+                options['icc_profile'] = icc_profile
+
+        try:
+            img.save(output_path, pil_format, **options)
+        except (TypeError, ValueError):
+            # Encoder rejected the metadata: retry without it
+            options.pop('exif', None)
+            options.pop('icc_profile', None)
+            img.save(output_path, pil_format, **options)
+    return True
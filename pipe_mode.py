@@ -0,0 +1,199 @@
+"""
+Unix pipe mode: convert one stream from stdin to stdout without temporary files,
+e.g. `cat in.wav | yaofc audio --to opus - - > out.opus`.
+Commands come from the same builders (and saved settings) as the GUI, with muxer
+options that work on non-seekable output. The result is reported by the exit code.
+"""
+
+import argparse
+import logging
+import os
+import subprocess
+import sys
+
+from logger import app_logger
+from config import VIDEO_FORMAT_CONFIG, IMAGE_FORMATS, AUDIO_FORMATS, VIDEO_FORMATS
+from ffmpeg_commands import (get_bin_path, image_command, audio_command, video_command, software_fallback,
+                             resolve_video_codec)
+
+EXIT_OK = 0
+EXIT_FAILED = 1 # FFmpeg failed: bad input, encoder error, closed output pipe
+EXIT_USAGE = 2 # bad arguments (argparse uses the same code)
+EXIT_NO_FFMPEG = 3
+EXIT_NO_INPUT = 4
+EXIT_INTERRUPTED = 130
+
+PIPE_MEDIA = ('image', 'video', 'audio')
+STDIO = '-'
+
+# MP4-family muxers normally seek back to write the index; fragments need no seeking
+FRAGMENTED_MP4 = ['-movflags', 'frag_keyframe+empty_moov+default_base_moof']
+
+# Muxer options per output format when writing to a pipe (default: '-f <format>')
+PIPE_MUXERS = {
+    'mp4': ['-f', 'mp4'] + FRAGMENTED_MP4,
+    'm4v': ['-f', 'mp4'] + FRAGMENTED_MP4,
+    'mov': ['-f', 'mov'] + FRAGMENTED_MP4,
+    '3gp': ['-f', '3gp'] + FRAGMENTED_MP4,
+    'm4a': ['-f', 'ipod'] + FRAGMENTED_MP4,
+    'mkv': ['-f', 'matroska'],
+    'wmv': ['-f', 'asf'],
+    'mpg': ['-f', 'mpeg'],
+    'mpeg': ['-f', 'mpeg'],
+    'ts': ['-f', 'mpegts'],
+    'm2ts': ['-f', 'mpegts'],
+}
+# Single images: formats with their own muxer, the rest through image2pipe
+IMAGE_MUXERS = {'webp', 'gif'}
+# image2pipe encodes with mjpeg unless told otherwise, so every image2pipe format names its encoder
+PIPE_IMAGE_ENCODERS = {
+    'jpg': 'mjpeg', 'jpeg': 'mjpeg', 'png': 'png', 'bmp': 'bmp', 'tiff': 'tiff', 'tif': 'tiff',
+    'tga': 'targa', 'ppm': 'ppm', 'pgm': 'pgm', 'pbm': 'pbm', 'pnm': 'ppm', 'exr': 'exr', 'hdr': 'hdr'
+}
+# Muxers that must seek back into the output (ico, avif): only a file works
+
+FORMATS = {'image': IMAGE_FORMATS, 'video': VIDEO_FORMATS, 'audio': AUDIO_FORMATS}
+
+
+def can_pipe(media, fmt):
+    """Whether 'fmt' can be written to stdout."""
+    return media != 'image' or fmt in IMAGE_MUXERS or fmt in PIPE_IMAGE_ENCODERS
+
+
+def muxer_args(media, fmt):
+    if fmt in PIPE_MUXERS:
+        return PIPE_MUXERS[fmt]
+    if media == 'image' and fmt not in IMAGE_MUXERS:
+        return ['-f', 'image2pipe']
+    return ['-f', fmt]
+
+
+def set_encoder(output_args, encoder):
+    """Make '-c:v' of the output options 'encoder', adding it when the builder left it implicit."""
+    if '-c:v' in output_args:
+        output_args[output_args.index('-c:v') + 1] = encoder
+    else:
+        output_args.extend(['-c:v', encoder])
+
+
+def video_settings(settings, fmt):
+    """
+    Settings with a video/audio codec pair valid for 'fmt'. Hardware encoders are mapped
+    to software: a failed HW encode can't be retried once stdin has been consumed.
+    """
+    config = VIDEO_FORMAT_CONFIG[fmt]
+    settings = dict(settings)
+    codec = software_fallback(resolve_video_codec(settings)[0]) # 'copy' when trimming by stream copy
+    settings['video_codec'] = codec if codec in config['video'] else config['default_video']
+    if settings.get('audio_codec') not in config['audio']:
+        settings['audio_codec'] = config['default_audio']
+    return settings
+
+
+def pipe_command(media, fmt, input_path, output_path, settings, input_format=None, ffmpeg_bin='ffmpeg'):
+    """
+    Build the GUI's command for 'media' and adapt it for stdin/stdout: no progress
+    reporting on stdout, pipe-friendly muxer, quiet logging on stderr.
+    Raises ValueError for a format that can't be written to stdout.
+    """
+    if output_path == STDIO and not can_pipe(media, fmt):
+        raise ValueError(f"'{fmt}' can't be written to a pipe, give an output file")
+    source = 'pipe:0' if input_path == STDIO else input_path
+    target = 'pipe:1' if output_path == STDIO else output_path
+    if media == 'image':
+        cmd = image_command(source, target, fmt, settings, ffmpeg_bin)
+    elif media == 'audio':
+        cmd = audio_command(source, target, fmt, settings, ffmpeg_bin)
+    else:
+        settings = video_settings(settings, fmt)
+        codec = settings['video_codec']
+        cmd = video_command(source, target, 'gif' if fmt == 'gif' else codec, settings, False, ffmpeg_bin)
+
+    # stdout carries the media, so the progress report has to go
+    for i in range(len(cmd) - 1):
+        if cmd[i] == '-progress':
+            del cmd[i:i + 2]
+            break
+
+    input_index = cmd.index('-i')
+    output_args = cmd[input_index + 2:-1]
+    if output_path == STDIO:
+        # Replace a muxer the builder chose (e.g. '-f ico') with the pipe one
+        for i in range(len(output_args) - 1):
+            if output_args[i] == '-f':
+                del output_args[i:i + 2]
+                break
+        output_args += muxer_args(media, fmt)
+        if media == 'image':
+            if fmt in PIPE_IMAGE_ENCODERS:
+                set_encoder(output_args, PIPE_IMAGE_ENCODERS[fmt])
+            output_args += ['-frames:v', '1']
+
+    head = [ffmpeg_bin, '-hide_banner', '-loglevel', 'error', '-nostats']
+    if input_path != STDIO:
+        head.append('-nostdin') # don't swallow the terminal/stdin when reading a file
+    if input_format:
+        head.extend(['-f', input_format])
+    return head + cmd[1:input_index] + ['-i', source] + output_args + [target]
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        prog='yaofc',
+        description="Convert one file or stream. Use '-' as INPUT/OUTPUT for stdin/stdout.")
+    parser.add_argument('media', choices=PIPE_MEDIA)
+    parser.add_argument('input', metavar='INPUT')
+    parser.add_argument('output', metavar='OUTPUT')
+    parser.add_argument('--to', required=True, dest='target_format', help="output format, e.g. opus, webp, mp4")
+    parser.add_argument('--from', dest='input_format',
+                        help="FFmpeg demuxer for the input, when it can't be detected from a pipe")
+    parser.add_argument('--set', action='append', default=[], metavar='KEY=VALUE',
+                        help="override a saved setting, e.g. --set audio_quality=High")
+    parser.add_argument('--verbose', action='store_true', help="show FFmpeg's and the app's log on stderr")
+    return parser.parse_args(argv)
+
+
+def main(argv):
+    args = parse_args(argv)
+    fmt = args.target_format.lower()
+    if fmt not in FORMATS[args.media]:
+        print(f"yaofc: unsupported {args.media} format '{fmt}'", file=sys.stderr)
+        return EXIT_USAGE
+    if args.output == STDIO and not can_pipe(args.media, fmt):
+        print(f"yaofc: '{fmt}' can't be written to a pipe, give an output file", file=sys.stderr)
+        return EXIT_USAGE
+    if args.input != STDIO and not os.path.isfile(args.input):
+        print(f"yaofc: can't read {args.input}", file=sys.stderr)
+        return EXIT_NO_INPUT
+    if not args.verbose:
+        app_logger.set_console_level(logging.WARNING)
+
+    from settings_manager import SettingsManager
+    settings = SettingsManager().load_all_settings()
+    for item in args.set:
+        key, sep, value = item.partition('=')
+        if not sep:
+            print(f"yaofc: --set expects KEY=VALUE, got '{item}'", file=sys.stderr)
+            return EXIT_USAGE
+        settings[key] = value
+
+    ffmpeg_bin = get_bin_path('ffmpeg')
+    cmd = pipe_command(args.media, fmt, args.input, args.output, settings, args.input_format, ffmpeg_bin)
+    if args.verbose:
+        cmd[cmd.index('-loglevel') + 1] = 'info'
+    app_logger.info(f"Pipe mode command: {' '.join(cmd)}")
+
+    # stdin/stdout are handed to FFmpeg directly: no copying through this process
+    try:
+        result = subprocess.run(cmd, stdin=None if args.input == STDIO else subprocess.DEVNULL)
+    except FileNotFoundError:
+        print(f"yaofc: FFmpeg not found ({ffmpeg_bin})", file=sys.stderr)
+        return EXIT_NO_FFMPEG
+    except KeyboardInterrupt:
+        return EXIT_INTERRUPTED
+
+    if result.returncode != 0:
+        app_logger.info(f"Pipe mode conversion failed (FFmpeg exit code {result.returncode})")
+        print(f"yaofc: conversion failed (FFmpeg exit code {result.returncode})", file=sys.stderr)
+        return EXIT_FAILED
+    return EXIT_OK
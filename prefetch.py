@@ -0,0 +1,125 @@
+"""
+Probe-ahead and read-ahead for upcoming jobs.
+While the current files encode, the next few inputs (in start order) are probed and
+their data is pulled into the OS page cache, so an encode doesn't begin by waiting on
+a cold hard drive or network share. Read-ahead is bounded by a share of the memory
+the system has available; the page cache drops it again under memory pressure.
+"""
+
+import asyncio
+import os
+
+from logger import app_logger
+from io_scheduler import DEVICE_NETWORK, device_of
+from archive_io import split_member_path
+from proc_stats import available_memory, format_bytes
+
+DEFAULT_DEPTH = 2 # jobs prefetched beyond the running ones
+MEMORY_SHARE = 0.25 # share of available memory that read-ahead may occupy
+DEFAULT_BUDGET = 256 * 1024 * 1024 # when available memory is unknown
+READ_CHUNK = 1024 * 1024
+# Linux caps one WILLNEED hint at the device's readahead window, so long ranges are hinted piecewise
+FADVISE_CHUNK = 512 * 1024
+
+
+def prefetch_depth(settings):
+    """Number of upcoming jobs to prefetch from the 'prefetch_depth' setting (0 = off)."""
+    try:
+        return max(0, int(settings.get('prefetch_depth', str(DEFAULT_DEPTH))))
+    except (TypeError, ValueError):
+        return DEFAULT_DEPTH
+
+
+def read_ahead_budget():
+    """Bytes of input that may be read ahead at once."""
+    available = available_memory()
+    return int(available * MEMORY_SHARE) if available else DEFAULT_BUDGET
+
+
+def read_ahead(path, length, read_through=False):
+    """
+    Get the first 'length' bytes of a file into the OS cache. posix_fadvise(WILLNEED)
+    starts the reads in the background; without it (Windows, macOS), or when
+    'read_through' is set for network shares whose client may ignore the hint, the
+    data is read and thrown away instead.
+    """
+    fd = os.open(path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+    try:
+        if hasattr(os, 'posix_fadvise') and not read_through:
+            for offset in range(0, length, FADVISE_CHUNK):
+                os.posix_fadvise(fd, offset, min(FADVISE_CHUNK, length - offset), os.POSIX_FADV_WILLNEED)
+            return
+        remaining = length
+        while remaining > 0:
+            chunk = os.read(fd, min(READ_CHUNK, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+    finally:
+        os.close(fd)
+
+
+class Prefetcher:
+    """
+    Warms the inputs of the next 'depth' jobs after the running ones, one job at a time.
+    'probe_job' is a coroutine function doing the probes a job will need (results are
+    shared through the BatchContext). Reads go through the batch's IOScheduler device
+    slots, so they queue behind the jobs waiting for the same device instead of
+    competing with them. The worker reports each job's start and end, which moves the
+    window and releases its read-ahead bytes. Must be used from a single event loop.
+    """
+    def __init__(self, jobs, order, depth, probe_job, io_scheduler, budget=None):
+        self.jobs = jobs
+        self.order = list(order)
+        self.depth = depth
+        self.probe_job = probe_job
+        self.io_scheduler = io_scheduler
+        self.budget = read_ahead_budget() if budget is None else budget
+        self.condition = asyncio.Condition()
+        self.started = set() # indices of jobs that have started
+        self.reserved = {} # index -> bytes read ahead for a job that hasn't finished
+        self.in_use = 0
+
+    async def job_started(self, index):
+        async with self.condition:
+            self.started.add(index)
+            self.condition.notify_all()
+
+    async def job_finished(self, index):
+        async with self.condition:
+            self.in_use -= self.reserved.pop(index, 0)
+            self.condition.notify_all()
+
+    async def run(self):
+        for position, index in enumerate(self.order):
+            async with self.condition:
+                await self.condition.wait_for(lambda: position < len(self.started) + self.depth)
+                if index in self.started:
+                    continue # it didn't wait for us
+                await self.condition.wait_for(lambda: self.in_use < self.budget)
+                if index in self.started:
+                    continue # started while read-ahead memory was freed up
+            job = self.jobs[index]
+            if job.media is None or split_member_path(job.input_path):
+                continue # archive members are read through their archive when the job runs
+            await self.prefetch(index, job)
+
+    async def prefetch(self, index, job):
+        path = job.input_path
+        results = await asyncio.gather(self.probe_job(job), self.read_ahead(index, path), return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                app_logger.warning(f"Prefetch failed for {path}: {result}")
+
+    async def read_ahead(self, index, path):
+        async with self.io_scheduler.device_slot(path):
+            if index in self.started:
+                return # the job got its device first: nothing left to warm up
+            length = min(await asyncio.to_thread(os.path.getsize, path), self.budget - self.in_use)
+            self.reserved[index] = length
+            self.in_use += length
+            device = device_of(path)
+            read_through = device is not None and self.io_scheduler.kind(device) == DEVICE_NETWORK
+            app_logger.info(f"Prefetching {os.path.basename(path)} ({format_bytes(length)})")
+            await asyncio.to_thread(read_ahead, path, length, read_through)
+
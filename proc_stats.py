@@ -0,0 +1,162 @@
+"""
+Resource sampling for running FFmpeg children.
+Reads /proc/<pid>/stat (CPU time), /proc/<pid>/status (RSS, threads) and
+/proc/<pid>/io (bytes read/written) at a low fixed rate, so a slow batch shows which
+encode is using the CPU or memory. Linux only; elsewhere no samples are produced.
+Peak RSS is remembered per codec and output resolution to help size machines.
+"""
+
+import os
+import time
+
+from app_paths import JsonStore
+
+SAMPLE_INTERVAL = 1.0 # seconds between samples of one child
+
+try:
+    CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+except (AttributeError, ValueError, OSError):
+    CLOCK_TICKS = 100
+
+
+def format_bytes(size_bytes):
+    for unit in ("B", "KB", "MB", "GB"):
+        if size_bytes < 1024 or unit == "GB":
+            return f"{size_bytes:.0f} {unit}" if unit in ("B", "KB") else f"{size_bytes:.1f} {unit}"
+        size_bytes /= 1024
+
+
+def read_sample(pid):
+    """
+    One reading for a process: {'cpu_seconds', 'rss_bytes', 'threads', 'read_bytes',
+    'write_bytes', 'time'}, or None when it has exited or /proc isn't available.
+    """
+    try:
+        with open(f"/proc/{pid}/stat", 'r') as f:
+            stat = f.read()
+        with open(f"/proc/{pid}/status", 'r') as f:
+            status = f.read()
+    except OSError:
+        return None
+    # The command name may contain spaces and parentheses: fields start after the last ')'
+    fields = stat[stat.rfind(')') + 2:].split()
+    sample = {'cpu_seconds': (int(fields[11]) + int(fields[12])) / CLOCK_TICKS, 'rss_bytes': 0, 'threads': 0,
+              'read_bytes': 0, 'write_bytes': 0, 'time': time.monotonic()}
+    for line in status.splitlines():
+        if line.startswith('VmRSS:'):
+            sample['rss_bytes'] = int(line.split()[1]) * 1024
+        elif line.startswith('Threads:'):
+            sample['threads'] = int(line.split()[1])
+    try:
+        # rchar/wchar count everything the process read/wrote, page cache hits included
+        with open(f"/proc/{pid}/io", 'r') as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                if key == 'rchar':
+                    sample['read_bytes'] = int(value)
+                elif key == 'wchar':
+                    sample['write_bytes'] = int(value)
+    except OSError:
+        pass
+    return sample
+
+
+def available_memory():
+    """Memory the system can give without swapping (MemAvailable), in bytes, or None if unknown."""
+    try:
+        with open('/proc/meminfo', 'r') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def format_sample(sample):
+    """One-line description of a sample for the UI and the log."""
+    return (f"CPU {sample['cpu_percent']:.0f}%, RSS {format_bytes(sample['rss_bytes'])}, "
+            f"{sample['threads']} threads, read {format_bytes(sample['read_bytes'])}, "
+            f"written {format_bytes(sample['write_bytes'])}")
+
+
+def format_usage(usage):
+    """One-line description of a finished job's ResourceUsage.summary()."""
+    return (f"peak RSS {format_bytes(usage['peak_rss'])}, CPU {usage['cpu_seconds']:.1f}s "
+            f"(avg {usage['avg_cpu_percent']:.0f}%), up to {usage['max_threads']} threads, "
+            f"read {format_bytes(usage['read_bytes'])}, written {format_bytes(usage['write_bytes'])}")
+
+
+class ChildMonitor:
+    """Samples one child process; CPU% is measured between consecutive samples."""
+    def __init__(self, pid):
+        self.pid = pid
+        self.first = None
+        self.last = None
+        self.peak_rss = 0
+        self.max_threads = 0
+
+    def sample(self):
+        """Take a sample and return it with 'cpu_percent' added, or None if unavailable."""
+        current = read_sample(self.pid)
+        if current is None:
+            return None
+        previous = self.last or current
+        elapsed = current['time'] - previous['time']
+        cpu = current['cpu_seconds'] - previous['cpu_seconds']
+        current['cpu_percent'] = cpu / elapsed * 100 if elapsed > 0 else 0.0
+        if self.first is None:
+            self.first = current
+        self.last = current
+        self.peak_rss = max(self.peak_rss, current['rss_bytes'])
+        self.max_threads = max(self.max_threads, current['threads'])
+        return current
+
+
+class ResourceUsage:
+    """Totals over all the FFmpeg runs of one job (e.g. a HW attempt and its SW fallback)."""
+    def __init__(self):
+        self.peak_rss = 0
+        self.cpu_seconds = 0.0
+        self.wall_seconds = 0.0
+        self.max_threads = 0
+        self.read_bytes = 0
+        self.write_bytes = 0
+
+    def add(self, monitor):
+        if monitor.last is None:
+            return
+        self.peak_rss = max(self.peak_rss, monitor.peak_rss)
+        self.max_threads = max(self.max_threads, monitor.max_threads)
+        # CPU time is cumulative since the process started, so the last sample is the total
+        self.cpu_seconds += monitor.last['cpu_seconds']
+        self.wall_seconds += monitor.last['time'] - monitor.first['time']
+        self.read_bytes += monitor.last['read_bytes']
+        self.write_bytes += monitor.last['write_bytes']
+
+    def summary(self):
+        """Dictionary for ConversionEvent stats, or None when nothing was sampled."""
+        if not self.peak_rss:
+            return None
+        avg = self.cpu_seconds / self.wall_seconds * 100 if self.wall_seconds > 0 else 0.0
+        return {'peak_rss': self.peak_rss, 'cpu_seconds': self.cpu_seconds, 'avg_cpu_percent': avg,
+                'max_threads': self.max_threads, 'read_bytes': self.read_bytes, 'write_bytes': self.write_bytes}
+
+
+class PeakMemoryHistory(JsonStore):
+    """Highest and most recent peak RSS per 'codec key @ resolution', persisted as JSON."""
+    description = "peak memory history"
+
+    def record(self, codec_key, resolution, peak_rss):
+        if peak_rss <= 0:
+            return
+        key = f"{codec_key}@{resolution}"
+        with self.lock:
+            entry = self.entries.setdefault(key, {'max_rss': 0, 'last_rss': 0, 'runs': 0})
+            entry['max_rss'] = max(entry['max_rss'], peak_rss)
+            entry['last_rss'] = peak_rss
+            entry['runs'] += 1
+            self.dirty = True
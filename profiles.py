@@ -0,0 +1,272 @@
+"""
+Rule-based conversion profiles for mixed batches.
+A profile is a named target format plus settings overrides for one media kind; an
+ordered rule table maps files to profiles by glob, extension, size or probed
+properties, so one batch can send large stills to avif, screenshots to png and
+podcasts to opus. The first matching rule wins; files no rule matches use the
+batch's own formats and settings. Both live in 'profiles.json' in the data folder
+(see EXAMPLE_PROFILES, which seeds the file).
+
+Globs without '/' match the file name, others the whole path ('*' crosses folders);
+both ignore case. Rules are compiled once into per-(media, extension) candidate
+lists with one regex per rule, and files are only probed when a rule that needs
+probed properties could decide their profile.
+"""
+
+import asyncio
+import fnmatch
+import os
+import re
+
+from logger import app_logger
+from app_paths import load_json, save_json, get_data_file
+from archive_io import input_size
+from ffmpeg_run import probe_media
+from config import IMAGE_FORMATS, VIDEO_FORMATS, AUDIO_FORMATS, VIDEO_FORMAT_CONFIG
+from ffmpeg_commands import software_fallback
+
+PROFILES_FILE = 'profiles.json'
+# ffprobes at once while dispatching a batch to conversion profiles
+PROBE_CONCURRENCY = 8
+
+EXAMPLE_PROFILES = {
+    'profiles': {
+        'screenshots': {'media': 'image', 'format': 'png'},
+        'stills': {'media': 'image', 'format': 'avif', 'settings': {'image_quality': '70'}},
+        'podcast': {'media': 'audio', 'format': 'opus', 'settings': {'audio_quality': 'Low'}}
+    },
+    'rules': [
+        {'glob': '*/Screenshots/*', 'profile': 'screenshots'},
+        {'ext': ['tif', 'tiff'], 'min_size': '20MB', 'profile': 'stills'},
+        {'min_duration': 600, 'audio_codec': ['mp3', 'aac'], 'profile': 'podcast'}
+    ]
+}
+
+FORMATS = {'image': IMAGE_FORMATS, 'video': VIDEO_FORMATS, 'audio': AUDIO_FORMATS}
+
+# Probed properties (see ffmpeg_commands.parse_probe_output) usable as min_/max_ bounds
+PROBE_BOUNDS = ('width', 'height', 'duration', 'fps', 'channels', 'sample_rate', 'bit_rate')
+PROBE_CODECS = ('video_codec', 'audio_codec')
+RULE_KEYS = ({'profile', 'glob', 'ext', 'min_size', 'max_size'} | set(PROBE_CODECS)
+             | {f"{bound}_{prop}" for prop in PROBE_BOUNDS for bound in ('min', 'max')})
+
+
+def is_enabled(settings):
+    return settings.get('conversion_profiles', 'false') == 'true'
+
+
+def as_list(value):
+    return [value] if isinstance(value, str) else list(value)
+
+
+def parse_size(value):
+    """Byte count from a number or a size like '20MB' / '1.5 GB'."""
+    if isinstance(value, (int, float)):
+        return int(value)
+    text = str(value).strip().upper().replace(' ', '')
+    for unit, factor in (('GB', 1024 ** 3), ('MB', 1024 ** 2), ('KB', 1024), ('B', 1)):
+        if text.endswith(unit):
+            return int(float(text[:-len(unit)]) * factor)
+    return int(float(text))
+
+
+def glob_regex(patterns):
+    """One case-insensitive regex for a list of globs, or None without any."""
+    if not patterns:
+        return None
+    return re.compile('|'.join(f"(?:{fnmatch.translate(p)})" for p in patterns), re.IGNORECASE)
+
+
+def effective_settings(settings, profile):
+    """
+    Batch settings with a profile's overrides applied. A video or audio codec the
+    profile's container can't hold is replaced by the format's default.
+    """
+    merged = dict(settings, **profile.settings)
+    if profile.media == 'video' and profile.target_format in VIDEO_FORMAT_CONFIG:
+        config = VIDEO_FORMAT_CONFIG[profile.target_format]
+        if software_fallback(merged.get('video_codec', '')) not in config['video']:
+            merged['video_codec'] = config['default_video']
+        if merged.get('audio_codec') not in config['audio']:
+            merged['audio_codec'] = config['default_audio']
+    return merged
+
+
+class Profile:
+    """A named target format and settings overrides for one media kind."""
+    def __init__(self, name, media, target_format, settings):
+        self.name = name
+        self.media = media
+        self.target_format = target_format
+        self.settings = settings # str -> str, like the app's settings
+
+
+class Rule:
+    """One compiled rule; 'index' is its position in the table, for error messages."""
+    def __init__(self, index, spec, profile):
+        unknown = set(spec) - RULE_KEYS
+        if unknown:
+            raise ValueError(f"rule {index + 1}: unknown keys {', '.join(sorted(unknown))}")
+        self.profile = profile
+        self.exts = {f".{e.lower().lstrip('.')}" for e in as_list(spec.get('ext', []))}
+        globs = as_list(spec.get('glob', []))
+        self.path_regex = glob_regex([g for g in globs if '/' in g])
+        self.name_regex = glob_regex([g for g in globs if '/' not in g])
+        self.has_glob = bool(globs)
+        self.min_size = self.bound(index, spec, 'min_size', parse_size)
+        self.max_size = self.bound(index, spec, 'max_size', parse_size)
+        # (property, low, high) and (property, allowed names) checked against the probe
+        self.bounds = [(prop, self.bound(index, spec, f"min_{prop}"), self.bound(index, spec, f"max_{prop}"))
+                       for prop in PROBE_BOUNDS if f"min_{prop}" in spec or f"max_{prop}" in spec]
+        self.codecs = [(prop, {c.lower() for c in as_list(spec[prop])}) for prop in PROBE_CODECS if prop in spec]
+        self.needs_probe = bool(self.bounds or self.codecs)
+
+    @staticmethod
+    def bound(index, spec, key, parse=float):
+        """Parsed min_/max_ value of 'spec', or None when unset; a malformed one fails the whole rule table."""
+        if key not in spec:
+            return None
+        try:
+            return parse(spec[key])
+        except (ValueError, TypeError):
+            raise ValueError(f"rule {index + 1}: {key} must be a number, not {spec[key]!r}") from None
+
+    def matches_file(self, path, name, size):
+        """Checks that need no probe: glob and size (the extension is handled by the index)."""
+        if self.has_glob and not ((self.name_regex and self.name_regex.match(name))
+                                  or (self.path_regex and self.path_regex.match(path))):
+            return False
+        if self.min_size is not None and size < self.min_size:
+            return False
+        return self.max_size is None or size <= self.max_size
+
+    def matches_probe(self, info):
+        for prop, low, high in self.bounds:
+            value = info.get(prop) or 0
+            if (low is not None and value < low) or (high is not None and value > high):
+                return False
+        return all((info.get(prop) or '').lower() in names for prop, names in self.codecs)
+
+
+class RuleSet:
+    """
+    Compiled rule table. Rules are indexed by (media, extension): a lookup gives, in
+    table order, only the rules that can apply to that kind of file.
+    """
+    def __init__(self, profiles, rules):
+        self.profiles = profiles
+        self.rules = rules
+        self.generic = {}
+        self.by_ext = {}
+        for media in FORMATS:
+            media_rules = [r for r in rules if r.profile.media == media]
+            self.generic[media] = tuple(r for r in media_rules if not r.exts)
+            for ext in {e for r in media_rules for e in r.exts}:
+                self.by_ext[(media, ext)] = tuple(r for r in media_rules if not r.exts or ext in r.exts)
+
+    def candidates(self, path, media, size):
+        """Rules whose file checks pass, in table order."""
+        path = path.replace('\\', '/')
+        name = path.rsplit('/', 1)[-1]
+        ext = os.path.splitext(name)[1].lower()
+        for rule in self.by_ext.get((media, ext), self.generic.get(media, ())):
+            if rule.matches_file(path, name, size):
+                yield rule
+
+    def needs_probe(self, path, media, size):
+        """Whether a rule that needs probed properties comes before any plain match."""
+        for rule in self.candidates(path, media, size):
+            return rule.needs_probe
+        return False
+
+    def match(self, path, media, size, info=None):
+        """Profile of the first matching rule, or None. Probe rules never match without 'info'."""
+        for rule in self.candidates(path, media, size):
+            if not rule.needs_probe or (info is not None and rule.matches_probe(info)):
+                return rule.profile
+        return None
+
+
+def compile_rules(data):
+    """Build a RuleSet from the parsed profiles file; raises ValueError when it is invalid."""
+    profiles = {}
+    for name, spec in data.get('profiles', {}).items():
+        media = spec.get('media')
+        if media not in FORMATS:
+            raise ValueError(f"profile '{name}': media must be image, video or audio")
+        fmt = str(spec.get('format', '')).lower()
+        if fmt not in FORMATS[media]:
+            raise ValueError(f"profile '{name}': unsupported {media} format '{fmt}'")
+        profiles[name] = Profile(name, media, fmt, {k: str(v) for k, v in spec.get('settings', {}).items()})
+
+    rules = []
+    for index, spec in enumerate(data.get('rules', [])):
+        name = spec.get('profile')
+        if name not in profiles:
+            raise ValueError(f"rule {index + 1}: unknown profile '{name}'")
+        rules.append(Rule(index, spec, profiles[name]))
+    return RuleSet(profiles, rules)
+
+
+def ensure_profiles_file(profiles_path):
+    """Write EXAMPLE_PROFILES to 'profiles_path' if it doesn't exist yet, for editing."""
+    if not os.path.exists(profiles_path):
+        save_json(profiles_path, EXAMPLE_PROFILES)
+
+
+def load_rule_set(settings, profiles_path):
+    """The RuleSet to dispatch a batch with, or None when profiles are off, missing or invalid."""
+    if not is_enabled(settings) or not os.path.exists(profiles_path):
+        return None
+    data = load_json(profiles_path, None)
+    if not isinstance(data, dict):
+        app_logger.error(f"Conversion profiles not used: {profiles_path} is not valid JSON")
+        return None
+    try:
+        return compile_rules(data)
+    except (ValueError, TypeError, AttributeError) as e:
+        app_logger.error(f"Conversion profiles not used: {e}")
+        return None
+
+
+def job_settings(job, settings):
+    """Settings a job converts with: its profile's, else the batch's."""
+    return job.settings if job.settings is not None else settings
+
+
+async def apply_profiles(jobs, settings, probe=None):
+    """
+    Dispatch jobs to conversion profiles by the rules in profiles.json: a matched
+    job gets the profile's target format, output extension and settings.
+    Files are probed (through 'probe', default probe_media) only when a rule needing
+    probed properties could decide their profile.
+    """
+    rule_set = load_rule_set(settings, get_data_file(PROFILES_FILE))
+    if rule_set is None:
+        return
+    probe = probe or probe_media
+    semaphore = asyncio.Semaphore(PROBE_CONCURRENCY)
+
+    async def dispatch(job):
+        try:
+            size = await asyncio.to_thread(input_size, job.input_path)
+        except OSError:
+            size = 0
+        info = None
+        if rule_set.needs_probe(job.input_path, job.media, size):
+            async with semaphore:
+                info = await probe(job.input_path)
+        profile = rule_set.match(job.input_path, job.media, size, info)
+        if profile is None:
+            return
+        job.profile = profile.name
+        job.target_format = profile.target_format
+        job.output_path = f"{os.path.splitext(job.output_path)[0]}.{profile.target_format}"
+        job.settings = effective_settings(settings, profile)
+
+    await asyncio.gather(*(dispatch(job) for job in jobs if job.media and job.output_path))
+    counts = {}
+    for job in jobs:
+        if job.media and job.output_path:
+            counts[job.profile] = counts.get(job.profile, 0) + 1
+    app_logger.info("Profiles: " + ", ".join(f"{name or 'batch settings'} {count}" for name, count in counts.items()))
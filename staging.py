@@ -0,0 +1,149 @@
+"""
+Staged outputs.
+Outputs are written under their final names inside a hidden staging folder next to
+them ('.yaofc-staging-<pid>', so on the same filesystem) and moved into place with
+an atomic rename once the job succeeds. Readers of the output folder never see a
+half-written file, and a failed or interrupted job leaves nothing under a final name.
+
+'output_sync_every' adds durability: every N committed outputs are fsynced together
+with their folders, so they survive a power loss; 1 syncs each file, 0 leaves it to
+the OS. Batching keeps the cost of a flush per N files instead of per file on slow
+storage; the last, incomplete batch is synced when the batch ends.
+"""
+
+import os
+import shutil
+import threading
+
+from logger import app_logger
+
+STAGING_PREFIX = '.yaofc-staging-'
+
+
+def sync_every(settings):
+    """Outputs per fsync batch from 'output_sync_every' (0 = off)."""
+    try:
+        return max(0, int(settings.get('output_sync_every', '0')))
+    except (TypeError, ValueError):
+        return 0
+
+
+def is_staged(path):
+    return os.path.basename(os.path.dirname(path)).startswith(STAGING_PREFIX)
+
+
+def final_path(path):
+    """Final location of a staged output (the path itself when it isn't staged)."""
+    if not is_staged(path):
+        return path
+    return os.path.join(os.path.dirname(os.path.dirname(path)), os.path.basename(path))
+
+
+def fsync_path(path, directory=False):
+    """Flush a file, or a folder's entries (POSIX only), to the disk."""
+    if directory and os.name == 'nt':
+        return # folders can't be opened for flushing on Windows; NTFS journals renames
+    fd = os.open(path, os.O_RDONLY if directory else os.O_RDWR)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def sweep_stale(directory):
+    """Remove staging folders left in 'directory' by processes that no longer run (POSIX)."""
+    if os.name == 'nt':
+        return # os.kill(pid, 0) isn't a liveness check there
+    try:
+        names = [n for n in os.listdir(directory) if n.startswith(STAGING_PREFIX)]
+    except OSError:
+        return
+    for name in names:
+        pid = name[len(STAGING_PREFIX):]
+        if not pid.isdigit() or int(pid) == os.getpid():
+            continue
+        try:
+            os.kill(int(pid), 0)
+            continue # still converting
+        except ProcessLookupError:
+            pass
+        except OSError:
+            continue # exists, owned by someone else
+        app_logger.info(f"Removing stale staging folder {os.path.join(directory, name)}")
+        shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+
+class OutputStager:
+    """
+    Stages, commits and syncs the outputs of one batch. stage() points a job at its
+    staging folder, commit() renames its outputs into place (restoring the job's
+    paths), discard() removes them. Thread safe; finish() must be called at the end.
+    """
+    def __init__(self, settings):
+        self.sync_every = sync_every(settings)
+        self.lock = threading.Lock()
+        self.dirs = set() # staging folders created by this batch
+        self.unsynced = [] # committed outputs not yet fsynced
+
+    def stage(self, job):
+        final = job.output_path
+        staging_dir = os.path.join(os.path.dirname(final), f"{STAGING_PREFIX}{os.getpid()}")
+        with self.lock:
+            if staging_dir not in self.dirs:
+                os.makedirs(staging_dir, exist_ok=True)
+                sweep_stale(os.path.dirname(final))
+                self.dirs.add(staging_dir)
+        job.output_path = os.path.join(staging_dir, os.path.basename(final))
+
+    def commit(self, job):
+        """Move a finished job's outputs to their final names."""
+        committed = []
+        for path in job.output_paths():
+            target = final_path(path)
+            os.replace(path, target)
+            committed.append(target)
+        job.output_path = final_path(job.output_path)
+        job.outputs = [final_path(p) for p in job.outputs]
+        if self.sync_every:
+            with self.lock:
+                self.unsynced.extend(committed)
+                batch = self.unsynced if len(self.unsynced) >= self.sync_every else []
+                if batch:
+                    self.unsynced = []
+            if batch:
+                self.sync(batch)
+
+    def discard(self, job):
+        """Remove whatever a failed or cancelled job left in staging."""
+        for path in job.output_paths():
+            if is_staged(path) and os.path.exists(path):
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    app_logger.warning(f"Failed to remove staged output {path}: {e}")
+        job.output_path = final_path(job.output_path)
+        job.outputs = []
+
+    def sync(self, paths):
+        """fsync outputs, then each of their folders once, so the renames are durable too."""
+        for path in paths:
+            try:
+                fsync_path(path)
+            except OSError as e:
+                app_logger.warning(f"Failed to sync {path}: {e}")
+        for directory in {os.path.dirname(p) for p in paths}:
+            try:
+                fsync_path(directory, directory=True)
+            except OSError as e:
+                app_logger.warning(f"Failed to sync folder {directory}: {e}")
+        app_logger.info(f"Synced {len(paths)} outputs to disk")
+
+    def finish(self):
+        """Sync the last batch and remove the staging folders."""
+        with self.lock:
+            batch, self.unsynced = self.unsynced, []
+            dirs, self.dirs = self.dirs, set()
+        if batch:
+            self.sync(batch)
+        for staging_dir in dirs:
+            shutil.rmtree(staging_dir, ignore_errors=True)
@@ -0,0 +1,30 @@
+"""Job ordering estimates must probe through the batch's shared probe, once per file."""
+
+import asyncio
+
+import batch_planner
+from conversion_api import ConversionJob
+from ffmpeg_commands import parse_probe_output
+from throughput import ThroughputHistory
+
+
+def test_estimate_jobs_uses_the_given_probe(tmp_path):
+    jobs = [ConversionJob(str(tmp_path / 'clip.mkv'), str(tmp_path / 'clip.mp4'), 'video', 'mp4'),
+            ConversionJob(str(tmp_path / 'song.wav'), str(tmp_path / 'song.mp3'), 'audio', 'mp3'),
+            ConversionJob(str(tmp_path / 'notes.txt'), None, None, None)]
+    for job in jobs:
+        with open(job.input_path, 'wb') as f:
+            f.write(b'\0' * 1000)
+    probed = []
+
+    async def probe(path):
+        probed.append(path)
+        return dict(parse_probe_output(""), duration=60.0, height=720, width=1280)
+
+    history = ThroughputHistory(str(tmp_path / 'history.json'))
+    estimates = asyncio.run(batch_planner.estimate_jobs(jobs, {}, history, probe_all=False, probe=probe))
+
+    # Only the video needs probing to be ordered; unsupported jobs get no estimate
+    assert probed == [jobs[0].input_path]
+    assert estimates[0].info['duration'] == 60.0
+    assert estimates[1] is not None and estimates[2] is None
@@ -0,0 +1,20 @@
+"""A crashing batch must still end with 'finished', or the UI and job queue wait forever."""
+
+import pytest
+
+pytest.importorskip("PySide6")
+
+from converter_worker import ConverterWorker
+
+
+def test_crash_still_emits_finished(monkeypatch):
+    worker = ConverterWorker(['in.png'], 'png', 'mp4', 'mp3', {})
+    results = []
+    worker.finished.connect(lambda ok, summary: results.append((ok, summary)))
+
+    def crash():
+        raise RuntimeError("boom")
+    monkeypatch.setattr(worker, 'convert_batch', crash)
+    worker.run() # in this thread, so the signal is delivered directly
+
+    assert results == [(False, "Conversion failed: boom")]
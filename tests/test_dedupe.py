@@ -0,0 +1,66 @@
+"""The persistent dedupe index reads whole files only to confirm a sampled match."""
+
+import pytest
+
+import dedupe
+
+SAMPLE = 16
+
+
+@pytest.fixture
+def hashed(monkeypatch):
+    """Shrink the samples so small test files count as large, and log full hashes."""
+    monkeypatch.setattr(dedupe, 'SAMPLE_SIZE', SAMPLE)
+    paths = []
+    real_full_hash = dedupe.full_hash
+
+    def full_hash(path):
+        paths.append(path)
+        return real_full_hash(path)
+    monkeypatch.setattr(dedupe, 'full_hash', full_hash)
+    return paths
+
+
+def write(path, data):
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_sampled_match_is_confirmed_by_full_hashes(tmp_path, hashed):
+    data = bytes(range(256)) * 4
+    source, output = write(tmp_path / 'a.wav', data), write(tmp_path / 'a.mp3', b'encoded')
+    index = dedupe.DedupeIndex(str(tmp_path / 'index.json'))
+
+    key = dedupe.index_key(source, 'audio', 'mp3', {})
+    assert not key[2] # sampled, not exact
+    assert index.lookup(key, source) is None # nothing recorded: no full hash read
+    index.record(key, source, output)
+    assert hashed == []
+
+    copy = write(tmp_path / 'b.wav', data)
+    assert index.lookup(dedupe.index_key(copy, 'audio', 'mp3', {}), copy) == output
+    assert sorted(hashed) == [source, copy]
+
+    # Same size and samples, different bytes between them
+    changed = bytearray(data)
+    changed[SAMPLE + 1] ^= 0xff
+    other = write(tmp_path / 'c.wav', bytes(changed))
+    other_key = dedupe.index_key(other, 'audio', 'mp3', {})
+    assert other_key == key
+    hashed.clear()
+    assert index.lookup(other_key, other) is None
+    assert hashed == [other] # the source's full hash was kept from the first match
+
+
+def test_small_files_match_by_their_exact_sample(tmp_path, hashed):
+    source, output = write(tmp_path / 'a.png', b'tiny'), write(tmp_path / 'a.webp', b'encoded')
+    index = dedupe.DedupeIndex(str(tmp_path / 'index.json'))
+    key = dedupe.index_key(source, 'image', 'webp', {})
+    assert key[2] # exact: covered by the samples
+    index.record(key, source, output)
+    hashed.clear()
+
+    copy = write(tmp_path / 'b.png', b'tiny')
+    assert index.lookup(dedupe.index_key(copy, 'image', 'webp', {}), copy) == output
+    assert index.lookup(dedupe.index_key(copy, 'image', 'webp', {'image_quality': '50'}), copy) is None
+    assert hashed == [copy, copy] # the samples themselves, no confirmation
@@ -0,0 +1,150 @@
+"""
+Argument lists of the FFmpeg command builders: each setting must reach the encoder
+as the option FFmpeg expects, and no-op options must be left out.
+"""
+
+from ffmpeg_commands import image_command, audio_command, video_command
+
+
+def option(cmd, name):
+    """Value following the last occurrence of 'name', or None."""
+    for i in range(len(cmd) - 2, -1, -1):
+        if cmd[i] == name:
+            return cmd[i + 1]
+    return None
+
+
+# Images
+
+def test_image_jpeg_quality_maps_to_mjpeg_scale():
+    assert option(image_command('in.png', 'out.jpg', 'jpg', {'image_quality': '100'}), '-q:v') == '2'
+    assert option(image_command('in.png', 'out.jpg', 'jpg', {'image_quality': '80'}), '-q:v') == '7'
+    cmd = image_command('in.png', 'out.jpg', 'jpg', {'image_quality': 'best'})
+    assert option(cmd, '-c:v') == 'mjpeg' and option(cmd, '-q:v') == '5'
+
+
+def test_image_defaults():
+    cmd = image_command('in.png', 'out.webp', 'webp', {})
+    assert cmd[:4] == ['ffmpeg', '-y', '-i', 'in.png']
+    assert '-vf' not in cmd and '-map_metadata' not in cmd
+    assert option(cmd, '-c:v') == 'libwebp' and option(cmd, '-q:v') == '80'
+    assert cmd[-1] == 'out.webp'
+
+
+def test_image_resize_and_grayscale_filters():
+    cmd = image_command('in.png', 'out.png', 'png', {'image_resize': '100', 'image_grayscale': 'true',
+                                                      'image_metadata': 'false', 'image_resize_mode': 'Quality'})
+    vf = option(cmd, '-vf')
+    assert vf.startswith('format=gray,scale=')
+    assert 'min(100,iw)' in vf and 'min(100,ih)' in vf and 'lanczos' not in vf # only after a reduced decode
+    assert option(cmd, '-map_metadata') == '-1'
+
+
+def test_image_lowres_decode_for_large_jpeg():
+    settings = {'image_resize': '100', 'image_resize_mode': 'Fast'}
+    cmd = image_command('in.jpg', 'out.png', 'png', settings, source_size=(1600, 1200))
+    assert option(cmd, '-lowres') == '3'
+    assert cmd.index('-lowres') < cmd.index('-i')
+    assert option(cmd, '-vf').endswith(':flags=lanczos')
+    assert '-lowres' not in image_command('in.jpg', 'out.png', 'png', settings)
+
+
+def test_image_ico_is_capped_at_256():
+    cmd = image_command('in.png', 'out.ico', 'ico', {})
+    assert option(cmd, '-vf') == "scale='min(256,iw)':'min(256,ih)'"
+    assert option(cmd, '-f') == 'ico'
+
+
+# Audio
+
+def test_audio_mp3_bitrate_modes():
+    assert option(audio_command('in.wav', 'out.mp3', 'mp3', {}), '-q:a') == '6'
+    assert option(audio_command('in.wav', 'out.mp3', 'mp3', {'audio_quality': 'Insanely High'}), '-q:a') == '0'
+    cbr = audio_command('in.wav', 'out.mp3', 'mp3', {'audio_bitrate_mode': 'CBR', 'audio_quality': 'High'})
+    assert option(cbr, '-b:a') == '192k' and '-abr' not in cbr and '-q:a' not in cbr
+    abr = audio_command('in.wav', 'out.mp3', 'mp3', {'audio_bitrate_mode': 'ABR'})
+    assert option(abr, '-abr') == '1' and option(abr, '-b:a') == '128k'
+
+
+def test_audio_format_encoders():
+    assert option(audio_command('in.wav', 'out.ogg', 'ogg', {}), '-q:a') == '4'
+    assert option(audio_command('in.wav', 'out.flac', 'flac', {'audio_compression': 'Better'}),
+                  '-compression_level') == '12'
+    assert option(audio_command('in.wav', 'out.wav', 'wav', {'audio_sample_width': '8 bits'}), '-c:a') == 'pcm_u8'
+    assert option(audio_command('in.wav', 'out.wav', 'wav', {}), '-c:a') == 'pcm_s16le'
+    m4a = audio_command('in.wav', 'out.m4a', 'm4a', {})
+    assert option(m4a, '-c:a') == 'aac' and option(m4a, '-q:a') == '2'
+    assert option(audio_command('in.wav', 'out.opus', 'opus', {}), '-b:a') == '96k'
+
+
+def test_audio_skips_no_op_resample_and_downmix():
+    settings = {'audio_resample': '22', 'audio_force_mono': 'true'}
+    cmd = audio_command('in.wav', 'out.wav', 'wav', settings, source={'sample_rate': 44100, 'channels': 2})
+    assert option(cmd, '-ar') == '22000' and option(cmd, '-ac') == '1'
+    cmd = audio_command('in.wav', 'out.wav', 'wav', settings, source={'sample_rate': 16000, 'channels': 1})
+    assert '-ar' not in cmd and '-ac' not in cmd
+    upsample = dict(settings, audio_allow_upsample='true')
+    assert option(audio_command('in.wav', 'out.wav', 'wav', upsample, source={'sample_rate': 16000}), '-ar') == '22000'
+
+
+def test_audio_filter_and_trim():
+    cmd = audio_command('in.wav', 'out.mp3', 'mp3', {'trim_start': '5', 'trim_end': '10'}, af='loudnorm')
+    assert cmd[:7] == ['ffmpeg', '-y', '-ss', '5.000', '-to', '10.000', '-i']
+    assert option(cmd, '-af') == 'loudnorm'
+
+
+def test_audio_trim_copy_skips_encoding():
+    cmd = audio_command('in.mp3', 'out.mp3', 'mp3', {'trim_start': '5', 'trim_mode': 'Copy',
+                                                      'audio_force_mono': 'true'})
+    assert cmd[-3:] == ['-c:a', 'copy', 'out.mp3']
+    assert '-ac' not in cmd and '-q:a' not in cmd
+
+
+# Video
+
+def test_video_bitrate_encode():
+    cmd = video_command('in.mkv', 'out.mp4', 'libx264', {})
+    assert cmd[:6] == ['ffmpeg', '-i', 'in.mkv', '-progress', 'pipe:1', '-nostats']
+    assert option(cmd, '-map_metadata') == '0' and option(cmd, '-c:a') == 'aac'
+    assert option(cmd, '-r') == '30' and option(cmd, '-b:v') == '2500k'
+    assert '-vf' not in cmd and '-pix_fmt' not in cmd
+    assert cmd[-6:] == ['-c:v', 'libx264', '-b:v', '2500k', '-y', 'out.mp4']
+
+
+def test_video_crf_replaces_bitrate():
+    cmd = video_command('in.mkv', 'out.mp4', 'libx264', {'video_crf': '23', 'video_max_bitrate': '4M'})
+    assert option(cmd, '-crf') == '23' and option(cmd, '-maxrate') == '4M'
+    assert '-b:v' not in cmd
+    vp9 = video_command('in.mkv', 'out.webm', 'libvpx-vp9', {'video_crf': '31'})
+    assert option(vp9, '-crf') == '31' and option(vp9, '-b:v') == '0'
+
+
+def test_video_caps_resolution_and_fps_at_source():
+    settings = {'video_resolution': '720p', 'video_fps': '60', 'video_metadata': 'false'}
+    cmd = video_command('in.mkv', 'out.mp4', 'libx264', settings, source={'height': 1080, 'fps': 30})
+    assert option(cmd, '-vf') == 'scale=-2:720' and '-r' not in cmd
+    assert option(cmd, '-map_metadata') == '-1'
+    small = video_command('in.mkv', 'out.mp4', 'libx264', settings, source={'height': 480, 'fps': 30})
+    assert '-vf' not in small
+
+
+def test_video_no_audio_and_hw_pixel_format():
+    cmd = video_command('in.mkv', 'out.mp4', 'h264_nvenc', {'audio_codec': 'No Audio'}, is_hw=True)
+    assert '-an' in cmd and '-c:a' not in cmd
+    assert option(cmd, '-pix_fmt') == 'yuv420p'
+    assert '-pix_fmt' not in video_command('in.mkv', 'out.mp4', 'h264_nvenc', {}, is_hw=False)
+    assert '-pix_fmt' not in video_command('in.mkv', 'out.webm', 'vp9_qsv', {}, is_hw=True)
+
+
+def test_video_resume_seeks_past_trim_start():
+    cmd = video_command('in.mkv', 'out.mkv', 'libx264', {'trim_start': '10'}, start_seconds=2.5)
+    assert cmd[1:3] == ['-ss', '12.500']
+
+
+def test_video_copy_remuxes_without_filters():
+    cmd = video_command('in.mkv', 'out.mkv', 'copy', {'trim_start': '5', 'trim_mode': 'Copy',
+                                                       'video_resolution': '720p'})
+    assert option(cmd, '-c:a') == 'copy' and option(cmd, '-c:v') == 'copy'
+    assert option(cmd, '-avoid_negative_ts') == 'make_zero'
+    assert '-vf' not in cmd and '-r' not in cmd and '-b:v' not in cmd
+    assert option(video_command('in.mkv', 'out.mkv', 'copy', {}), '-c:a') == 'aac'
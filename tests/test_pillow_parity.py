@@ -0,0 +1,112 @@
+"""
+Parity of the in-process Pillow image engine with the FFmpeg path it replaces:
+the same inputs and settings must give outputs of the same dimensions, pixel mode
+and transparency, whichever engine converts them, and lossy outputs of about the
+same size and quality.
+"""
+
+import math
+import os
+import shutil
+import subprocess
+
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+from PIL import ImageChops, ImageStat
+if shutil.which('ffmpeg') is None:
+    pytest.skip("ffmpeg not found", allow_module_level=True)
+
+from ffmpeg_commands import image_command
+import pillow_engine
+
+# name -> (mode, size); drawn by make_fixture()
+FIXTURES = {
+    'rgb.png': ('RGB', (320, 200)),
+    'rgba.png': ('RGBA', (200, 320)),
+    'gray.png': ('L', (256, 256)),
+    'photo.jpg': ('RGB', (640, 480))
+}
+
+TARGETS = ['png', 'jpg', 'webp', 'bmp', 'tiff']
+LOSSY_TARGETS = {'jpg', 'webp'}
+MAX_SIZE_RATIO = 1.5 # either way, between the two engines' lossy outputs
+MIN_PSNR = 33.0 # dB, of one engine's lossy output against the other's
+
+SETTINGS = [
+    {},
+    {'image_quality': '30'},
+    {'image_resize': '100'},
+    {'image_resize': '100', 'image_resize_mode': 'Fast'},
+    {'image_grayscale': 'true'}
+]
+
+
+def make_fixture(path, mode, size):
+    """A gradient (with a transparent corner in RGBA) so every channel carries data."""
+    width, height = size
+    img = Image.new(mode, size)
+    for y in range(height):
+        for x in range(width):
+            r, g = x * 255 // width, y * 255 // height
+            if mode == 'L':
+                img.putpixel((x, y), (r + g) // 2)
+            elif mode == 'RGBA':
+                img.putpixel((x, y), (r, g, 128, 0 if x < width // 4 and y < height // 4 else 255))
+            else:
+                img.putpixel((x, y), (r, g, 128))
+    img.save(path)
+
+
+def describe(path):
+    """(size, mode, has transparent pixels) of an output."""
+    with Image.open(path) as img:
+        img.load()
+        alpha = None
+        if 'A' in img.getbands():
+            alpha = img.getchannel('A')
+        elif 'transparency' in img.info:
+            alpha = img.convert('RGBA').getchannel('A')
+        return img.size, img.mode, alpha is not None and alpha.getextrema()[0] < 255
+
+
+def psnr(path_a, path_b):
+    """PSNR (dB) between two images of the same size, compared as RGB."""
+    with Image.open(path_a) as a, Image.open(path_b) as b:
+        diff = ImageChops.difference(a.convert('RGB'), b.convert('RGB'))
+    mse = sum(ImageStat.Stat(diff.point(lambda v: v * v)).mean) / 3
+    return math.inf if mse == 0 else 10 * math.log10(255 ** 2 / mse)
+
+
+@pytest.fixture(scope='module')
+def fixtures(tmp_path_factory):
+    folder = tmp_path_factory.mktemp('parity')
+    for name, (mode, size) in FIXTURES.items():
+        make_fixture(str(folder / name), mode, size)
+    return folder
+
+
+@pytest.mark.parametrize('settings', SETTINGS, ids=lambda s: ','.join(f"{k}={v}" for k, v in s.items()) or 'default')
+@pytest.mark.parametrize('target', TARGETS)
+@pytest.mark.parametrize('name', list(FIXTURES))
+def test_engines_agree(fixtures, tmp_path, name, target, settings):
+    input_path = str(fixtures / name)
+    settings = dict(settings, image_engine='auto', image_metadata='false')
+    assert pillow_engine.can_handle(input_path, target, settings)
+
+    pillow_out = str(tmp_path / f"pillow.{target}")
+    pillow_engine.convert_image(input_path, pillow_out, target, settings)
+
+    ffmpeg_out = str(tmp_path / f"ffmpeg.{target}")
+    with Image.open(input_path) as img:
+        source_size = img.size
+    result = subprocess.run(image_command(input_path, ffmpeg_out, target, settings, source_size=source_size),
+                            capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr[-500:]
+
+    assert describe(pillow_out) == describe(ffmpeg_out)
+    if target in LOSSY_TARGETS:
+        # The same quality setting must mean the same quality in both engines
+        ratio = os.path.getsize(pillow_out) / os.path.getsize(ffmpeg_out)
+        assert 1 / MAX_SIZE_RATIO <= ratio <= MAX_SIZE_RATIO
+        assert psnr(pillow_out, ffmpeg_out) >= MIN_PSNR
@@ -0,0 +1,94 @@
+"""
+Pipe mode writes every supported target to stdout in the requested format, and
+refuses the ones that can't be piped before FFmpeg runs.
+"""
+
+import shutil
+import subprocess
+
+import pytest
+
+import pipe_mode
+from config import IMAGE_FORMATS, AUDIO_FORMATS, VIDEO_FORMATS
+
+# Leading bytes of each target (None: checked by the exit code and a non-empty output only)
+IMAGE_MAGIC = {
+    'webp': b'RIFF', 'jpg': b'\xff\xd8\xff', 'jpeg': b'\xff\xd8\xff', 'png': b'\x89PNG', 'bmp': b'BM',
+    'tiff': b'II*\0', 'tif': b'II*\0', 'tga': None, 'ppm': b'P6', 'pgm': b'P5', 'pbm': b'P4', 'pnm': b'P6',
+    'gif': b'GIF8', 'exr': b'\x76\x2f\x31\x01', 'hdr': b'#?RADIANCE'
+}
+AUDIO_MAGIC = {'mp3': None, 'ogg': b'OggS', 'flac': b'fLaC', 'wav': b'RIFF', 'm4a': None, 'opus': b'OggS'}
+VIDEO_MAGIC = {'mkv': b'\x1a\x45\xdf\xa3', 'webm': b'\x1a\x45\xdf\xa3', 'avi': b'RIFF', 'flv': b'FLV',
+               'wmv': b'\x30\x26\xb2\x75', 'gif': b'GIF8', 'ogv': b'OggS', 'ts': b'\x47', 'm2ts': b'\x47',
+               'mpg': b'\0\0\1\xba', 'mpeg': b'\0\0\1\xba'}
+
+needs_ffmpeg = pytest.mark.skipif(shutil.which('ffmpeg') is None, reason="ffmpeg not found")
+
+
+@pytest.fixture(scope='module')
+def sources(tmp_path_factory):
+    folder = tmp_path_factory.mktemp('pipe')
+    paths = {'image': str(folder / 'in.png'), 'audio': str(folder / 'in.wav'), 'video': str(folder / 'in.mkv')}
+    if shutil.which('ffmpeg'):
+        ffmpeg = ['ffmpeg', '-v', 'error', '-y']
+        subprocess.run(ffmpeg + ['-f', 'lavfi', '-i', 'testsrc2=s=128x96', '-frames:v', '1', paths['image']],
+                       check=True)
+        subprocess.run(ffmpeg + ['-f', 'lavfi', '-i', 'sine=d=0.5', paths['audio']], check=True)
+        subprocess.run(ffmpeg + ['-f', 'lavfi', '-i', 'testsrc2=s=128x96:r=10:d=0.5', '-f', 'lavfi',
+                                 '-i', 'sine=d=0.5', '-c:v', 'ffv1', '-c:a', 'pcm_s16le', paths['video']], check=True)
+    return paths
+
+
+def pipe_to_stdout(media, fmt, source):
+    cmd = pipe_mode.pipe_command(media, fmt, source, pipe_mode.STDIO, {})
+    return subprocess.run(cmd, capture_output=True, stdin=subprocess.DEVNULL)
+
+
+def check_output(result, magic):
+    assert result.returncode == 0, result.stderr.decode(errors='replace')[-500:]
+    assert result.stdout
+    if magic is not None:
+        assert result.stdout.startswith(magic)
+
+
+def test_every_target_is_covered():
+    assert set(IMAGE_MAGIC) == {f for f in IMAGE_FORMATS if pipe_mode.can_pipe('image', f)}
+    assert set(AUDIO_MAGIC) == set(AUDIO_FORMATS)
+    assert set(VIDEO_MAGIC) | {'mp4', 'mov', 'm4v', '3gp'} == set(VIDEO_FORMATS)
+
+
+@pytest.mark.parametrize('fmt', ['ico', 'avif'])
+def test_unpipeable_image_is_refused(fmt):
+    assert not pipe_mode.can_pipe('image', fmt)
+    with pytest.raises(ValueError, match="can't be written to a pipe"):
+        pipe_mode.pipe_command('image', fmt, 'in.png', pipe_mode.STDIO, {})
+    # A file output is fine
+    assert pipe_mode.pipe_command('image', fmt, 'in.png', f"out.{fmt}", {})[-1] == f"out.{fmt}"
+
+
+@needs_ffmpeg
+@pytest.mark.parametrize('fmt', sorted(IMAGE_MAGIC))
+def test_image_pipe_target(sources, fmt):
+    cmd = pipe_mode.pipe_command('image', fmt, sources['image'], pipe_mode.STDIO, {})
+    if fmt in pipe_mode.PIPE_IMAGE_ENCODERS:
+        assert cmd[cmd.index('-c:v') + 1] == pipe_mode.PIPE_IMAGE_ENCODERS[fmt]
+    check_output(pipe_to_stdout('image', fmt, sources['image']), IMAGE_MAGIC[fmt])
+
+
+@needs_ffmpeg
+@pytest.mark.parametrize('fmt', sorted(AUDIO_MAGIC))
+def test_audio_pipe_target(sources, fmt):
+    check_output(pipe_to_stdout('audio', fmt, sources['audio']), AUDIO_MAGIC[fmt])
+
+
+@needs_ffmpeg
+@pytest.mark.parametrize('fmt', sorted(VIDEO_FORMATS))
+def test_video_pipe_target(sources, fmt):
+    result = pipe_to_stdout('video', fmt, sources['video'])
+    magic = VIDEO_MAGIC.get(fmt)
+    if magic is None:
+        # MP4 family: fragmented, the 'ftyp' box comes first
+        check_output(result, None)
+        assert result.stdout[4:8] == b'ftyp'
+    else:
+        check_output(result, magic)
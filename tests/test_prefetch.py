@@ -0,0 +1,97 @@
+"""Read-ahead must not warm inputs of jobs that already started, nor cut in front of them on a busy device."""
+
+import asyncio
+import contextlib
+
+import prefetch
+from conversion_api import ConversionJob
+from io_scheduler import DEVICE_HDD
+
+
+class OneSlotScheduler:
+    """An IOScheduler stand-in: every path is on one HDD with a single slot."""
+    def __init__(self):
+        self.semaphore = asyncio.Semaphore(1)
+
+    def kind(self, device):
+        return DEVICE_HDD
+
+    @contextlib.asynccontextmanager
+    async def device_slot(self, path):
+        async with self.semaphore:
+            yield
+
+
+def make_jobs(tmp_path, count):
+    jobs = []
+    for i in range(count):
+        path = tmp_path / f"in{i}.wav"
+        path.write_bytes(b'\0' * 100)
+        jobs.append(ConversionJob(str(path), str(tmp_path / f"out{i}.mp3"), 'audio', 'mp3'))
+    return jobs
+
+
+def run_prefetcher(monkeypatch, jobs, scenario, budget=1000):
+    """Run a Prefetcher over 'jobs' next to the coroutine scenario(prefetcher, scheduler); returns the read paths."""
+    read = []
+    monkeypatch.setattr(prefetch, 'read_ahead', lambda path, length, read_through: read.append(path))
+
+    async def probe_job(job):
+        pass
+
+    async def main():
+        scheduler = OneSlotScheduler()
+        prefetcher = prefetch.Prefetcher(jobs, range(len(jobs)), 1, probe_job, scheduler, budget=budget)
+        task = asyncio.create_task(prefetcher.run())
+        await scenario(prefetcher, scheduler)
+        await asyncio.wait_for(task, 1)
+
+    asyncio.run(main())
+    return read
+
+
+def test_next_job_is_read_ahead(tmp_path, monkeypatch):
+    jobs = make_jobs(tmp_path, 3)
+
+    async def scenario(prefetcher, scheduler):
+        await prefetcher.job_started(0)
+        await asyncio.sleep(0.01)
+        assert prefetcher.reserved == {1: 100}
+        await prefetcher.job_started(1)
+        await prefetcher.job_finished(0)
+        await asyncio.sleep(0.01)
+        await prefetcher.job_started(2)
+        await prefetcher.job_finished(1)
+
+    # With a depth of 1 only the job right after the running one is warmed up
+    assert run_prefetcher(monkeypatch, jobs, scenario) == [jobs[1].input_path, jobs[2].input_path]
+
+
+def test_budget_recheck_skips_a_job_that_started(tmp_path, monkeypatch):
+    jobs = make_jobs(tmp_path, 3)
+
+    async def scenario(prefetcher, scheduler):
+        prefetcher.in_use = prefetcher.budget # no read-ahead memory left
+        await prefetcher.job_started(0)
+        await asyncio.sleep(0.01) # the prefetcher waits for budget for job 1
+        await prefetcher.job_started(1)
+        prefetcher.in_use = 0
+        await prefetcher.job_finished(0) # frees budget while job 1 is already running
+        await prefetcher.job_started(2)
+        await prefetcher.job_finished(1)
+
+    assert run_prefetcher(monkeypatch, jobs, scenario) == []
+
+
+def test_read_ahead_waits_for_the_device_slot(tmp_path, monkeypatch):
+    jobs = make_jobs(tmp_path, 2)
+
+    async def scenario(prefetcher, scheduler):
+        async with scheduler.semaphore: # job 0 holds the disk
+            await prefetcher.job_started(0)
+            await asyncio.sleep(0.01)
+            assert prefetcher.reserved == {} # queued behind it, nothing read yet
+            await prefetcher.job_started(1) # job 1 started on another slot meanwhile
+        await prefetcher.job_finished(0)
+
+    assert run_prefetcher(monkeypatch, jobs, scenario) == []
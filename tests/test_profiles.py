@@ -0,0 +1,30 @@
+"""Rule tables are validated when loaded, so a bad rule can't abort a batch mid-way."""
+
+import pytest
+
+import profiles
+from app_paths import save_json
+
+PROFILES = {'podcast': {'media': 'audio', 'format': 'opus'}}
+
+
+def test_bounds_are_parsed_at_load():
+    rule_set = profiles.compile_rules({'profiles': PROFILES,
+                                       'rules': [{'min_duration': '600', 'max_size': '1.5 GB', 'profile': 'podcast'}]})
+    rule = rule_set.rules[0]
+    assert rule.bounds == [('duration', 600.0, None)]
+    assert rule.max_size == int(1.5 * 1024 ** 3)
+    assert rule_set.match('talk.mp3', 'audio', 1000, {'duration': 900.0}).name == 'podcast'
+    assert rule_set.match('talk.mp3', 'audio', 1000, {'duration': 60.0}) is None
+
+
+@pytest.mark.parametrize('key, value', [('min_duration', 'ten minutes'), ('max_width', None),
+                                        ('min_size', '20 parsecs'), ('max_channels', [2])])
+def test_malformed_bound_rejects_the_rule_table(tmp_path, key, value):
+    data = {'profiles': PROFILES, 'rules': [{'ext': 'wav', 'profile': 'podcast'}, {key: value, 'profile': 'podcast'}]}
+    with pytest.raises(ValueError, match=f"rule 2: {key}"):
+        profiles.compile_rules(data)
+
+    path = str(tmp_path / profiles.PROFILES_FILE)
+    save_json(path, data)
+    assert profiles.load_rule_set({'conversion_profiles': 'true'}, path) is None
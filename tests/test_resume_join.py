@@ -0,0 +1,107 @@
+"""
+Resuming a failed hardware encode in software: the partial output must be
+salvageable, and the salvaged head joined with a tail from another encoder must
+decode cleanly across the seam.
+"""
+
+import asyncio
+import shutil
+import subprocess
+
+import pytest
+
+if shutil.which('ffmpeg') is None:
+    pytest.skip("ffmpeg not found", allow_module_level=True)
+
+import conversion_api
+import verify
+from ffmpeg_commands import decode_check_command, join_mismatch
+
+SOURCE_SECONDS = 16
+SEAM_SECONDS = 12 # above conversion_api.MIN_RESUME_SECONDS
+
+
+def ffmpeg(*args):
+    subprocess.run(['ffmpeg', '-v', 'error', '-y'] + list(args), check=True)
+
+
+def decode_problem(path):
+    result = subprocess.run(decode_check_command(path), capture_output=True, text=True)
+    return verify.decode_problem(result.returncode, result.stderr.splitlines())
+
+
+def frame_count(path):
+    result = subprocess.run(['ffmpeg', '-v', 'error', '-i', path, '-map', '0:v', '-fps_mode', 'passthrough',
+                             '-f', 'framemd5', '-'],
+                            capture_output=True, text=True, check=True)
+    return sum(1 for line in result.stdout.splitlines() if line and not line.startswith('#'))
+
+
+@pytest.fixture(scope='module')
+def source(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('resume') / 'source.mkv')
+    ffmpeg('-f', 'lavfi', '-i', f"testsrc2=s=160x120:r=25:d={SOURCE_SECONDS}",
+           '-f', 'lavfi', '-i', f"sine=d={SOURCE_SECONDS}", '-c:v', 'ffv1', '-c:a', 'pcm_s16le', path)
+    return path
+
+
+def encode_killed(source, path):
+    """A complete encode cut off at 85% of its bytes, like an encoder that died mid-way."""
+    # Baseline/ultrafast stands in for the hardware encoder: other profile, other parameter sets
+    ffmpeg('-i', source, '-c:v', 'libx264', '-profile:v', 'baseline', '-preset', 'ultrafast', '-c:a', 'aac', path)
+    with open(path, 'r+b') as f:
+        f.truncate(f.seek(0, 2) * 85 // 100)
+
+
+def test_killed_matroska_is_salvaged(source, tmp_path):
+    partial, head = str(tmp_path / 'out.hw.mkv'), str(tmp_path / 'head.mkv')
+    encode_killed(source, partial)
+    kept = asyncio.run(conversion_api.salvage_partial(partial, head, SEAM_SECONDS))
+    assert kept >= conversion_api.MIN_RESUME_SECONDS
+    assert decode_problem(head) is None
+
+
+def test_killed_mp4_is_not_salvageable(source, tmp_path):
+    # Why resumable HW attempts write Matroska: an mp4 without its index can't be read
+    partial, head = str(tmp_path / 'out.mp4'), str(tmp_path / 'head.mkv')
+    encode_killed(source, partial)
+    assert asyncio.run(conversion_api.salvage_partial(partial, head, SEAM_SECONDS)) == 0
+
+
+@pytest.mark.parametrize('target', ['mp4', 'mkv'])
+def test_joined_segments_decode_across_the_seam(source, tmp_path, target):
+    partial, head = str(tmp_path / 'out.hw.mkv'), str(tmp_path / 'head.mkv')
+    tail, joined = str(tmp_path / 'tail.mkv'), str(tmp_path / f"joined.{target}")
+    encode_killed(source, partial)
+    kept = asyncio.run(conversion_api.salvage_partial(partial, head, SEAM_SECONDS))
+    assert kept
+    # The software remainder, from where the head ends (as video_command's start_seconds does)
+    ffmpeg('-ss', f"{kept:.3f}", '-i', source, '-c:v', 'libx264', '-profile:v', 'high', '-preset', 'veryfast',
+           '-c:a', 'aac', tail)
+
+    assert asyncio.run(conversion_api.join_segments([head, tail], joined))
+    assert decode_problem(joined) is None
+    assert frame_count(joined) == frame_count(head) + frame_count(tail)
+
+
+@pytest.mark.skipif(shutil.which('ffprobe') is None, reason="ffprobe not found")
+def test_join_resumed_checks_parameters(source, tmp_path):
+    head, tail, joined = str(tmp_path / 'head.mkv'), str(tmp_path / 'tail.mkv'), str(tmp_path / 'joined.mp4')
+    ffmpeg('-t', '4', '-i', source, '-c:v', 'libx264', '-preset', 'ultrafast', '-c:a', 'aac', head)
+    # Other dimensions can't share one stream
+    ffmpeg('-ss', '4', '-i', source, '-vf', 'scale=80:60', '-c:v', 'libx264', '-c:a', 'aac', tail)
+    assert not asyncio.run(conversion_api.join_resumed(head, tail, joined, 4.0))
+
+    ffmpeg('-ss', '4', '-i', source, '-c:v', 'libx264', '-profile:v', 'high', '-c:a', 'aac', tail)
+    assert asyncio.run(conversion_api.join_resumed(head, tail, joined, 4.0))
+
+
+def test_join_mismatch():
+    video = {'codec_type': 'video', 'codec_name': 'h264', 'width': '160', 'height': '120', 'pix_fmt': 'yuv420p',
+             'sample_rate': '', 'channels': ''}
+    audio = {'codec_type': 'audio', 'codec_name': 'aac', 'width': '', 'height': '', 'pix_fmt': '',
+             'sample_rate': '44100', 'channels': '1'}
+    assert join_mismatch([video, audio], [dict(video), dict(audio)]) is None
+    assert 'pix_fmt' in join_mismatch([video], [dict(video, pix_fmt='yuv420p10le')])
+    assert 'sample_rate' in join_mismatch([video, audio], [video, dict(audio, sample_rate='48000')])
+    assert '1 after' in join_mismatch([video, audio], [video])
@@ -0,0 +1,31 @@
+"""
+The window must paint before the conversion pipeline is loaded: `main.py --measure-startup`
+runs offscreen and the modules it imported are read from Python's import trace.
+"""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip("PySide6")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Loaded on first use (see main.py), never at startup
+DEFERRED_MODULES = {'asyncio', 'conversion_api', 'batch_planner', 'hw_probe', 'PIL'}
+
+
+def test_startup_defers_the_conversion_pipeline(tmp_path):
+    env = dict(os.environ, QT_QPA_PLATFORM='offscreen', XDG_DATA_HOME=str(tmp_path / 'data'),
+               XDG_CONFIG_HOME=str(tmp_path / 'config'))
+    result = subprocess.run([sys.executable, '-X', 'importtime', os.path.join(ROOT, 'main.py'), '--measure-startup'],
+                            capture_output=True, text=True, env=env, timeout=120)
+    assert result.returncode == 0, result.stderr[-2000:]
+    assert 'first_paint_ms=' in result.stdout
+
+    # '-X importtime' lines end with '| <indented module name>'
+    imported = {line.rsplit('|', 1)[1].strip() for line in result.stderr.splitlines()
+                if line.startswith('import time:')}
+    loaded = {name for name in imported if name.split('.')[0] in DEFERRED_MODULES}
+    assert not loaded
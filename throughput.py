@@ -0,0 +1,65 @@
+"""
+Historical per-codec throughput, learned from finished conversions.
+Rates are wall-clock seconds per unit of work: per second of media for video,
+per input megabyte for images and audio.
+"""
+
+from app_paths import JsonStore
+
+# Seed rates used until a codec has history of its own (seconds per unit)
+DEFAULT_RATES = {
+    'video:copy': 0.02,
+    'video:libx264': 1.0,
+    'video:libx265': 2.5,
+    'video:libvpx-vp9': 2.5,
+    'video:libvpx': 1.5,
+    'video:libaom-av1': 6.0,
+    'video:gif': 0.8,
+    'video': 1.0,
+    'image:avif': 2.0,
+    'image': 0.3,
+    'audio': 0.05
+}
+HW_VIDEO_RATE = 0.25
+REFERENCE_PIXELS = 1920 * 1080 # video work is counted in 1080p-equivalent seconds
+SMOOTHING = 0.3 # weight of the newest sample in the moving average
+
+
+def codec_key(media, codec):
+    return f"{media}:{codec}"
+
+
+def work_units(media, input_bytes, duration, pixels=0):
+    """
+    Units of work for a job: media seconds for video, scaled by the output frame size
+    relative to 1080p when known, input megabytes otherwise.
+    """
+    if media == 'video' and duration > 0:
+        return duration * (pixels / REFERENCE_PIXELS if pixels > 0 else 1.0)
+    return input_bytes / (1024 * 1024)
+
+
+class ThroughputHistory(JsonStore):
+    """Exponential moving average of seconds-per-unit, persisted as JSON."""
+    description = "throughput history"
+
+    def rate(self, key):
+        """Best known seconds-per-unit for a codec key."""
+        with self.lock:
+            if key in self.entries:
+                return self.entries[key]
+        if key in DEFAULT_RATES:
+            return DEFAULT_RATES[key]
+        media, _, codec = key.partition(':')
+        if media == 'video' and any(hw in codec for hw in ('nvenc', 'amf', 'qsv', 'videotoolbox', 'vaapi')):
+            return HW_VIDEO_RATE
+        return DEFAULT_RATES.get(media, 1.0)
+
+    def record(self, key, units, elapsed):
+        if units <= 0 or elapsed <= 0:
+            return
+        sample = elapsed / units
+        with self.lock:
+            previous = self.entries.get(key)
+            self.entries[key] = sample if previous is None else previous + SMOOTHING * (sample - previous)
+            self.dirty = True
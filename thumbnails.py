@@ -0,0 +1,173 @@
+import os
+import json
+import hashlib
+import subprocess
+import threading
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal
+
+from logger import app_logger
+from app_paths import get_cache_dir
+from ffmpeg_commands import (get_bin_path, media_kind, media_probe_command, parse_probe_output,
+                             thumbnail_command)
+
+THUMB_WIDTH = 128
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+EVICT_EVERY = 100 # check the cache size after this many new thumbnails
+SUBPROCESS_TIMEOUT = 15
+
+
+def describe_media(info, media):
+    """Short one-line description like '1920x1080 · h264 · 1:23'."""
+    parts = []
+    if info['width'] and info['height']:
+        parts.append(f"{info['width']}x{info['height']}")
+    codec = info['video_codec'] if media != 'audio' else info['audio_codec']
+    if codec:
+        parts.append(codec)
+    if media != 'image' and info['duration'] > 0:
+        minutes, secs = divmod(int(info['duration']), 60)
+        hours, minutes = divmod(minutes, 60)
+        parts.append(f"{hours}:{minutes:02d}:{secs:02d}" if hours else f"{minutes}:{secs:02d}")
+    if media == 'audio' and info['sample_rate']:
+        parts.append(f"{info['sample_rate'] / 1000:g} kHz")
+    return " · ".join(parts)
+
+
+class ThumbnailCache:
+    """
+    On-disk thumbnail cache keyed by path, size and mtime.
+    Each entry is a JPEG plus a JSON file with media info; hits refresh the
+    entry's mtime so eviction can drop the least recently used ones.
+    """
+    def __init__(self, cache_dir=None, max_bytes=CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir or get_cache_dir("thumbnails")
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.inserted = 0
+
+    def key_for(self, path):
+        st = os.stat(path)
+        ident = f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}"
+        return hashlib.sha1(ident.encode('utf-8', errors='replace')).hexdigest()
+
+    def lookup(self, key):
+        """Return (thumb_path or None, info) for a cached key, or None on a miss."""
+        meta_path = os.path.join(self.cache_dir, f"{key}.json")
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        thumb_path = os.path.join(self.cache_dir, f"{key}.jpg")
+        has_thumb = os.path.exists(thumb_path)
+        for p in ([meta_path, thumb_path] if has_thumb else [meta_path]):
+            try:
+                os.utime(p) # mark as recently used
+            except OSError:
+                pass
+        return (thumb_path if has_thumb else None), meta
+
+    def get_or_create(self, path):
+        """Return (thumb_path or None, info) for a file, generating it on a miss."""
+        key = self.key_for(path)
+        cached = self.lookup(key)
+        if cached is not None:
+            return cached
+
+        media = media_kind(path)
+        info = self.probe(path)
+        thumb_path = os.path.join(self.cache_dir, f"{key}.jpg")
+        # Seek a little into videos to skip black intro frames, but never past the end
+        seek = min(info['duration'] * 0.1, 5.0) if media == 'video' else 0
+        cmd = thumbnail_command(path, thumb_path, seek, THUMB_WIDTH, get_bin_path('ffmpeg'))
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=SUBPROCESS_TIMEOUT)
+            if result.returncode != 0 and os.path.exists(thumb_path):
+                os.remove(thumb_path)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            app_logger.warning(f"Thumbnail failed for {path}: {e}")
+
+        meta = dict(info, media=media, description=describe_media(info, media))
+        with open(os.path.join(self.cache_dir, f"{key}.json"), 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+
+        with self.lock:
+            self.inserted += 1
+            evict = self.inserted % EVICT_EVERY == 1
+        if evict:
+            self.evict()
+        return (thumb_path if os.path.exists(thumb_path) else None), meta
+
+    def probe(self, path):
+        cmd = media_probe_command(path, get_bin_path('ffprobe'))
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=SUBPROCESS_TIMEOUT)
+            return parse_probe_output(result.stdout)
+        except (OSError, subprocess.TimeoutExpired):
+            return parse_probe_output("")
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes."""
+        with self.lock:
+            entries = []
+            total = 0
+            for name in os.listdir(self.cache_dir):
+                full = os.path.join(self.cache_dir, name)
+                try:
+                    st = os.stat(full)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, full))
+                total += st.st_size
+            if total <= self.max_bytes:
+                return
+            entries.sort()
+            for _, size, full in entries:
+                if total <= self.max_bytes * 0.8: # evict with some headroom
+                    break
+                try:
+                    os.remove(full)
+                    total -= size
+                except OSError:
+                    pass
+
+
+class ThumbnailTask(QRunnable):
+    def __init__(self, loader, path):
+        super().__init__()
+        self.loader = loader
+        self.path = path
+
+    def run(self):
+        try:
+            thumb_path, info = self.loader.cache.get_or_create(self.path)
+        except Exception as e:
+            app_logger.warning(f"Thumbnail failed for {self.path}: {e}")
+            thumb_path, info = None, {}
+        self.loader.ready.emit(self.path, thumb_path or "", info)
+
+
+class ThumbnailLoader(QObject):
+    """
+    Generates thumbnails and media info on a small background pool.
+    Each path is requested at most once; results arrive via 'ready'.
+    """
+    ready = Signal(str, str, object) # path, thumbnail path ('' if none), info
+
+    def __init__(self, parent=None, max_threads=2):
+        super().__init__(parent)
+        self.cache = ThumbnailCache()
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_threads)
+        self.requested = set()
+
+    def request(self, path):
+        if path in self.requested:
+            return
+        self.requested.add(path)
+        self.pool.start(ThumbnailTask(self, path))
+
+    def reset(self):
+        """Forget queued requests (e.g. when the staged list is replaced)."""
+        self.pool.clear()
+        self.requested.clear()
@@ -0,0 +1,87 @@
+"""
+Output verification.
+An exit code of 0 and an existing file don't prove an output is playable: a full
+disk, a dying encoder or a bad resume join can leave it truncated or corrupt.
+'verify_outputs' checks finished outputs at increasing cost:
+  Probe   - the container opens and has the expected stream and duration (ffprobe)
+  Sampled - probe, then decode a few seconds at the start, middle and end
+  Full    - probe, then decode everything
+Checks run on the staged output after the job gives up its encode slot, so they
+overlap the next encode; only outputs that pass are renamed into place (see staging).
+"""
+
+from ffmpeg_commands import trim_range, trimmed_duration
+
+VERIFY_OFF = 'Off'
+VERIFY_PROBE = 'Probe'
+VERIFY_SAMPLED = 'Sampled'
+VERIFY_FULL = 'Full'
+
+SAMPLE_SECONDS = 2.0
+SAMPLE_COUNT = 3 # start, middle, end
+# An output may be this much shorter than expected (keyframe cuts, audio priming, rounding)
+DURATION_SLACK_SECONDS = 1.0
+DURATION_SLACK_SHARE = 0.02
+
+
+def verify_level(settings):
+    return settings.get('verify_outputs', VERIFY_OFF)
+
+
+def is_enabled(settings):
+    return verify_level(settings) in (VERIFY_PROBE, VERIFY_SAMPLED, VERIFY_FULL)
+
+
+def expected_duration(input_info, settings):
+    """Duration the output of a video/audio input should have (0 if unknown)."""
+    return trimmed_duration(input_info['duration'], *trim_range(settings))
+
+
+def check_probe(info, media, expected):
+    """Problem found in an output's probe (parse_probe_output dictionary), or None."""
+    if media == 'audio':
+        if not info['audio_codec']:
+            return "no audio stream"
+    elif not info['video_codec'] or not info['width']:
+        return "no image" if media == 'image' else "no video stream"
+    if media != 'image' and expected > 0:
+        if info['duration'] <= 0:
+            return "duration unknown"
+        if info['duration'] < expected - max(DURATION_SLACK_SECONDS, expected * DURATION_SLACK_SHARE):
+            return f"truncated: {info['duration']:.1f}s of {expected:.1f}s"
+    return None
+
+
+def plan_samples(duration):
+    """
+    (start, length) ranges to decode for a sampled check; empty = decode everything
+    (images, and outputs too short for samples to save anything). Without a known
+    duration only the start is decoded.
+    """
+    if duration <= 0:
+        return [(0.0, SAMPLE_SECONDS * SAMPLE_COUNT)]
+    if duration <= SAMPLE_SECONDS * SAMPLE_COUNT * 2:
+        return []
+    return [(0.0, SAMPLE_SECONDS),
+            (duration / 2 - SAMPLE_SECONDS / 2, SAMPLE_SECONDS),
+            (max(0.0, duration - SAMPLE_SECONDS), SAMPLE_SECONDS)]
+
+
+def decode_problem(returncode, output_lines):
+    """
+    Problem reported by a decode check (run at '-v error'), or None. Timestamp complaints
+    of the null muxer the frames are thrown into (e.g. after seeking near the end) are
+    not problems of the file, and neither are the "Last message repeated" lines after
+    them (a repeated real error was already reported by its first line).
+    """
+    errors = [line for line in output_lines if line.strip() and not line.startswith('[null @')
+              and not line.strip().startswith('Last message repeated')]
+    if returncode != 0 or errors:
+        return f"decode error: {errors[0] if errors else f'exit code {returncode}'}"
+    return None
+
+
+def format_result(result):
+    """One-line description of a verification result for the log."""
+    state = "OK" if result['ok'] else f"FAILED ({result['problem']})"
+    return f"{result['level']} check {state} in {result['seconds']:.1f}s"